@@ -1,12 +1,36 @@
-from flask import Flask, request, jsonify, session, Response
+from flask import Flask, request, jsonify, session, Response, g, stream_with_context
 from flask_cors import CORS
+from werkzeug.http import is_resource_modified
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
 import os
 import json
+import base64
+import hashlib
+import time
 import psycopg2
 import psycopg2.extras
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from db_pool import get_pool
+import audit
+import feed_versions
+import feed_cache
+import changelog
+import notify
+import events
+import restore
+import snapshot_store
+import feeds
+import devices
+import records
+import metrics
+import profiler
+import conflicts
+import timeline
+import ics
+from ids import new_id
+from day_plan import DayPlanner, parse_date, MAX_RANGE_DAYS
 
 try:
     from dotenv import load_dotenv
@@ -22,7 +46,7 @@ CORS(app,
      supports_credentials=True,
      allow_headers=['Content-Type', 'Authorization'],
      methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
-     expose_headers=['Set-Cookie'])
+     expose_headers=['Set-Cookie', 'X-Next-Cursor'])
 
 is_production = os.environ.get('RENDER') is not None or os.environ.get('FLASK_ENV') == 'production'
 app.config['SESSION_COOKIE_SECURE'] = is_production
@@ -34,6 +58,10 @@ app.config['SESSION_COOKIE_PATH'] = '/'
 
 print(f"🔧 Session: SECURE={app.config['SESSION_COOKIE_SECURE']}, SAMESITE={app.config['SESSION_COOKIE_SAMESITE']}")
 
+# Request timing and /metrics, when METRICS=1; per-request SQL profiles, when SQL_PROFILE=1
+metrics.install(app)
+profiler.install(app)
+
 SOUNDFILES_DIR = os.path.expanduser('~/piring/soundfiles')
 
 # ============================================================================
@@ -41,174 +69,216 @@ SOUNDFILES_DIR = os.path.expanduser('~/piring/soundfiles')
 # ============================================================================
 
 def get_db():
-    database_url = os.environ.get('DATABASE_URL')
-    if not database_url:
-        raise Exception("DATABASE_URL environment variable not set")
-    conn = psycopg2.connect(database_url, cursor_factory=psycopg2.extras.RealDictCursor)
-    return conn
+    """Lease one pooled connection per request; it is returned in release_db()."""
+    if 'db' not in g:
+        started = time.perf_counter()
+        g.db = get_pool().getconn()
+        metrics.observe_checkout(time.perf_counter() - started)
+    return g.db
+
+@app.before_request
+def ensure_change_listener():
+    if notify.enabled() and not notify.listener.is_connected():
+        notify.listener.start(os.environ.get('DATABASE_URL'))
+
+@app.teardown_appcontext
+def release_db(exc):
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_pool().putconn(conn)
 
 def init_db():
     try:
-        conn = get_db()
-        cur = conn.cursor()
-
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS schedules (
-                id TEXT PRIMARY KEY,
-                code TEXT NOT NULL UNIQUE,
-                name TEXT NOT NULL,
-                color TEXT NOT NULL DEFAULT '#1a3a6b',
-                is_addon BOOLEAN DEFAULT FALSE,
-                is_normal BOOLEAN DEFAULT FALSE,
-                bell_slot INTEGER DEFAULT 0,
-                times JSONB DEFAULT '[]'
-            )
-        """)
-        cur.execute("ALTER TABLE schedules ADD COLUMN IF NOT EXISTS is_normal BOOLEAN DEFAULT FALSE")
-        cur.execute("ALTER TABLE schedules ADD COLUMN IF NOT EXISTS bell_slot INTEGER DEFAULT 0")
+        with get_pool().connection() as conn:
+            cur = conn.cursor()
 
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS table_rows (
-                id TEXT PRIMARY KEY,
-                code TEXT NOT NULL,
-                from_date TEXT NOT NULL,
-                to_date TEXT,
-                comment TEXT DEFAULT ''
-            )
-        """)
-
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS ringtone_mappings (
-                slot INTEGER PRIMARY KEY,
-                filename TEXT NOT NULL
-            )
-        """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schedules (
+                    id TEXT PRIMARY KEY,
+                    code TEXT NOT NULL UNIQUE,
+                    name TEXT NOT NULL,
+                    color TEXT NOT NULL DEFAULT '#1a3a6b',
+                    is_addon BOOLEAN DEFAULT FALSE,
+                    is_normal BOOLEAN DEFAULT FALSE,
+                    bell_slot INTEGER DEFAULT 0,
+                    times JSONB DEFAULT '[]'
+                )
+            """)
+            cur.execute("ALTER TABLE schedules ADD COLUMN IF NOT EXISTS is_normal BOOLEAN DEFAULT FALSE")
+            cur.execute("ALTER TABLE schedules ADD COLUMN IF NOT EXISTS bell_slot INTEGER DEFAULT 0")
 
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS school_years (
-                id TEXT PRIMARY KEY,
-                label TEXT NOT NULL UNIQUE,
-                from_date TEXT NOT NULL,
-                to_date TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT NOW()
-            )
-        """)
-
-        # Users table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id TEXT PRIMARY KEY,
-                email TEXT NOT NULL UNIQUE,
-                name TEXT NOT NULL,
-                password_hash TEXT NOT NULL,
-                role TEXT NOT NULL DEFAULT 'user',
-                created_at TIMESTAMP DEFAULT NOW()
-            )
-        """)
-
-        # Audit log table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS audit_log (
-                id TEXT PRIMARY KEY,
-                user_email TEXT NOT NULL,
-                user_name TEXT NOT NULL,
-                action TEXT NOT NULL,
-                entity_type TEXT NOT NULL,
-                entity_id TEXT,
-                details JSONB,
-                created_at TIMESTAMP DEFAULT NOW()
-            )
-        """)
-
-        # Schedule snapshots table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS schedule_snapshots (
-                id TEXT PRIMARY KEY,
-                label TEXT NOT NULL,
-                created_by_email TEXT NOT NULL,
-                created_by_name TEXT NOT NULL,
-                schedules JSONB NOT NULL,
-                table_rows JSONB NOT NULL,
-                created_at TIMESTAMP DEFAULT NOW()
-            )
-        """)
-
-        conn.commit()
-
-        # Seed default school years if empty
-        cur.execute("SELECT COUNT(*) as count FROM school_years")
-        if cur.fetchone()['count'] == 0:
-            default_years = [
-                ("sy-2025-2026", "2025/2026", "2025-08-01", "2026-07-31"),
-                ("sy-2024-2025", "2024/2025", "2024-08-01", "2025-07-31"),
-                ("sy-2023-2024", "2023/2024", "2023-08-01", "2024-07-31"),
-                ("sy-2022-2023", "2022/2023", "2022-08-01", "2023-07-31"),
-                ("sy-2021-2022", "2021/2022", "2021-08-01", "2022-07-31"),
-                ("sy-2020-2021", "2020/2021", "2020-08-01", "2021-07-31"),
-                ("sy-2019-2020", "2019/2020", "2019-08-01", "2020-07-31"),
-            ]
-            for sid, label, from_d, to_d in default_years:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS table_rows (
+                    id TEXT PRIMARY KEY,
+                    code TEXT NOT NULL,
+                    from_date DATE NOT NULL,
+                    to_date DATE,
+                    comment TEXT DEFAULT ''
+                )
+            """)
+            # Older databases stored dates as TEXT, with '' for "no end date"
+            cur.execute("""
+                SELECT data_type FROM information_schema.columns
+                WHERE table_name = 'table_rows' AND column_name = 'from_date'
+            """)
+            if cur.fetchone()['data_type'] != 'date':
                 cur.execute("""
-                    INSERT INTO school_years (id, label, from_date, to_date)
-                    VALUES (%s, %s, %s, %s) ON CONFLICT (label) DO NOTHING
-                """, (sid, label, from_d, to_d))
-            conn.commit()
-            print("✅ Default school years seeded")
+                    ALTER TABLE table_rows
+                        ALTER COLUMN from_date TYPE DATE USING from_date::date,
+                        ALTER COLUMN to_date   TYPE DATE USING NULLIF(to_date, '')::date
+                """)
+                print("✅ table_rows dates migrated to DATE")
+            cur.execute("""
+                ALTER TABLE table_rows ADD COLUMN IF NOT EXISTS span DATERANGE
+                GENERATED ALWAYS AS (
+                    daterange(from_date, GREATEST(COALESCE(to_date, from_date), from_date), '[]')
+                ) STORED
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_table_rows_span ON table_rows USING GIST (span)")
+
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_table_rows_keyset ON table_rows (from_date, code, id)")
 
-        # Seed admin user if no users exist
-        cur.execute("SELECT COUNT(*) as count FROM users")
-        if cur.fetchone()['count'] == 0:
             cur.execute("""
-                INSERT INTO users (id, email, name, password_hash, role)
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (email) DO NOTHING
-            """, (
-                'user-admin-1',
-                'boo@crics.asia',
-                'Boo',
-                generate_password_hash('boo123'),
-                'admin'
-            ))
-            conn.commit()
-            print("✅ Admin user seeded")
+                CREATE TABLE IF NOT EXISTS ringtone_mappings (
+                    slot INTEGER PRIMARY KEY,
+                    filename TEXT NOT NULL
+                )
+            """)
 
-        # Seed Normal schedule if empty
-        cur.execute("SELECT COUNT(*) as count FROM schedules WHERE is_normal = TRUE")
-        if cur.fetchone()['count'] == 0:
             cur.execute("""
-                INSERT INTO schedules (id, code, name, color, is_addon, is_normal, times)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (code) DO NOTHING
-            """, (
-                "normal-schedule", "N", "Normal Schedule", "#1a3a6b", False, True,
-                json.dumps([
-                    {"time": "07:55", "label": "Pre-1st period",    "muted": False},
-                    {"time": "08:00", "label": "1st period",         "muted": False},
-                    {"time": "08:50", "label": "Pre-2nd period",     "muted": False},
-                    {"time": "08:55", "label": "2nd period",         "muted": False},
-                    {"time": "09:45", "label": "Morning break",      "muted": False},
-                    {"time": "09:50", "label": "Pre-3rd period",     "muted": False},
-                    {"time": "09:55", "label": "3rd period",         "muted": False},
-                    {"time": "10:00", "label": "Elementary restart", "muted": False},
-                    {"time": "10:45", "label": "Pre-4th period",     "muted": False},
-                    {"time": "10:50", "label": "4th period",         "muted": False},
-                    {"time": "11:40", "label": "Lunch break",        "muted": False},
-                    {"time": "12:20", "label": "Pre-5th period",     "muted": False},
-                    {"time": "12:25", "label": "5th period",         "muted": False},
-                    {"time": "13:15", "label": "Pre-6th period",     "muted": False},
-                    {"time": "13:20", "label": "6th period",         "muted": False},
-                    {"time": "14:10", "label": "Pre-7th period",     "muted": False},
-                    {"time": "14:15", "label": "7th period",         "muted": False},
-                    {"time": "14:55", "label": "Pre-8th period",     "muted": False},
-                    {"time": "15:00", "label": "8th period",         "muted": False},
-                    {"time": "15:40", "label": "School end",         "muted": False},
-                ])
-            ))
+                CREATE TABLE IF NOT EXISTS school_years (
+                    id TEXT PRIMARY KEY,
+                    label TEXT NOT NULL UNIQUE,
+                    from_date TEXT NOT NULL,
+                    to_date TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT NOW()
+                )
+            """)
+
+            # Users table
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    id TEXT PRIMARY KEY,
+                    email TEXT NOT NULL UNIQUE,
+                    name TEXT NOT NULL,
+                    password_hash TEXT NOT NULL,
+                    role TEXT NOT NULL DEFAULT 'user',
+                    created_at TIMESTAMP DEFAULT NOW()
+                )
+            """)
+
+            # Audit log table (monthly partitions)
+            dropped = audit.install(cur)
+            if dropped:
+                print(f"🧹 Audit partitions dropped: {', '.join(dropped)}")
+
+            # Schedule snapshots table
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schedule_snapshots (
+                    id TEXT PRIMARY KEY,
+                    label TEXT NOT NULL,
+                    created_by_email TEXT NOT NULL,
+                    created_by_name TEXT NOT NULL,
+                    schedules JSONB NOT NULL,
+                    table_rows JSONB NOT NULL,
+                    created_at TIMESTAMP DEFAULT NOW()
+                )
+            """)
+
+            # Device fleet registry
+            devices.install(cur)
+
+            # Feed version counters (bumped by triggers)
+            feed_versions.install(cur)
+
+            # Row-level change log for ringdates deltas
+            changelog.install(cur)
+            changelog.prune(cur)
+
+            # Content-addressed snapshot blobs
+            snapshot_store.install(cur)
+
             conn.commit()
-            print("✅ Normal Schedule seeded")
 
-        cur.close()
-        conn.close()
+            # Move old inline snapshots onto manifests
+            migrated = snapshot_store.migrate_legacy(cur)
+            if migrated:
+                conn.commit()
+                print(f"✅ {migrated} snapshots moved to blob storage")
+
+            # Seed default school years if empty
+            cur.execute("SELECT COUNT(*) as count FROM school_years")
+            if cur.fetchone()['count'] == 0:
+                default_years = [
+                    ("sy-2025-2026", "2025/2026", "2025-08-01", "2026-07-31"),
+                    ("sy-2024-2025", "2024/2025", "2024-08-01", "2025-07-31"),
+                    ("sy-2023-2024", "2023/2024", "2023-08-01", "2024-07-31"),
+                    ("sy-2022-2023", "2022/2023", "2022-08-01", "2023-07-31"),
+                    ("sy-2021-2022", "2021/2022", "2021-08-01", "2022-07-31"),
+                    ("sy-2020-2021", "2020/2021", "2020-08-01", "2021-07-31"),
+                    ("sy-2019-2020", "2019/2020", "2019-08-01", "2020-07-31"),
+                ]
+                for sid, label, from_d, to_d in default_years:
+                    cur.execute("""
+                        INSERT INTO school_years (id, label, from_date, to_date)
+                        VALUES (%s, %s, %s, %s) ON CONFLICT (label) DO NOTHING
+                    """, (sid, label, from_d, to_d))
+                conn.commit()
+                print("✅ Default school years seeded")
+
+            # Seed admin user if no users exist
+            cur.execute("SELECT COUNT(*) as count FROM users")
+            if cur.fetchone()['count'] == 0:
+                cur.execute("""
+                    INSERT INTO users (id, email, name, password_hash, role)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT (email) DO NOTHING
+                """, (
+                    'user-admin-1',
+                    'boo@crics.asia',
+                    'Boo',
+                    generate_password_hash('boo123'),
+                    'admin'
+                ))
+                conn.commit()
+                print("✅ Admin user seeded")
+
+            # Seed Normal schedule if empty
+            cur.execute("SELECT COUNT(*) as count FROM schedules WHERE is_normal = TRUE")
+            if cur.fetchone()['count'] == 0:
+                cur.execute("""
+                    INSERT INTO schedules (id, code, name, color, is_addon, is_normal, times)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (code) DO NOTHING
+                """, (
+                    "normal-schedule", "N", "Normal Schedule", "#1a3a6b", False, True,
+                    json.dumps([
+                        {"time": "07:55", "label": "Pre-1st period",    "muted": False},
+                        {"time": "08:00", "label": "1st period",         "muted": False},
+                        {"time": "08:50", "label": "Pre-2nd period",     "muted": False},
+                        {"time": "08:55", "label": "2nd period",         "muted": False},
+                        {"time": "09:45", "label": "Morning break",      "muted": False},
+                        {"time": "09:50", "label": "Pre-3rd period",     "muted": False},
+                        {"time": "09:55", "label": "3rd period",         "muted": False},
+                        {"time": "10:00", "label": "Elementary restart", "muted": False},
+                        {"time": "10:45", "label": "Pre-4th period",     "muted": False},
+                        {"time": "10:50", "label": "4th period",         "muted": False},
+                        {"time": "11:40", "label": "Lunch break",        "muted": False},
+                        {"time": "12:20", "label": "Pre-5th period",     "muted": False},
+                        {"time": "12:25", "label": "5th period",         "muted": False},
+                        {"time": "13:15", "label": "Pre-6th period",     "muted": False},
+                        {"time": "13:20", "label": "6th period",         "muted": False},
+                        {"time": "14:10", "label": "Pre-7th period",     "muted": False},
+                        {"time": "14:15", "label": "7th period",         "muted": False},
+                        {"time": "14:55", "label": "Pre-8th period",     "muted": False},
+                        {"time": "15:00", "label": "8th period",         "muted": False},
+                        {"time": "15:40", "label": "School end",         "muted": False},
+                    ])
+                ))
+                conn.commit()
+                print("✅ Normal Schedule seeded")
+
+            cur.close()
     except Exception as e:
         print(f"❌ DB init error: {e}")
 
@@ -216,43 +286,43 @@ def init_db():
 # HELPERS
 # ============================================================================
 
-def row_to_schedule(row):
-    return {
-        'id':       row['id'],
-        'code':     row['code'],
-        'name':     row['name'],
-        'color':    row['color'],
-        'isAddon':  row['is_addon'],
-        'isNormal': row['is_normal'],
-        'bellSlot': row['bell_slot'] if row['bell_slot'] is not None else 0,
-        'times':    row['times'] if row['times'] else [],
-    }
-
-def row_to_table_row(row):
-    return {
-        'id':      row['id'],
-        'code':    row['code'],
-        'from':    row['from_date'],
-        'to':      row['to_date'] or '',
-        'comment': row['comment'] or '',
-    }
-
-def row_to_school_year(row):
-    return {
-        'id':    row['id'],
-        'label': row['label'],
-        'from':  row['from_date'],
-        'to':    row['to_date'],
-    }
-
-def row_to_user(row):
-    return {
-        'id':        row['id'],
-        'email':     row['email'],
-        'name':      row['name'],
-        'role':      row['role'],
-        'createdAt': row['created_at'].isoformat() if row['created_at'] else None,
-    }
+def json_response(data, status=200):
+    """Like jsonify(), but encoded by records.dumps()."""
+    return Response(records.dumps(data), status=status, mimetype='application/json')
+
+@app.errorhandler(records.ValidationError)
+def validation_error(e):
+    return jsonify({'error': str(e)}), 400
+
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, size=3):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('bad cursor')
+    return [str(v) for v in values]
+
+def feeds_changed():
+    """Call after committing a write to schedules, table_rows, ringtone_mappings, devices or school_years."""
+    feed_versions.cache.invalidate()
+    feed_cache.cache.invalidate()
+
+def on_db_change(table, version):
+    # Another worker (or this one) committed a change; drop what we have cached
+    feed_versions.cache.invalidate()
+    feed_cache.cache.invalidate()
+    if table in ('table_rows', 'schedules', notify.ALL):
+        try:
+            events.hub.refresh()
+        except Exception as e:
+            print(f"⚠️ Event hub refresh error: {e}")
+
+notify.listener.subscribe(on_db_change)
+feed_versions.cache.is_listening = notify.listener.is_connected
 
 def update_symlink(slot, filename):
     if not os.path.exists(SOUNDFILES_DIR):
@@ -269,26 +339,24 @@ def remove_symlink(slot):
     if os.path.islink(symlink):
         os.remove(symlink)
 
-def log_action(action, entity_type, entity_id=None, details=None):
-    """Log an action to the audit log."""
-    try:
-        conn = get_db(); cur = conn.cursor()
-        log_id = 'log-' + str(int(datetime.now().timestamp() * 1000))
-        cur.execute("""
-            INSERT INTO audit_log (id, user_email, user_name, action, entity_type, entity_id, details)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (
-            log_id,
-            session.get('user', 'unknown'),
-            session.get('name', 'Unknown'),
-            action,
-            entity_type,
-            entity_id,
-            json.dumps(details) if details else None
-        ))
-        conn.commit(); cur.close(); conn.close()
-    except Exception as e:
-        print(f"⚠️ Audit log error: {e}")
+def log_action(action, entity_type, entity_id=None, details=None, conn=None):
+    """Log an action to the audit log.
+
+    By default the event is queued for the background writer. Pass the
+    request's ``conn`` to write it inside that transaction instead; the
+    caller's commit then covers the audit row too.
+    """
+    event = audit.make_event(
+        session.get('user', 'unknown'),
+        session.get('name', 'Unknown'),
+        action, entity_type, entity_id, details,
+    )
+    if conn is None:
+        audit.writer.submit(event)
+        return
+    cur = conn.cursor()
+    audit.write_events(cur, [event])
+    cur.close()
 
 # ============================================================================
 # AUTH DECORATORS
@@ -326,7 +394,7 @@ def login():
     conn = get_db(); cur = conn.cursor()
     cur.execute("SELECT * FROM users WHERE email = %s", (email,))
     user = cur.fetchone()
-    cur.close(); conn.close()
+    cur.close()
 
     if user and check_password_hash(user['password_hash'], pwd):
         session.permanent = True
@@ -366,19 +434,17 @@ def check_auth():
 @app.route('/api/users', methods=['GET'])
 @admin_required
 def get_users():
-    conn = get_db(); cur = conn.cursor()
+    conn = get_db(); cur = records.tuple_cursor(conn)
     cur.execute("SELECT * FROM users ORDER BY created_at")
-    users = [row_to_user(r) for r in cur.fetchall()]
-    cur.close(); conn.close()
-    return jsonify(users)
+    users = records.USER.encode_rows(cur)
+    cur.close()
+    return json_response(users)
 
 @app.route('/api/users', methods=['POST'])
 @admin_required
 def create_user():
-    data = request.json
-    if not data.get('email') or not data.get('name') or not data.get('password'):
-        return jsonify({'error': 'email, name, and password are required'}), 400
-    uid = 'user-' + str(int(datetime.now().timestamp() * 1000))
+    data = records.USER.decode(request.json)
+    uid = new_id('user')
     conn = get_db(); cur = conn.cursor()
     try:
         cur.execute("""
@@ -386,19 +452,21 @@ def create_user():
             VALUES (%s, %s, %s, %s, %s) RETURNING *
         """, (uid, data['email'].strip().lower(), data['name'],
               generate_password_hash(data['password']),
-              data.get('role', 'user')))
+              data['role']))
         row = cur.fetchone(); conn.commit()
     except psycopg2.errors.UniqueViolation:
-        conn.rollback(); cur.close(); conn.close()
+        conn.rollback(); cur.close()
         return jsonify({'error': 'Email already exists'}), 409
-    cur.close(); conn.close()
-    log_action('create', 'user', uid, {'email': data['email'], 'role': data.get('role', 'user')})
-    return jsonify(row_to_user(row)), 201
+    cur.close()
+    log_action('create', 'user', uid, {'email': data['email'], 'role': data['role']})
+    return json_response(records.USER.from_row(row), 201)
 
 @app.route('/api/users/<uid>', methods=['PUT'])
 @admin_required
 def update_user(uid):
-    data = request.json
+    data = records.USER.decode(request.json, partial=True)
+    if not data.get('name') or not data.get('role'):
+        return jsonify({'error': 'name and role are required'}), 400
     conn = get_db(); cur = conn.cursor()
     if data.get('password'):
         cur.execute("""
@@ -408,10 +476,10 @@ def update_user(uid):
         cur.execute("""
             UPDATE users SET name=%s, role=%s WHERE id=%s RETURNING *
         """, (data['name'], data['role'], uid))
-    row = cur.fetchone(); conn.commit(); cur.close(); conn.close()
+    row = cur.fetchone(); conn.commit(); cur.close()
     if not row: return jsonify({'error': 'Not found'}), 404
     log_action('update', 'user', uid, {'name': data['name'], 'role': data['role']})
-    return jsonify(row_to_user(row))
+    return json_response(records.USER.from_row(row))
 
 @app.route('/api/users/<uid>', methods=['DELETE'])
 @admin_required
@@ -420,7 +488,7 @@ def delete_user(uid):
         return jsonify({'error': 'Cannot delete your own account'}), 400
     conn = get_db(); cur = conn.cursor()
     cur.execute("DELETE FROM users WHERE id=%s", (uid,))
-    conn.commit(); cur.close(); conn.close()
+    conn.commit(); cur.close()
     log_action('delete', 'user', uid)
     return jsonify({'success': True})
 
@@ -431,25 +499,69 @@ def delete_user(uid):
 @app.route('/api/audit-log', methods=['GET'])
 @admin_required
 def get_audit_log():
-    conn = get_db(); cur = conn.cursor()
-    limit = request.args.get('limit', 100)
-    cur.execute("""
-        SELECT * FROM audit_log ORDER BY created_at DESC LIMIT %s
-    """, (limit,))
-    logs = []
-    for row in cur.fetchall():
-        logs.append({
-            'id':          row['id'],
-            'userEmail':   row['user_email'],
-            'userName':    row['user_name'],
-            'action':      row['action'],
-            'entityType':  row['entity_type'],
-            'entityId':    row['entity_id'],
-            'details':     row['details'],
-            'createdAt':   row['created_at'].isoformat(),
-        })
-    cur.close(); conn.close()
-    return jsonify(logs)
+    """Newest first. Filters: user, entityType, entityId, action, from, to
+    (timestamps). Paged by limit + cursor on (created_at, id); the next
+    cursor comes back in X-Next-Cursor."""
+    args = request.args
+    try:
+        limit = int(args.get('limit', 100))
+        after = decode_cursor(args['cursor'], size=2) if args.get('cursor') else None
+        if after:
+            after = (datetime.fromisoformat(after[0]), after[1])
+        since = datetime.fromisoformat(args['from']) if args.get('from') else None
+        until = datetime.fromisoformat(args['to']) if args.get('to') else None
+    except (ValueError, TypeError):
+        return jsonify({'error': 'invalid limit, cursor, from or to'}), 400
+    if not (1 <= limit <= MAX_PAGE_SIZE):
+        return jsonify({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
+
+    where, params = [], []
+    for arg, column in (('user', 'user_email'), ('entityType', 'entity_type'),
+                        ('entityId', 'entity_id'), ('action', 'action')):
+        if args.get(arg):
+            where.append(f"{column} = %s"); params.append(args[arg])
+    if since:
+        where.append("created_at >= %s"); params.append(since)
+    if until:
+        where.append("created_at < %s"); params.append(until)
+    if after:
+        where.append("(created_at, id) < (%s, %s)"); params.extend(after)
+    sql = "SELECT * FROM audit_log"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY created_at DESC, id DESC LIMIT %s"
+    params.append(limit + 1)
+
+    conn = get_db(); cur = records.tuple_cursor(conn)
+    cur.execute(sql, params)
+    logs = records.AUDIT_ENTRY.encode_rows(cur)
+    cur.close()
+    has_more = len(logs) > limit
+    logs = logs[:limit]
+    resp = json_response(logs)
+    if has_more:
+        last = logs[-1]
+        resp.headers['X-Next-Cursor'] = encode_cursor((last['createdAt'], last['id']))
+    return resp
+
+# ============================================================================
+# SYSTEM STATS (admin only)
+# ============================================================================
+
+@app.route('/api/db-pool', methods=['GET'])
+@admin_required
+def db_pool_stats():
+    return jsonify(get_pool().stats())
+
+@app.route('/api/feed-cache', methods=['GET'])
+@admin_required
+def feed_cache_stats():
+    return jsonify(feed_cache.cache.stats())
+
+@app.route('/api/db-listener', methods=['GET'])
+@admin_required
+def db_listener_stats():
+    return jsonify(dict(notify.listener.stats, connected=notify.listener.is_connected()))
 
 # ============================================================================
 # SNAPSHOTS API
@@ -458,74 +570,57 @@ def get_audit_log():
 @app.route('/api/snapshots', methods=['GET'])
 @login_required
 def get_snapshots():
-    conn = get_db(); cur = conn.cursor()
+    conn = get_db(); cur = records.tuple_cursor(conn)
     cur.execute("SELECT id, label, created_by_email, created_by_name, created_at FROM schedule_snapshots ORDER BY created_at DESC")
-    snapshots = []
-    for row in cur.fetchall():
-        snapshots.append({
-            'id':            row['id'],
-            'label':         row['label'],
-            'createdByEmail': row['created_by_email'],
-            'createdByName':  row['created_by_name'],
-            'createdAt':     row['created_at'].isoformat(),
-        })
-    cur.close(); conn.close()
-    return jsonify(snapshots)
+    snapshots = records.SNAPSHOT.encode_rows(cur)
+    cur.close()
+    return json_response(snapshots)
 
 @app.route('/api/snapshots', methods=['POST'])
 @login_required
 def create_snapshot():
-    data = request.json
-    if not data.get('label'):
-        return jsonify({'error': 'label is required'}), 400
+    data = records.SNAPSHOT.decode(request.json)
 
     conn = get_db(); cur = conn.cursor()
 
     # Get current state
-    cur.execute("SELECT * FROM schedules ORDER BY is_normal DESC, code")
-    schedules = [row_to_schedule(r) for r in cur.fetchall()]
+    tcur = records.tuple_cursor(conn)
+    tcur.execute("SELECT * FROM schedules ORDER BY is_normal DESC, code")
+    schedules = records.SCHEDULE.encode_rows(tcur)
 
-    cur.execute("SELECT * FROM table_rows ORDER BY from_date, code")
-    table_rows = [row_to_table_row(r) for r in cur.fetchall()]
+    tcur.execute("SELECT * FROM table_rows ORDER BY from_date, code")
+    table_rows = records.TABLE_ROW.encode_rows(tcur)
+    tcur.close()
 
-    sid = 'snap-' + str(int(datetime.now().timestamp() * 1000))
+    sid = new_id('snap')
+    manifest, hashes = snapshot_store.store(cur, schedules, table_rows)
     cur.execute("""
-        INSERT INTO schedule_snapshots (id, label, created_by_email, created_by_name, schedules, table_rows)
+        INSERT INTO schedule_snapshots (id, label, created_by_email, created_by_name, manifest, blob_hashes)
         VALUES (%s, %s, %s, %s, %s, %s) RETURNING id, label, created_by_email, created_by_name, created_at
     """, (
         sid,
         data['label'],
         session.get('user'),
         session.get('name'),
-        json.dumps(schedules),
-        json.dumps(table_rows)
+        json.dumps(manifest),
+        hashes
     ))
-    row = cur.fetchone(); conn.commit(); cur.close(); conn.close()
+    row = cur.fetchone(); conn.commit(); cur.close()
     log_action('create', 'snapshot', sid, {'label': data['label']})
-    return jsonify({
-        'id':            row['id'],
-        'label':         row['label'],
-        'createdByEmail': row['created_by_email'],
-        'createdByName':  row['created_by_name'],
-        'createdAt':     row['created_at'].isoformat(),
-    }), 201
+    return json_response(records.SNAPSHOT.from_row(row), 201)
 
 @app.route('/api/snapshots/<sid>', methods=['GET'])
 @login_required
 def get_snapshot(sid):
     conn = get_db(); cur = conn.cursor()
     cur.execute("SELECT * FROM schedule_snapshots WHERE id=%s", (sid,))
-    row = cur.fetchone(); cur.close(); conn.close()
-    if not row: return jsonify({'error': 'Not found'}), 404
-    return jsonify({
-        'id':            row['id'],
-        'label':         row['label'],
-        'createdByEmail': row['created_by_email'],
-        'createdByName':  row['created_by_name'],
-        'createdAt':     row['created_at'].isoformat(),
-        'schedules':     row['schedules'],
-        'tableRows':     row['table_rows'],
-    })
+    row = cur.fetchone()
+    if not row:
+        cur.close()
+        return jsonify({'error': 'Not found'}), 404
+    schedules, table_rows = snapshot_store.materialise(cur, row)
+    cur.close()
+    return json_response(dict(records.SNAPSHOT.from_row(row), schedules=schedules, tableRows=table_rows))
 
 @app.route('/api/snapshots/<sid>/restore', methods=['POST'])
 @admin_required
@@ -534,45 +629,43 @@ def restore_snapshot(sid):
     cur.execute("SELECT * FROM schedule_snapshots WHERE id=%s", (sid,))
     snap = cur.fetchone()
     if not snap:
-        cur.close(); conn.close()
+        cur.close()
         return jsonify({'error': 'Not found'}), 404
 
-    schedules  = snap['schedules']
-    table_rows = snap['table_rows']
-
-    # Restore schedules (skip normal)
-    for sch in schedules:
-        if sch.get('isNormal'): continue
-        cur.execute("""
-            INSERT INTO schedules (id, code, name, color, is_addon, is_normal, bell_slot, times)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (id) DO UPDATE SET
-                code=%s, name=%s, color=%s, is_addon=%s, bell_slot=%s, times=%s
-        """, (
-            sch['id'], sch['code'], sch['name'], sch['color'],
-            sch['isAddon'], sch['isNormal'], sch['bellSlot'], json.dumps(sch['times']),
-            sch['code'], sch['name'], sch['color'],
-            sch['isAddon'], sch['bellSlot'], json.dumps(sch['times'])
-        ))
-
-    # Restore table rows
-    cur.execute("DELETE FROM table_rows")
-    for row in table_rows:
-        cur.execute("""
-            INSERT INTO table_rows (id, code, from_date, to_date, comment)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (row['id'], row['code'], row['from'], row.get('to') or None, row.get('comment', '')))
-
-    conn.commit(); cur.close(); conn.close()
-    log_action('restore', 'snapshot', sid, {'label': snap['label']})
-    return jsonify({'success': True})
+    started = time.perf_counter()
+    # Block concurrent writers (not readers) so the diff stays valid until commit
+    cur.execute("LOCK TABLE schedules, table_rows IN SHARE ROW EXCLUSIVE MODE")
+    tcur = records.tuple_cursor(conn)
+    tcur.execute("SELECT * FROM schedules")
+    live_schedules = records.SCHEDULE.encode_rows(tcur)
+    tcur.execute("SELECT * FROM table_rows")
+    live_rows = records.TABLE_ROW.encode_rows(tcur)
+    tcur.close()
+    loaded = time.perf_counter()
+
+    snap_schedules, snap_rows = snapshot_store.materialise(cur, snap)
+    plan = restore.plan_restore(live_schedules, live_rows, snap_schedules, snap_rows)
+    diffed = time.perf_counter()
+    timings = restore.apply_restore(cur, plan)
+    timings['load'] = (loaded - started) * 1000
+    timings['diff'] = (diffed - loaded) * 1000
+    result = restore.summary(plan, timings)
+
+    log_action('restore', 'snapshot', sid, dict(result, label=snap['label']), conn=conn)
+    conn.commit(); cur.close()
+    feeds_changed()
+    result['timingMs']['total'] = round((time.perf_counter() - started) * 1000, 2)
+    return jsonify(dict(result, success=True))
 
 @app.route('/api/snapshots/<sid>', methods=['DELETE'])
 @admin_required
 def delete_snapshot(sid):
     conn = get_db(); cur = conn.cursor()
-    cur.execute("DELETE FROM schedule_snapshots WHERE id=%s", (sid,))
-    conn.commit(); cur.close(); conn.close()
+    cur.execute("DELETE FROM schedule_snapshots WHERE id=%s RETURNING blob_hashes", (sid,))
+    row = cur.fetchone()
+    if row:
+        snapshot_store.collect_garbage(cur, row['blob_hashes'])
+    conn.commit(); cur.close()
     log_action('delete', 'snapshot', sid)
     return jsonify({'success': True})
 
@@ -583,19 +676,17 @@ def delete_snapshot(sid):
 @app.route('/api/school-years', methods=['GET'])
 @login_required
 def get_school_years():
-    conn = get_db(); cur = conn.cursor()
+    conn = get_db(); cur = records.tuple_cursor(conn)
     cur.execute("SELECT * FROM school_years ORDER BY from_date DESC")
-    years = [row_to_school_year(r) for r in cur.fetchall()]
-    cur.close(); conn.close()
-    return jsonify(years)
+    years = records.SCHOOL_YEAR.encode_rows(cur)
+    cur.close()
+    return json_response(years)
 
 @app.route('/api/school-years', methods=['POST'])
 @login_required
 def create_school_year():
-    data = request.json
-    if not data.get('label') or not data.get('from') or not data.get('to'):
-        return jsonify({'error': 'label, from, and to are required'}), 400
-    sid = 'sy-' + str(int(datetime.now().timestamp() * 1000))
+    data = records.SCHOOL_YEAR.decode(request.json)
+    sid = new_id('sy')
     conn = get_db(); cur = conn.cursor()
     try:
         cur.execute("""
@@ -604,16 +695,17 @@ def create_school_year():
         """, (sid, data['label'], data['from'], data['to']))
         row = cur.fetchone(); conn.commit()
     except psycopg2.errors.UniqueViolation:
-        conn.rollback(); cur.close(); conn.close()
+        conn.rollback(); cur.close()
         return jsonify({'error': f"Year '{data['label']}' already exists"}), 409
-    cur.close(); conn.close()
+    cur.close()
+    feeds_changed()
     log_action('create', 'school_year', sid, {'label': data['label']})
-    return jsonify(row_to_school_year(row)), 201
+    return json_response(records.SCHOOL_YEAR.from_row(row), 201)
 
 @app.route('/api/school-years/<sid>', methods=['PUT'])
 @login_required
 def update_school_year(sid):
-    data = request.json
+    data = records.SCHOOL_YEAR.decode(request.json)
     conn = get_db(); cur = conn.cursor()
     try:
         cur.execute("""
@@ -621,19 +713,21 @@ def update_school_year(sid):
         """, (data['label'], data['from'], data['to'], sid))
         row = cur.fetchone(); conn.commit()
     except psycopg2.errors.UniqueViolation:
-        conn.rollback(); cur.close(); conn.close()
+        conn.rollback(); cur.close()
         return jsonify({'error': f"Year '{data['label']}' already exists"}), 409
-    cur.close(); conn.close()
+    cur.close()
     if not row: return jsonify({'error': 'Not found'}), 404
+    feeds_changed()
     log_action('update', 'school_year', sid, {'label': data['label']})
-    return jsonify(row_to_school_year(row))
+    return json_response(records.SCHOOL_YEAR.from_row(row))
 
 @app.route('/api/school-years/<sid>', methods=['DELETE'])
 @login_required
 def delete_school_year(sid):
     conn = get_db(); cur = conn.cursor()
     cur.execute("DELETE FROM school_years WHERE id=%s", (sid,))
-    conn.commit(); cur.close(); conn.close()
+    conn.commit(); cur.close()
+    feeds_changed()
     log_action('delete', 'school_year', sid)
     return jsonify({'success': True})
 
@@ -644,56 +738,87 @@ def delete_school_year(sid):
 @app.route('/api/schedules', methods=['GET'])
 @login_required
 def get_schedules():
-    conn = get_db(); cur = conn.cursor()
+    conn = get_db(); cur = records.tuple_cursor(conn)
     cur.execute("SELECT * FROM schedules ORDER BY is_normal DESC, code")
-    schedules = [row_to_schedule(r) for r in cur.fetchall()]
-    cur.close(); conn.close()
-    return jsonify(schedules)
+    schedules = records.SCHEDULE.encode_rows(cur)
+    cur.close()
+    return json_response(schedules)
 
 @app.route('/api/schedules', methods=['POST'])
 @login_required
 def create_schedule():
-    data = request.json
-    if not data.get('code') or not data.get('name'):
-        return jsonify({'error': 'code and name are required'}), 400
-    sid = str(int(datetime.now().timestamp() * 1000))
+    data = records.SCHEDULE.decode(request.json)
+    sid = new_id()
     conn = get_db(); cur = conn.cursor()
     try:
         cur.execute("""
             INSERT INTO schedules (id, code, name, color, is_addon, is_normal, bell_slot, times)
             VALUES (%s, %s, %s, %s, %s, FALSE, %s, %s) RETURNING *
-        """, (sid, data['code'], data['name'],
-              data.get('color', '#2a5298'),
-              data.get('isAddon', False),
-              data.get('bellSlot', 0),
-              json.dumps(data.get('times', []))))
+        """, (sid, data['code'], data['name'], data['color'], data['isAddon'],
+              data['bellSlot'], json.dumps(data['times'])))
         row = cur.fetchone(); conn.commit()
     except psycopg2.errors.UniqueViolation:
-        conn.rollback(); cur.close(); conn.close()
+        conn.rollback(); cur.close()
         return jsonify({'error': f"Code '{data['code']}' already exists"}), 409
-    cur.close(); conn.close()
+    cur.close()
+    feeds_changed()
     log_action('create', 'schedule', sid, {'code': data['code'], 'name': data['name']})
-    return jsonify(row_to_schedule(row)), 201
+    return json_response(records.SCHEDULE.from_row(row), 201)
 
 @app.route('/api/schedules/<sid>', methods=['PUT'])
 @login_required
 def update_schedule(sid):
-    data = request.json
+    data = records.SCHEDULE.decode(request.json)
     conn = get_db(); cur = conn.cursor()
     cur.execute("""
         UPDATE schedules
         SET code=%s, name=%s, color=%s, is_addon=%s, bell_slot=%s, times=%s
         WHERE id=%s RETURNING *
-    """, (data.get('code'), data.get('name'),
-          data.get('color', '#2a5298'),
-          data.get('isAddon', False),
-          data.get('bellSlot', 0),
-          json.dumps(data.get('times', [])),
-          sid))
-    row = cur.fetchone(); conn.commit(); cur.close(); conn.close()
+    """, (data['code'], data['name'], data['color'], data['isAddon'],
+          data['bellSlot'], json.dumps(data['times']), sid))
+    row = cur.fetchone(); conn.commit(); cur.close()
     if not row: return jsonify({'error': 'Not found'}), 404
-    log_action('update', 'schedule', sid, {'code': data.get('code'), 'name': data.get('name')})
-    return jsonify(row_to_schedule(row))
+    feeds_changed()
+    log_action('update', 'schedule', sid, {'code': data['code'], 'name': data['name']})
+    return json_response(records.SCHEDULE.from_row(row))
+
+@app.route('/api/schedules/conflicts', methods=['GET'])
+@login_required
+def get_schedule_conflicts():
+    """Days whose merged bells collide, nearly duplicate or mute nothing.
+
+    Query args: schoolYear=<id>, or from and to; nearMinutes (default 2).
+    """
+    if conflicts.np is None:
+        return jsonify({'error': 'Conflict analysis needs numpy installed on the server'}), 501
+    args = request.args
+    try:
+        near = int(args.get('nearMinutes', conflicts.DEFAULT_NEAR_MINUTES))
+    except ValueError:
+        return jsonify({'error': 'nearMinutes must be an integer'}), 400
+    if not args.get('schoolYear'):
+        try:
+            start, end = parse_date(args['from']), parse_date(args['to'])
+        except KeyError:
+            return jsonify({'error': 'schoolYear, or from and to, are required'}), 400
+        except ValueError:
+            return jsonify({'error': 'from and to must be YYYY-MM-DD'}), 400
+        if end < start or (end - start).days >= MAX_RANGE_DAYS:
+            return jsonify({'error': f'to must not be before from, and the range is limited to {MAX_RANGE_DAYS} days'}), 400
+
+    conn = get_db(); cur = conn.cursor()
+    if args.get('schoolYear'):
+        year = school_year_range(cur, args['schoolYear'])
+        if not year:
+            cur.close()
+            return jsonify({'error': 'School year not found'}), 404
+        start, end = year
+
+    cur.execute("SELECT * FROM schedules")
+    engine = conflicts.ConflictEngine(cur.fetchall(), near_minutes=near)
+    report = engine.analyse_range(select_rows_in_range(cur, start, end).fetchall(), start, end)
+    cur.close()
+    return json_response(report)
 
 @app.route('/api/schedules/<sid>', methods=['DELETE'])
 @login_required
@@ -702,13 +827,14 @@ def delete_schedule(sid):
     cur.execute("SELECT is_normal, code FROM schedules WHERE id=%s", (sid,))
     row = cur.fetchone()
     if not row:
-        cur.close(); conn.close()
+        cur.close()
         return jsonify({'error': 'Not found'}), 404
     if row['is_normal']:
-        cur.close(); conn.close()
+        cur.close()
         return jsonify({'error': 'Cannot delete the Normal schedule'}), 403
     cur.execute("DELETE FROM schedules WHERE id=%s", (sid,))
-    conn.commit(); cur.close(); conn.close()
+    conn.commit(); cur.close()
+    feeds_changed()
     log_action('delete', 'schedule', sid, {'code': row['code']})
     return jsonify({'success': True})
 
@@ -719,62 +845,235 @@ def delete_schedule(sid):
 @app.route('/api/table-rows', methods=['GET'])
 @login_required
 def get_table_rows():
+    """All rows, or a window/page of them.
+
+    Optional query args: schoolYear=<id>, from, to (rows overlapping the
+    window), limit and cursor (keyset paging on from_date, code, id). When a
+    further page exists its cursor is sent in the X-Next-Cursor header.
+    """
+    args = request.args
+    if not any(k in args for k in ('schoolYear', 'from', 'to', 'limit', 'cursor')):
+        conn = get_db(); cur = records.tuple_cursor(conn)
+        cur.execute("SELECT * FROM table_rows ORDER BY from_date, code")
+        rows = records.TABLE_ROW.encode_rows(cur)
+        cur.close()
+        return json_response(rows)
+
+    try:
+        limit = int(args['limit']) if args.get('limit') else None
+        after = decode_cursor(args['cursor']) if args.get('cursor') else None
+        if after:
+            after[0] = parse_date(after[0])
+    except (ValueError, TypeError):
+        return jsonify({'error': 'invalid limit or cursor'}), 400
+    if limit is not None and not (1 <= limit <= MAX_PAGE_SIZE):
+        return jsonify({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
+    try:
+        win_from = parse_date(args['from']) if args.get('from') else None
+        win_to   = parse_date(args['to']) if args.get('to') else None
+    except ValueError:
+        return jsonify({'error': 'from and to must be YYYY-MM-DD'}), 400
+    if win_from and win_to and win_from > win_to:
+        return jsonify({'error': 'to must not be before from'}), 400
+
     conn = get_db(); cur = conn.cursor()
-    cur.execute("SELECT * FROM table_rows ORDER BY from_date, code")
-    rows = [row_to_table_row(r) for r in cur.fetchall()]
-    cur.close(); conn.close()
-    return jsonify(rows)
+    if args.get('schoolYear'):
+        year = school_year_range(cur, args['schoolYear'])
+        if not year:
+            cur.close()
+            return jsonify({'error': 'School year not found'}), 404
+        year_from, year_to = year
+        win_from = max(win_from or year_from, year_from)
+        win_to   = min(win_to or year_to, year_to)
+        if win_from > win_to:
+            # The requested window lies outside the school year
+            cur.close()
+            return json_response([])
+
+    where, params = [], []
+    if win_from or win_to:
+        where.append("span && daterange(%s::date, %s::date, '[]')"); params.extend([win_from, win_to])
+    if after:
+        where.append("(from_date, code, id) > (%s, %s, %s)"); params.extend(after)
+    sql = "SELECT * FROM table_rows"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY from_date, code, id"
+    if limit is not None:
+        sql += " LIMIT %s"; params.append(limit + 1)
+    cur.close()
+    cur = records.tuple_cursor(conn)
+    cur.execute(sql, params)
+    rows = records.TABLE_ROW.encode_rows(cur)
+    cur.close()
+
+    has_more = limit is not None and len(rows) > limit
+    if has_more:
+        rows = rows[:limit]
+    resp = json_response(rows)
+    if has_more:
+        last = rows[-1]
+        resp.headers['X-Next-Cursor'] = encode_cursor((last['from'], last['code'], last['id']))
+    return resp
 
 @app.route('/api/table-rows', methods=['POST'])
 @login_required
 def create_table_row():
-    data = request.json
-    if not data.get('code') or not data.get('from'):
-        return jsonify({'error': 'code and from are required'}), 400
-    rid = str(int(datetime.now().timestamp() * 1000))
+    data = records.TABLE_ROW.decode(request.json)
+    rid = new_id()
     conn = get_db(); cur = conn.cursor()
     cur.execute("""
         INSERT INTO table_rows (id, code, from_date, to_date, comment)
         VALUES (%s, %s, %s, %s, %s) RETURNING *
-    """, (rid, data['code'], data['from'], data.get('to') or None, data.get('comment', '')))
-    row = cur.fetchone(); conn.commit(); cur.close(); conn.close()
+    """, (rid, data['code'], data['from'], data['to'], data['comment']))
+    row = cur.fetchone(); conn.commit(); cur.close()
+    feeds_changed()
     log_action('create', 'table_row', rid, {'code': data['code'], 'from': data['from']})
-    return jsonify(row_to_table_row(row)), 201
+    return json_response(records.TABLE_ROW.from_row(row), 201)
+
+@app.route('/api/table-rows/batch', methods=['POST'])
+@login_required
+def batch_table_rows():
+    """Apply create/update/delete operations in one transaction.
+
+    Body: {"operations": [{"op": "create", "code", "from", "to", "comment"},
+    {"op": "update", "id", ...}, {"op": "delete", "id"}], "atomic": true}.
+    Each kind is applied with a single set-based statement. Results line up
+    with the operations and each carries its index (and id, when known). With atomic (the default) any failed operation
+    rolls the whole batch back and the response is 409.
+    """
+    data = request.json or {}
+    ops = data.get('operations') if isinstance(data, dict) else data
+    atomic = data.get('atomic', True) if isinstance(data, dict) else True
+    if not isinstance(ops, list) or not ops:
+        return jsonify({'error': 'operations must be a non-empty list'}), 400
+    if len(ops) > MAX_PAGE_SIZE:
+        return jsonify({'error': f'at most {MAX_PAGE_SIZE} operations per batch'}), 400
+
+    def result(i, status, rid=None, **extra):
+        op = ops[i] if isinstance(ops[i], dict) else {}
+        entry = {'index': i, 'op': op.get('op'), 'status': status}
+        rid = rid or op.get('id')
+        if rid:
+            entry['id'] = rid
+        entry.update(extra)
+        return entry
+
+    results = [None] * len(ops)
+    creates, updates, deletes = [], {}, {}
+    for i, op in enumerate(ops):
+        kind = op.get('op') if isinstance(op, dict) else None
+        if kind == 'create':
+            try:
+                row = records.TABLE_ROW.decode(op)
+            except records.ValidationError as e:
+                results[i] = result(i, 'error', error=str(e))
+                continue
+            creates.append((i, (new_id(), row['code'], row['from'], row['to'], row['comment'])))
+        elif kind in ('update', 'delete'):
+            rid = op.get('id')
+            if not rid:
+                results[i] = result(i, 'error', error='id is required')
+            elif rid in updates or rid in deletes:
+                results[i] = result(i, 'error', error='id appears more than once')
+            elif kind == 'update':
+                try:
+                    row = records.TABLE_ROW.decode(op)
+                except records.ValidationError as e:
+                    results[i] = result(i, 'error', error=str(e))
+                else:
+                    updates[rid] = (i, (rid, row['code'], row['from'], row['to'], row['comment']))
+            else:
+                deletes[rid] = i
+        else:
+            results[i] = result(i, 'error', error='op must be create, update or delete')
+
+    conn = get_db(); cur = conn.cursor()
+    if creates:
+        inserted = psycopg2.extras.execute_values(cur, """
+            INSERT INTO table_rows (id, code, from_date, to_date, comment) VALUES %s RETURNING *
+        """, [values for _, values in creates], page_size=len(creates), fetch=True)
+        by_id = {r['id']: r for r in inserted}
+        for i, values in creates:
+            results[i] = result(i, 'ok', values[0], row=records.TABLE_ROW.from_row(by_id[values[0]]))
+    if updates:
+        updated = psycopg2.extras.execute_values(cur, """
+            UPDATE table_rows AS t
+            SET code = v.code, from_date = v.from_date, to_date = v.to_date, comment = v.comment
+            FROM (VALUES %s) AS v (id, code, from_date, to_date, comment)
+            WHERE t.id = v.id RETURNING t.*
+        """, [values for _, values in updates.values()],
+            template="(%s, %s, %s::date, %s::date, %s)", page_size=len(updates), fetch=True)
+        by_id = {r['id']: r for r in updated}
+        for rid, (i, _) in updates.items():
+            if rid in by_id:
+                results[i] = result(i, 'ok', row=records.TABLE_ROW.from_row(by_id[rid]))
+            else:
+                results[i] = result(i, 'error', error='Not found')
+    if deletes:
+        cur.execute("DELETE FROM table_rows WHERE id = ANY(%s) RETURNING id", (list(deletes),))
+        gone = {r['id'] for r in cur.fetchall()}
+        for rid, i in deletes.items():
+            if rid in gone:
+                results[i] = result(i, 'ok')
+            else:
+                results[i] = result(i, 'error', error='Not found')
+
+    failed = sum(1 for r in results if r['status'] == 'error')
+    if failed and atomic:
+        conn.rollback(); cur.close()
+        for r in results:
+            if r['status'] == 'ok':
+                r['status'] = 'rolled_back'
+                r.pop('row', None)
+        return jsonify({'success': False, 'errors': failed, 'results': results}), 409
+
+    counts = {kind: sum(1 for r in results if r['op'] == kind and r['status'] == 'ok')
+              for kind in ('create', 'update', 'delete')}
+    conn.commit(); cur.close()
+    feeds_changed()
+    log_action('batch', 'table_row', None, dict(counts, errors=failed))
+    return json_response({'success': failed == 0, 'errors': failed, 'results': results})
 
 @app.route('/api/table-rows/date/<date_str>', methods=['PUT'])
 @login_required
 def replace_date_rows(date_str):
     data = request.json
+    if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
+        raise records.ValidationError('body must be a list of rows')
+    data = [records.TABLE_ROW.decode(dict(item, **{'from': date_str, 'to': None})) for item in data]
     conn = get_db(); cur = conn.cursor()
     cur.execute(
-        "DELETE FROM table_rows WHERE from_date=%s AND (to_date IS NULL OR to_date='')",
+        "DELETE FROM table_rows WHERE from_date=%s AND to_date IS NULL",
         (date_str,)
     )
     created = []
-    for i, item in enumerate(data):
-        rid = str(int(datetime.now().timestamp() * 1000)) + str(i)
-        cur.execute("""
-            INSERT INTO table_rows (id, code, from_date, to_date, comment)
-            VALUES (%s, %s, %s, NULL, %s) RETURNING *
-        """, (rid, item['code'], date_str, item.get('comment', '')))
-        created.append(row_to_table_row(cur.fetchone()))
-    conn.commit(); cur.close(); conn.close()
+    if data:
+        values = [(new_id(), item['code'], item['from'], item['comment']) for item in data]
+        inserted = psycopg2.extras.execute_values(cur, """
+            INSERT INTO table_rows (id, code, from_date, to_date, comment) VALUES %s RETURNING *
+        """, values, template="(%s, %s, %s, NULL, %s)", page_size=len(values), fetch=True)
+        by_id = {r['id']: r for r in inserted}
+        created = [records.TABLE_ROW.from_row(by_id[v[0]]) for v in values]
+    conn.commit(); cur.close()
+    feeds_changed()
     log_action('update', 'table_row', date_str, {'date': date_str, 'count': len(data)})
-    return jsonify(created)
+    return json_response(created)
 
 @app.route('/api/table-rows/<rid>', methods=['PUT'])
 @login_required
 def update_table_row(rid):
-    data = request.json
+    data = records.TABLE_ROW.decode(request.json)
     conn = get_db(); cur = conn.cursor()
     cur.execute("""
         UPDATE table_rows SET code=%s, from_date=%s, to_date=%s, comment=%s
         WHERE id=%s RETURNING *
-    """, (data.get('code'), data.get('from'), data.get('to') or None, data.get('comment', ''), rid))
-    row = cur.fetchone(); conn.commit(); cur.close(); conn.close()
+    """, (data['code'], data['from'], data['to'], data['comment'], rid))
+    row = cur.fetchone(); conn.commit(); cur.close()
     if not row: return jsonify({'error': 'Not found'}), 404
-    log_action('update', 'table_row', rid, {'code': data.get('code'), 'from': data.get('from')})
-    return jsonify(row_to_table_row(row))
+    feeds_changed()
+    log_action('update', 'table_row', rid, {'code': data['code'], 'from': data['from']})
+    return json_response(records.TABLE_ROW.from_row(row))
 
 @app.route('/api/table-rows/<rid>', methods=['DELETE'])
 @login_required
@@ -783,10 +1082,271 @@ def delete_table_row(rid):
     cur.execute("SELECT code, from_date FROM table_rows WHERE id=%s", (rid,))
     row = cur.fetchone()
     cur.execute("DELETE FROM table_rows WHERE id=%s", (rid,))
-    conn.commit(); cur.close(); conn.close()
+    conn.commit(); cur.close()
+    feeds_changed()
     log_action('delete', 'table_row', rid, {'code': row['code'] if row else None})
     return jsonify({'success': True})
 
+# ============================================================================
+# DAY PLAN API
+# ============================================================================
+
+def select_rows_in_range(cur, start, end):
+    """Execute the table_rows query for [start, end], ordered by (from_date, code) for
+    DayPlanner; returns the cursor to fetch from or iterate."""
+    cur.execute("""
+        SELECT code, from_date, to_date FROM table_rows
+        WHERE span && daterange(%s, %s, '[]')
+        ORDER BY from_date, code
+    """, (start, end))
+    return cur
+
+def school_year_range(cur, sid):
+    """(from, to) of a school year as dates, or None; the columns are TEXT."""
+    cur.execute("SELECT from_date::date, to_date::date FROM school_years WHERE id=%s", (sid,))
+    year = cur.fetchone()
+    return (year['from_date'], year['to_date']) if year else None
+
+def resolve_day_plans(cur, start, end):
+    cur.execute("SELECT * FROM schedules")
+    planner = DayPlanner(cur.fetchall())
+    return planner.plan_range(select_rows_in_range(cur, start, end).fetchall(), start, end)
+
+@app.route('/api/day-plan/<date_str>', methods=['GET'])
+@login_required
+def get_day_plan(date_str):
+    try:
+        day = parse_date(date_str)
+    except ValueError:
+        return jsonify({'error': 'date must be YYYY-MM-DD'}), 400
+    conn = get_db(); cur = conn.cursor()
+    plans = resolve_day_plans(cur, day, day)
+    cur.close()
+    return json_response(plans[0])
+
+@app.route('/api/day-plan', methods=['GET'])
+@login_required
+def get_day_plan_range():
+    try:
+        start = parse_date(request.args['from'])
+        end   = parse_date(request.args.get('to') or request.args['from'])
+    except KeyError:
+        return jsonify({'error': 'from is required'}), 400
+    except ValueError:
+        return jsonify({'error': 'from and to must be YYYY-MM-DD'}), 400
+    if end < start:
+        return jsonify({'error': 'to must not be before from'}), 400
+    if (end - start).days >= MAX_RANGE_DAYS:
+        return jsonify({'error': f'range is limited to {MAX_RANGE_DAYS} days'}), 400
+    conn = get_db(); cur = conn.cursor()
+    plans = resolve_day_plans(cur, start, end)
+    cur.close()
+    return json_response(plans)
+
+# ============================================================================
+# NEXT BELL
+# ============================================================================
+
+def current_timeline():
+    """This school year's bell timeline; rebuilt when schedules, rows or years change, or the date does."""
+    tz = timeline.school_tz()
+    today = datetime.now(tz).date()
+    versions = feed_versions.cache.snapshot(get_db)
+    version = (tuple(versions.get(t, (0, None))[0] for t in ('schedules', 'table_rows', 'school_years')), today)
+
+    def build():
+        conn = get_db(); cur = conn.cursor()
+        cur.execute("SELECT * FROM schedules")
+        schedules = cur.fetchall()
+        cur.execute("SELECT label, from_date::date, to_date::date FROM school_years")
+        years = cur.fetchall()
+        start, end, _ = timeline.current_window(years, today)
+        rows = select_rows_in_range(cur, start, end).fetchall()
+        cur.close()
+        return timeline.Timeline.build(schedules, rows, years, today, tz)
+
+    return feed_cache.cache.get('timeline', version, build)
+
+def next_bell_count():
+    count = int(request.args.get('count', 3))
+    if not 1 <= count <= timeline.MAX_COUNT:
+        raise ValueError
+    return count
+
+@app.route('/api/next-bell', methods=['GET'])
+@login_required
+def get_next_bell():
+    """Next bells, current period and countdown; ?at=<ISO datetime> previews a moment in the timeline."""
+    try:
+        count = next_bell_count()
+    except ValueError:
+        return jsonify({'error': f'count must be between 1 and {timeline.MAX_COUNT}'}), 400
+    tl = current_timeline()
+    now = datetime.now(tl.tz)
+    if request.args.get('at'):
+        try:
+            now = datetime.fromisoformat(request.args['at'])
+        except ValueError:
+            return jsonify({'error': 'at must be an ISO date-time'}), 400
+        if now.tzinfo is None:
+            now = now.replace(tzinfo=tl.tz)
+        if not tl.start <= now.astimezone(tl.tz).date() <= tl.end:
+            return jsonify({'error': f'at must fall between {tl.start} and {tl.end}'}), 400
+    return json_response(tl.lookup(now, count))
+
+# ============================================================================
+# CALENDAR EXPORT
+# ============================================================================
+
+def calendar_response(profile, name):
+    """Streamed .ics of the resolved bells for a profile; ?from, ?to (default: the
+    current or next school year) and ?codes=A,B to narrow it down."""
+    args = request.args
+    if args.get('codes'):
+        wanted = {c.strip() for c in args['codes'].split(',') if c.strip()}
+        if profile.codes is not None:
+            wanted &= profile.codes
+        profile = devices.Profile(wanted, profile.slot_overrides)
+    try:
+        start = parse_date(args['from']) if args.get('from') else None
+        end   = parse_date(args['to']) if args.get('to') else None
+    except ValueError:
+        return jsonify({'error': 'from and to must be YYYY-MM-DD'}), 400
+
+    conn = get_db(); cur = conn.cursor()
+    if start is None or end is None:
+        today = datetime.now(timeline.school_tz()).date()
+        cur.execute("""
+            SELECT from_date::date, to_date::date FROM school_years
+            WHERE to_date::date >= %s ORDER BY from_date::date LIMIT 1
+        """, (start or today,))
+        year = cur.fetchone()
+        if start is None:
+            start = year['from_date'] if year else today
+        if end is None:
+            end = year['to_date'] if year and year['to_date'] >= start else start + timedelta(days=365)
+    if end < start or (end - start).days >= ics.MAX_DAYS:
+        cur.close()
+        return jsonify({'error': f'to must not be before from, and the range is limited to {ics.MAX_DAYS} days'}), 400
+
+    versions = feed_versions.cache.snapshot(get_db)
+    etag, last_modified = feed_versions.feed_state('ringdates', versions)
+    etag = f"{etag}-ics-" + hashlib.sha1(f"{start}|{end}|{profile.key}|{name}".encode('utf-8')).hexdigest()[:12]
+    if not_modified(etag, last_modified):
+        cur.close()
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        return resp
+
+    cur.execute("SELECT * FROM schedules")
+    all_schedules = cur.fetchall()
+    schedules = profile.schedules(all_schedules)
+    cur.close()
+    tz = timeline.school_tz()
+    stamp = last_modified or datetime.now(tz)
+
+    def generate():
+        # Server-side cursor: rows are fetched in batches while the file is written
+        rows = conn.cursor(name='calendar_rows')
+        rows.itersize = 500
+        select_rows_in_range(rows, start, end)
+        try:
+            selected = profile.table_rows(rows, all_schedules)
+            lines = ics.calendar_lines(schedules, selected, start, end, tz, name, f"{profile.key}@bells", stamp)
+            yield from ics.chunks(lines)
+        finally:
+            rows.close()
+
+    resp = Response(stream_with_context(generate()), mimetype='text/calendar')
+    resp.set_etag(etag)
+    resp.last_modified = last_modified
+    resp.cache_control.no_cache = True
+    resp.headers['Content-Disposition'] = 'inline; filename="bells.ics"'
+    return resp
+
+@app.route('/api/calendar.ics', methods=['GET'])
+@login_required
+def get_calendar_ics():
+    return calendar_response(devices.Profile(None, None), 'Bells')
+
+# ============================================================================
+# DEVICES API
+# ============================================================================
+
+def flush_device_seen():
+    conn = get_db(); cur = conn.cursor()
+    devices.registry.flush_seen(cur)
+    conn.commit(); cur.close()
+
+@app.route('/api/devices', methods=['GET'])
+@admin_required
+def get_devices():
+    flush_device_seen()
+    conn = get_db(); cur = records.tuple_cursor(conn)
+    cur.execute("""
+        SELECT d.*, s.last_seen_at, s.last_ip, s.last_feed
+        FROM devices d LEFT JOIN device_seen s ON s.device_id = d.id
+        ORDER BY d.building, d.name
+    """)
+    rows = records.DEVICE.encode_rows(cur)
+    cur.close()
+    return json_response(rows)
+
+@app.route('/api/devices', methods=['POST'])
+@admin_required
+def create_device():
+    data = records.DEVICE.decode(request.json)
+    did = new_id('dev')
+    token = devices.new_token()
+    conn = get_db(); cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO devices (id, name, building, token_hash, schedule_codes, slot_overrides)
+        VALUES (%s, %s, %s, %s, %s, %s) RETURNING *
+    """, (did, data['name'], data['building'], devices.hash_token(token),
+          data['scheduleCodes'], json.dumps(data['slotOverrides'])))
+    row = cur.fetchone(); conn.commit(); cur.close()
+    feeds_changed()
+    log_action('create', 'device', did, {'name': data['name'], 'building': data['building']})
+    # The token is only ever shown here and on rotation; only its hash is stored
+    return json_response(dict(records.DEVICE.from_row(row), token=token), 201)
+
+@app.route('/api/devices/<did>', methods=['PUT'])
+@admin_required
+def update_device(did):
+    data = records.DEVICE.decode(request.json)
+    conn = get_db(); cur = conn.cursor()
+    cur.execute("""
+        UPDATE devices SET name=%s, building=%s, schedule_codes=%s, slot_overrides=%s
+        WHERE id=%s RETURNING *
+    """, (data['name'], data['building'], data['scheduleCodes'], json.dumps(data['slotOverrides']), did))
+    row = cur.fetchone(); conn.commit(); cur.close()
+    if not row: return jsonify({'error': 'Not found'}), 404
+    feeds_changed()
+    log_action('update', 'device', did, {'name': data['name'], 'building': data['building']})
+    return json_response(records.DEVICE.from_row(row))
+
+@app.route('/api/devices/<did>/token', methods=['POST'])
+@admin_required
+def rotate_device_token(did):
+    token = devices.new_token()
+    conn = get_db(); cur = conn.cursor()
+    cur.execute("UPDATE devices SET token_hash=%s WHERE id=%s RETURNING *", (devices.hash_token(token), did))
+    row = cur.fetchone(); conn.commit(); cur.close()
+    if not row: return jsonify({'error': 'Not found'}), 404
+    feeds_changed()
+    log_action('update', 'device', did, {'tokenRotated': True})
+    return json_response(dict(records.DEVICE.from_row(row), token=token))
+
+@app.route('/api/devices/<did>', methods=['DELETE'])
+@admin_required
+def delete_device(did):
+    conn = get_db(); cur = conn.cursor()
+    cur.execute("DELETE FROM devices WHERE id=%s", (did,))
+    conn.commit(); cur.close()
+    feeds_changed()
+    log_action('delete', 'device', did)
+    return jsonify({'success': True})
+
 # ============================================================================
 # RINGTONE MAPPINGS API
 # ============================================================================
@@ -796,7 +1356,7 @@ def delete_table_row(rid):
 def get_ringtone_mappings():
     conn = get_db(); cur = conn.cursor()
     cur.execute("SELECT slot, filename FROM ringtone_mappings ORDER BY slot")
-    rows = cur.fetchall(); cur.close(); conn.close()
+    rows = cur.fetchall(); cur.close()
     mappings = {str(i): None for i in range(10)}
     for row in rows:
         mappings[str(row['slot'])] = row['filename']
@@ -822,91 +1382,200 @@ def save_ringtone_mappings():
                 remove_symlink(slot)
         except (ValueError, TypeError):
             continue
-    conn.commit(); cur.close(); conn.close()
+    conn.commit(); cur.close()
+    feeds_changed()
     log_action('update', 'ringtone_mappings', None)
     return jsonify({'success': True})
 
+# ============================================================================
+# LIVE EVENTS (SSE)
+# ============================================================================
+
+events.ROW_CONVERTERS.update({'table_rows': records.TABLE_ROW.from_row, 'schedules': records.SCHEDULE.from_row})
+
+@app.route('/api/events', methods=['GET'])
+@login_required
+def event_stream():
+    """Live changes as SSE; 503 + Retry-After once this worker holds SSE_MAX_STREAMS streams."""
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID must be an integer'}), 400
+    if not events.slots.acquire():
+        resp = jsonify({'error': 'Too many live update streams open on this server; retry later'})
+        resp.status_code = 503
+        resp.headers['Retry-After'] = str(events.RETRY_AFTER)
+        return resp
+    poll = not notify.listener.is_connected()
+    resp = Response(events.stream(events.hub, last_id, poll=poll), mimetype='text/event-stream')
+    # The slot is freed when the server closes the response, however the stream ends
+    resp.call_on_close(events.slots.release)
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
+
 # ============================================================================
 # PUBLIC ENDPOINTS
 # ============================================================================
 
-@app.route('/public/ringtimes', methods=['GET'])
-def public_ringtimes():
+def not_modified(etag, last_modified):
+    return not is_resource_modified(request.environ, etag=etag, last_modified=last_modified)
+
+def feed_response(text, etag, last_modified, status=200):
+    resp = Response(text, status=status, mimetype='text/plain')
+    resp.set_etag(etag)
+    resp.last_modified = last_modified
+    resp.cache_control.no_cache = True
+    return resp
+
+def render_ringtimes(last_modified, profile=None):
+    conn = get_db(); cur = conn.cursor()
+    cur.execute("SELECT * FROM schedules ORDER BY is_normal DESC, code")
+    schedules = cur.fetchall()
+    cur.close()
+    if profile is not None:
+        schedules = profile.schedules(schedules)
+    return feeds.ringtimes_text(schedules, last_modified)
+
+def render_ringdates(last_modified, profile=None):
+    conn = get_db(); cur = conn.cursor()
+    cur.execute("SELECT code, is_addon, is_normal, times FROM schedules")
+    schedules = cur.fetchall()
+    sch_map = {r['code']: r['is_addon'] for r in schedules}
+    cur.execute("SELECT * FROM table_rows ORDER BY from_date, code")
+    rows = cur.fetchall()
+    cur.close()
+    if profile is not None:
+        rows = profile.table_rows(rows, schedules)
+    return feeds.ringdates_text(rows, sch_map, last_modified)
+
+def render_ringdates_delta(since):
+    """Changes to the ringdates file since a change_log version.
+
+    Lines are "U <id> <ringdates line>" (insert/update) and "D <id>". In
+    full mode the client drops what it has and applies the U lines; that
+    happens for since=0, a since older than the retained log, a since newer
+    than the log (database reset) or more than DELTA_MAX_CHANGES changes.
+    """
+    conn = get_db(); cur = conn.cursor()
+    lowest, current = changelog.version_bounds(cur)
+    full = feeds.needs_full_delta(since, lowest, current)
+
+    touched_ids, touched_codes = set(), set()
+    if not full:
+        changes = changelog.fetch_changes(cur, since, current)
+        if len(changes) > feeds.DELTA_MAX_CHANGES:
+            full = True
+        touched_ids, touched_codes = feeds.delta_targets(changes)
+
+    cur.execute("SELECT code, is_addon FROM schedules")
+    sch_map = {r['code']: r['is_addon'] for r in cur.fetchall()}
+    if full:
+        cur.execute("SELECT * FROM table_rows ORDER BY from_date, code")
+    else:
+        cur.execute("""
+            SELECT * FROM table_rows WHERE id = ANY(%s) OR code = ANY(%s)
+            ORDER BY from_date, code
+        """, (list(touched_ids), list(touched_codes)))
+    rows = cur.fetchall()
+    cur.close()
+    return feeds.ringdates_delta_text(rows, sch_map, since, current, full, touched_ids), current
+
+def feed_error(e):
+    metrics.feed_error(e)
+    return Response(f"# Error: {str(e)}", mimetype='text/plain'), 500
+
+def serve_feed(feed, render):
     try:
-        conn = get_db(); cur = conn.cursor()
-        cur.execute("SELECT * FROM schedules ORDER BY is_normal DESC, code")
-        schedules = cur.fetchall()
-        cur.execute("SELECT slot, filename FROM ringtone_mappings ORDER BY slot")
-        mappings = {str(r['slot']): r['filename'] for r in cur.fetchall()}
-        cur.close(); conn.close()
-
-        normal  = next((s for s in schedules if s['is_normal']), None)
-        special = [s for s in schedules if not s['is_normal']]
-
-        lines = [
-            "# Bell Schedule - ringtimes",
-            f"# Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-            "#",
-        ]
-
-        if normal and normal['times']:
-            slot = str(normal['bell_slot']) if normal['bell_slot'] is not None else '0'
-            lines.append(f"# Normal Schedule: {normal['name']}")
-            for t in normal['times']:
-                r = '-' if t.get('muted') else slot
-                lines.append(f"{t['time']} {r} {t['label']}")
-
-        for sch in special:
-            if not sch['times']: continue
-            if sch['code'].startswith('#'): continue
-            sch_char = sch['code'][0]
-            slot = str(sch['bell_slot']) if sch['bell_slot'] is not None else '0'
-            lines.append("")
-            lines.append(f"# {sch['name']} ({sch['code']})")
-            for t in sch['times']:
-                r = '-' if t.get('muted') else slot
-                lines.append(f"{t['time']}{sch_char}{r} {t['label']}")
-
-        return Response('\n'.join(lines), mimetype='text/plain')
+        etag, last_modified = feed_versions.cache.feed_state(feed, get_db)
+        if not_modified(etag, last_modified):
+            return feed_response('', etag, last_modified, status=304)
+        text = feed_cache.cache.get(feed, etag, lambda: render(last_modified))
+        return feed_response(text, etag, last_modified)
+    except Exception as e:
+        return feed_error(e)
+
+def serve_device_feed(token, feed, render):
+    """A feed compiled for one device's profile; devices sharing a profile share the cached text."""
+    try:
+        versions = feed_versions.cache.snapshot(get_db)
+        device = devices.registry.lookup(token, versions.get('devices', (0, None))[0], get_db)
+        if device is None:
+            return Response("# Error: unknown device", mimetype='text/plain'), 404
+        device_id, profile = device
+        devices.registry.touch(device_id, request.remote_addr, feed)
+        if devices.registry.flush_due():
+            flush_device_seen()
+
+        etag, last_modified = feed_versions.feed_state(feed, versions)
+        etag = f"{etag}-{profile.key}"
+        if not_modified(etag, last_modified):
+            return feed_response('', etag, last_modified, status=304)
+        text = feed_cache.cache.get(f"{feed}:{profile.key}", etag, lambda: render(last_modified, profile))
+        return feed_response(text, etag, last_modified)
     except Exception as e:
-        return Response(f"# Error: {str(e)}", mimetype='text/plain'), 500
+        return feed_error(e)
 
+@app.route('/public/ringtimes', methods=['GET'])
+def public_ringtimes():
+    return serve_feed('ringtimes', render_ringtimes)
 
 @app.route('/public/ringdates', methods=['GET'])
 def public_ringdates():
+    if 'since' not in request.args:
+        return serve_feed('ringdates', render_ringdates)
     try:
-        conn = get_db(); cur = conn.cursor()
-        cur.execute("SELECT code, is_addon FROM schedules")
-        sch_map = {r['code']: r['is_addon'] for r in cur.fetchall()}
-        cur.execute("SELECT * FROM table_rows ORDER BY from_date, code")
-        rows = cur.fetchall()
-        cur.close(); conn.close()
-
-        lines = [
-            "# Bell Schedule - ringdates",
-            f"# Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-            "#",
-        ]
-
-        for row in rows:
-            code     = row['code']
-            if code.startswith('#'): continue
-            from_d   = row['from_date']
-            to_d     = row['to_date'] or ''
-            comment  = row['comment'] or ''
-            is_addon = sch_map.get(code, False)
-            sch_char = code[0]
-            suffix   = '+' if is_addon else ''
-
-            if to_d and to_d != from_d:
-                lines.append(f"{from_d}/{to_d}{sch_char}{suffix}  {comment}")
-            else:
-                lines.append(f"{from_d}{sch_char}{suffix}  {comment}")
-
-        return Response('\n'.join(lines), mimetype='text/plain')
+        since = int(request.args['since'])
+    except ValueError:
+        return Response("# Error: since must be an integer", mimetype='text/plain'), 400
+    try:
+        text, version = render_ringdates_delta(since)
+        resp = Response(text, mimetype='text/plain')
+        resp.headers['X-Ringdates-Version'] = str(version)
+        resp.cache_control.no_cache = True
+        return resp
     except Exception as e:
-        return Response(f"# Error: {str(e)}", mimetype='text/plain'), 500
+        return feed_error(e)
+
+@app.route('/public/devices/<token>/ringtimes', methods=['GET'])
+def public_device_ringtimes(token):
+    return serve_device_feed(token, 'ringtimes', render_ringtimes)
+
+@app.route('/public/devices/<token>/ringdates', methods=['GET'])
+def public_device_ringdates(token):
+    return serve_device_feed(token, 'ringdates', render_ringdates)
+
+
+@app.route('/public/devices/<token>/calendar.ics', methods=['GET'])
+def public_device_calendar(token):
+    versions = feed_versions.cache.snapshot(get_db)
+    device = devices.registry.lookup(token, versions.get('devices', (0, None))[0], get_db)
+    if device is None:
+        return Response("# Error: unknown device", mimetype='text/plain'), 404
+    device_id, profile = device
+    devices.registry.touch(device_id, request.remote_addr, 'calendar')
+    cur = get_db().cursor()
+    cur.execute("SELECT name FROM devices WHERE id=%s", (device_id,))
+    row = cur.fetchone()
+    cur.close()
+    return calendar_response(profile, f"Bells - {row['name']}" if row else 'Bells')
 
+@app.route('/public/next-bell', methods=['GET'])
+def public_next_bell():
+    """For hallway displays: the next bells and the countdown, without a login."""
+    try:
+        count = next_bell_count()
+    except ValueError:
+        return jsonify({'error': f'count must be between 1 and {timeline.MAX_COUNT}'}), 400
+    try:
+        tl = current_timeline()
+        resp = json_response(tl.lookup(datetime.now(tl.tz), count))
+    except Exception as e:
+        metrics.feed_error(e)
+        return jsonify({'error': str(e)}), 500
+    resp.cache_control.no_cache = True
+    return resp
 
 @app.route('/', methods=['GET'])
 def index():
@@ -0,0 +1,293 @@
+"""
+Audit log storage and background writer.
+audit_log is range-partitioned by month; with AUDIT_RETENTION_MONTHS set,
+old months are dropped whole once they fall out of the retention window
+(by default everything is kept). Events are queued by
+app.log_action() and flushed with multi-row INSERTs when the batch fills
+up or the flush interval passes.
+"""
+
+import os
+import re
+import json
+import time
+import queue
+import atexit
+import threading
+from datetime import datetime, date
+
+import psycopg2
+import psycopg2.extras
+
+from db_pool import get_pool
+from ids import new_id
+
+INSERT_SQL = """
+    INSERT INTO audit_log (id, user_email, user_name, action, entity_type, entity_id, details, created_at)
+    VALUES %s
+"""
+
+def make_event(user_email, user_name, action, entity_type, entity_id=None, details=None):
+    """Build an audit_log row tuple; the timestamp is taken now, not at flush time."""
+    now = datetime.now()
+    return (
+        new_id('log'),
+        user_email,
+        user_name,
+        action,
+        entity_type,
+        entity_id,
+        json.dumps(details) if details else None,
+        now,
+    )
+
+def write_events(cur, events):
+    psycopg2.extras.execute_values(cur, INSERT_SQL, events, page_size=max(len(events), 1))
+
+
+# ============================================================================
+# STORAGE: monthly partitions + retention
+# ============================================================================
+
+RETENTION_MONTHS     = int(os.environ.get('AUDIT_RETENTION_MONTHS', 0))    # 0 keeps everything
+PARTITIONS_AHEAD     = 3
+MAINTENANCE_INTERVAL = float(os.environ.get('AUDIT_MAINTENANCE_INTERVAL', 6 * 3600))
+
+PARTITION_NAME = re.compile(r'^audit_log_y(\d{4})m(\d{2})$')
+
+TABLE_SQL = """
+    CREATE TABLE audit_log (
+        id TEXT NOT NULL,
+        user_email TEXT NOT NULL,
+        user_name TEXT NOT NULL,
+        action TEXT NOT NULL,
+        entity_type TEXT NOT NULL,
+        entity_id TEXT,
+        details JSONB,
+        created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at)
+"""
+
+INDEX_SQL = [
+    "CREATE INDEX IF NOT EXISTS idx_audit_log_time   ON audit_log (created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_log_user   ON audit_log (user_email, created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_log_entity ON audit_log (entity_type, entity_id, created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_log_action ON audit_log (action, created_at DESC, id DESC)",
+]
+
+
+def month_start(d):
+    return date(d.year, d.month, 1)
+
+def add_months(d, n):
+    m = d.month - 1 + n
+    return date(d.year + m // 12, m % 12 + 1, 1)
+
+def partition_name(month):
+    return f"audit_log_y{month.year:04d}m{month.month:02d}"
+
+
+def _lock(cur):
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext('audit_log_partitions'))")
+
+
+def ensure_partition(cur, month):
+    """Create the partition for ``month``, moving any rows the DEFAULT partition caught."""
+    name = partition_name(month)
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL AS present", (name,))
+    if cur.fetchone()['present']:
+        return False
+    lo, hi = month, add_months(month, 1)
+    cur.execute(f"CREATE TABLE {name} (LIKE audit_log INCLUDING DEFAULTS)")
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM audit_log_default WHERE created_at >= %s AND created_at < %s RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """, (lo, hi))
+    cur.execute(f"ALTER TABLE audit_log ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{lo.isoformat()}') TO ('{hi.isoformat()}')")
+    return True
+
+
+def apply_retention(cur, months=None, today=None):
+    """Drop whole monthly partitions older than the retention window; returns what was removed."""
+    if months is None:
+        months = RETENTION_MONTHS
+    if months <= 0:
+        return []
+    cutoff = add_months(month_start(today or date.today()), -months)
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'audit_log'::regclass
+    """)
+    dropped = []
+    for r in cur.fetchall():
+        m = PARTITION_NAME.match(r['relname'])
+        if m and date(int(m.group(1)), int(m.group(2)), 1) < cutoff:
+            cur.execute(f"DROP TABLE {r['relname']}")
+            dropped.append(r['relname'])
+    cur.execute("DELETE FROM audit_log_default WHERE created_at < %s", (cutoff,))
+    if cur.rowcount > 0:
+        dropped.append(f"{cur.rowcount} rows from audit_log_default")
+    return dropped
+
+
+def maintain(cur, today=None, retain=True):
+    """Create upcoming partitions and, unless ``retain`` is false, apply retention."""
+    _lock(cur)
+    this_month = month_start(today or date.today())
+    for n in range(0, PARTITIONS_AHEAD + 1):
+        ensure_partition(cur, add_months(this_month, n))
+    return apply_retention(cur, today=today) if retain else []
+
+
+def install(cur):
+    """Create the partitioned audit_log, converting a plain legacy table in place.
+
+    Returns the partitions retention dropped. The run that converts a legacy
+    table never applies retention, so an upgrade can't delete history.
+    """
+    _lock(cur)
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('audit_log')")
+    existing = cur.fetchone()
+    if existing is not None and existing['relkind'] == 'p':
+        for sql in INDEX_SQL:
+            cur.execute(sql)
+        return maintain(cur)
+
+    legacy = existing is not None
+    if legacy:
+        cur.execute("ALTER TABLE audit_log RENAME TO audit_log_legacy")
+        cur.execute("ALTER TABLE audit_log_legacy RENAME CONSTRAINT audit_log_pkey TO audit_log_legacy_pkey")
+    cur.execute(TABLE_SQL)
+    cur.execute("CREATE TABLE audit_log_default PARTITION OF audit_log DEFAULT")
+    for sql in INDEX_SQL:
+        cur.execute(sql)
+
+    if legacy:
+        cur.execute("SELECT MIN(created_at) AS lo, MAX(created_at) AS hi FROM audit_log_legacy")
+        bounds = cur.fetchone()
+        if bounds['lo'] is not None:
+            month, last = month_start(bounds['lo']), month_start(bounds['hi'])
+            while month <= last:
+                ensure_partition(cur, month)
+                month = add_months(month, 1)
+        cur.execute("""
+            INSERT INTO audit_log (id, user_email, user_name, action, entity_type, entity_id, details, created_at)
+            SELECT id, user_email, user_name, action, entity_type, entity_id, details, COALESCE(created_at, NOW())
+            FROM audit_log_legacy
+        """)
+        copied = cur.rowcount
+        cur.execute("DROP TABLE audit_log_legacy")
+        print(f"✅ audit_log converted to monthly partitions ({copied} rows kept)")
+    return maintain(cur, retain=not legacy)
+
+
+class AuditWriter:
+    def __init__(self, max_queue=10000, batch_size=200, flush_interval=1.0, put_timeout=2.0):
+        self.batch_size     = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout    = put_timeout
+        self._queue   = queue.Queue(maxsize=max_queue)
+        self._stop    = threading.Event()
+        self._thread  = None
+        self._pid     = None
+        self._lock    = threading.Lock()
+        self._maintained_at = 0.0
+        self.stats    = {'queued': 0, 'written': 0, 'batches': 0, 'dropped': 0, 'inline': 0}
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                # Queued events belong to the parent process after a fork
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, event):
+        """Queue an event; blocks up to put_timeout when full, then writes it inline."""
+        self._ensure_started()
+        try:
+            self._queue.put(event, timeout=self.put_timeout)
+            self.stats['queued'] += 1
+        except queue.Full:
+            self.stats['inline'] += 1
+            self._flush([event])
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 and batch:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=max(remaining, 0.05)))
+                except queue.Empty:
+                    if batch or self._stop.is_set():
+                        break
+                    deadline = time.monotonic() + self.flush_interval
+            if batch:
+                self._flush(batch)
+            if time.monotonic() - self._maintained_at > MAINTENANCE_INTERVAL:
+                self._maintain()
+
+    def _maintain(self):
+        self._maintained_at = time.monotonic()
+        try:
+            with get_pool().connection() as conn:
+                cur = conn.cursor()
+                dropped = maintain(cur)
+                conn.commit(); cur.close()
+            if dropped:
+                print(f"🧹 Audit partitions dropped: {', '.join(dropped)}")
+        except Exception as e:
+            print(f"⚠️ Audit maintenance error: {e}")
+
+    def _flush(self, batch):
+        for attempt in range(2):
+            try:
+                with get_pool().connection() as conn:
+                    cur = conn.cursor()
+                    write_events(cur, batch)
+                    conn.commit(); cur.close()
+                self.stats['written'] += len(batch)
+                self.stats['batches'] += 1
+                return
+            except Exception as e:
+                if attempt:
+                    self.stats['dropped'] += len(batch)
+                    print(f"⚠️ Audit log error ({len(batch)} events dropped): {e}")
+
+    def shutdown(self, timeout=10.0):
+        """Stop the writer thread and flush everything still queued."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        leftover = []
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftover:
+            self._flush(leftover)
+
+
+writer = AuditWriter(
+    max_queue=int(os.environ.get('AUDIT_QUEUE_SIZE', 10000)),
+    batch_size=int(os.environ.get('AUDIT_BATCH_SIZE', 200)),
+    flush_interval=float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1.0)),
+    put_timeout=float(os.environ.get('AUDIT_PUT_TIMEOUT', 2.0)),
+)
+atexit.register(writer.shutdown)
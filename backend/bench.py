@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the backend's hot paths.
+Runs offline over a synthetic dataset (default: 20 school years of
+table_rows, 100 schedules); anything that talks to the database goes to an
+in-memory stand-in cursor, so only our Python side is measured.
+
+    python3 bench.py                          # run and print
+    python3 bench.py --save baseline.json     # store results
+    python3 bench.py --compare baseline.json  # flag regressions (exit 1)
+    python3 bench.py --only ring --years 5
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+from datetime import date, datetime, timedelta
+
+import feeds
+import records
+import conflicts
+import ics
+import restore
+import snapshot_store
+from day_plan import DayPlanner
+
+DEFAULT_THRESHOLD = 0.15
+
+
+# ============================================================================
+# SYNTHETIC DATA
+# ============================================================================
+
+def schedule_codes(n):
+    letters = 'ABCDEFGHIJKLMOPQRSTUVWXYZ'     # N is the Normal schedule
+    codes = list(letters)
+    for a in letters:
+        for b in letters:
+            codes.append(a + b)
+    return codes[:n]
+
+def make_schedules(n, rng):
+    times = [f"{h:02d}:{m:02d}" for h in range(7, 16) for m in (0, 5, 50, 55)]
+    rows = [{
+        'id': 'normal-schedule', 'code': 'N', 'name': 'Normal Schedule', 'color': '#1a3a6b',
+        'is_addon': False, 'is_normal': True, 'bell_slot': 1,
+        'times': [{'time': t, 'label': f'Period {i}', 'muted': False} for i, t in enumerate(times[:20])],
+    }]
+    for i, code in enumerate(schedule_codes(n - 1)):
+        picked = sorted(rng.sample(times, rng.randint(3, 20)))
+        rows.append({
+            'id': f'schedule-{code}', 'code': code, 'name': f'Schedule {code}', 'color': '#2a5298',
+            'is_addon': i % 3 == 0, 'is_normal': False, 'bell_slot': i % 4,
+            'times': [{'time': t, 'label': f'Bell {t}', 'muted': rng.random() < 0.1} for t in picked],
+        })
+    return rows
+
+def make_table_rows(years, schedules, rng, rows_per_year=300):
+    codes = [s['code'] for s in schedules if not s['is_normal']]
+    start = date(2026 - years, 8, 1)
+    rows = []
+    for y in range(years):
+        year_start = start.replace(year=start.year + y)
+        for i in range(rows_per_year):
+            d = year_start + timedelta(days=rng.randint(0, 364))
+            span = rng.choice((0, 0, 0, 1, 4))
+            code = rng.choice(codes)
+            rows.append({
+                'id': f"01J{y:04d}{i:019d}",
+                'code': ('#' + code) if rng.random() < 0.02 else code,
+                'from_date': d,
+                'to_date': d + timedelta(days=span) if span else None,
+                'comment': 'Synthetic' if i % 7 == 0 else '',
+                'span': None,
+            })
+    rows.sort(key=lambda r: (r['from_date'], r['code']))
+    return rows
+
+
+class Dataset:
+    def __init__(self, years, n_schedules, seed=1):
+        rng = random.Random(seed)
+        self.years      = years
+        self.schedules  = make_schedules(n_schedules, rng)
+        self.table_rows = make_table_rows(years, self.schedules, rng)
+        self.sch_map    = {s['code']: s['is_addon'] for s in self.schedules}
+        self.stamp      = datetime(2026, 1, 1, 12, 0).astimezone()
+
+        self.row_columns = tuple(self.table_rows[0])
+        self.row_tuples  = [tuple(r[c] for c in self.row_columns) for r in self.table_rows]
+        self.sch_columns = tuple(self.schedules[0])
+        self.sch_tuples  = [tuple(s[c] for c in self.sch_columns) for s in self.schedules]
+
+        self.api_schedules = [records.SCHEDULE.from_row(s) for s in self.schedules]
+        self.api_rows      = [records.TABLE_ROW.from_row(r) for r in self.table_rows]
+        # A snapshot that differs from live data by ~5% of rows
+        self.snap_rows = [dict(r, comment='changed') if i % 20 == 0 else r
+                          for i, r in enumerate(self.api_rows) if i % 50 != 1]
+
+    def describe(self):
+        return {'years': self.years, 'schedules': len(self.schedules), 'tableRows': len(self.table_rows)}
+
+
+# ============================================================================
+# POSTGRES STAND-IN
+# ============================================================================
+
+class StandInConnection:
+    encoding = 'UTF8'
+
+
+class StandInCursor:
+    """Enough of a psycopg2 cursor for execute_values() and simple SELECTs."""
+    connection = StandInConnection()
+
+    def __init__(self, tables):
+        self.tables = tables
+        self._rows = []
+        self.rowcount = 0
+        self.statements = 0
+
+    def execute(self, sql, params=None):
+        self.statements += 1
+        if isinstance(sql, bytes):
+            sql = sql.decode('utf-8', 'replace')
+        m = re.match(r'\s*SELECT .*? FROM (\w+)', sql, re.S)
+        self._rows = list(self.tables.get(m.group(1), ())) if m else []
+        self.rowcount = len(self._rows)
+
+    def mogrify(self, template, args):
+        return repr(args).encode('utf-8')
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def close(self):
+        pass
+
+
+# ============================================================================
+# CASES
+# ============================================================================
+
+CASES = []
+
+def case(name):
+    def register(fn):
+        CASES.append((name, fn))
+        return fn
+    return register
+
+@case('records.table_rows.encode_tuples')
+def bench_encode_rows(ds):
+    encode = records.TABLE_ROW.encoder(ds.row_columns)
+    return lambda: [encode(r) for r in ds.row_tuples]
+
+@case('records.table_rows.from_row')
+def bench_from_row(ds):
+    return lambda: [records.TABLE_ROW.from_row(r) for r in ds.table_rows]
+
+@case('records.schedules.encode_tuples')
+def bench_encode_schedules(ds):
+    encode = records.SCHEDULE.encoder(ds.sch_columns)
+    return lambda: [encode(s) for s in ds.sch_tuples]
+
+@case('records.table_rows.decode')
+def bench_decode(ds):
+    bodies = ds.api_rows[:1000]
+    return lambda: [records.TABLE_ROW.decode(b) for b in bodies]
+
+@case('json.table_rows_list')
+def bench_dumps_rows(ds):
+    return lambda: records.dumps(ds.api_rows)
+
+@case('json.schedules_list')
+def bench_dumps_schedules(ds):
+    return lambda: records.dumps(ds.api_schedules)
+
+@case('feeds.ringtimes')
+def bench_ringtimes(ds):
+    return lambda: feeds.ringtimes_text(ds.schedules, ds.stamp)
+
+@case('feeds.ringdates')
+def bench_ringdates(ds):
+    return lambda: feeds.ringdates_text(ds.table_rows, ds.sch_map, ds.stamp)
+
+@case('feeds.ringdates_delta_full')
+def bench_ringdates_delta(ds):
+    return lambda: feeds.ringdates_delta_text(ds.table_rows, ds.sch_map, 0, 1, True, set())
+
+@case('snapshot.store')
+def bench_snapshot_store(ds):
+    def run():
+        snapshot_store.store(StandInCursor({}), ds.api_schedules, ds.api_rows)
+    return run
+
+@case('snapshot.materialise')
+def bench_snapshot_materialise(ds):
+    cur = StandInCursor({})
+    manifest, hashes = snapshot_store.store(cur, ds.api_schedules, ds.api_rows)
+    blobs = [{'hash': snapshot_store.blob_hash(o), 'body': o} for o in ds.api_schedules + ds.api_rows]
+    snap = {'manifest': manifest, 'blob_hashes': hashes}
+    return lambda: snapshot_store.materialise(StandInCursor({'snapshot_blobs': blobs}), snap)
+
+@case('restore.plan')
+def bench_restore_plan(ds):
+    return lambda: restore.plan_restore(ds.api_schedules, ds.api_rows, ds.api_schedules, ds.snap_rows)
+
+@case('restore.apply')
+def bench_restore_apply(ds):
+    plan = restore.plan_restore(ds.api_schedules, ds.api_rows, ds.api_schedules, ds.snap_rows)
+    return lambda: restore.apply_restore(StandInCursor({}), plan)
+
+@case('day_plan.school_year')
+def bench_day_plan_year(ds):
+    start = date(2025, 8, 1)
+    end = date(2026, 7, 31)
+    rows = [r for r in ds.table_rows if r['from_date'] <= end and (r['to_date'] or r['from_date']) >= start]
+    # A fresh planner per call, as /api/day-plan builds one per request
+    return lambda: DayPlanner(ds.schedules).plan_range(rows, start, end)
+
+@case('day_plan.all_years')
+def bench_day_plan_all(ds):
+    start = ds.table_rows[0]['from_date']
+    end = max(r['to_date'] or r['from_date'] for r in ds.table_rows)
+    return lambda: DayPlanner(ds.schedules).plan_range(ds.table_rows, start, end)
+
+@case('ics.school_year')
+def bench_ics_year(ds):
+    start = date(2025, 8, 1)
+    end = date(2026, 7, 31)
+    rows = [r for r in ds.table_rows if r['from_date'] <= end and (r['to_date'] or r['from_date']) >= start]
+    tz = ds.stamp.tzinfo
+    return lambda: sum(len(c) for c in ics.chunks(
+        ics.calendar_lines(ds.schedules, rows, start, end, tz, 'Bells', 'bench@bells', ds.stamp)))
+
+if conflicts.np is not None:
+    @case('conflicts.school_year')
+    def bench_conflicts_year(ds):
+        start = date(2025, 8, 1)
+        end = date(2026, 7, 31)
+        rows = [r for r in ds.table_rows if r['from_date'] <= end and (r['to_date'] or r['from_date']) >= start]
+        # Compiled per call, as /api/schedules/conflicts does per request
+        return lambda: conflicts.ConflictEngine(ds.schedules).analyse_range(rows, start, end)
+
+
+# ============================================================================
+# RUNNER
+# ============================================================================
+
+def measure(fn, repeat, min_time=0.05):
+    """Median and best seconds per call, over ``repeat`` rounds of a calibrated loop."""
+    number = 1
+    while True:
+        t = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - t
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+    rounds = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - t) / number)
+    rounds.sort()
+    return {'median': rounds[len(rounds) // 2], 'min': rounds[0], 'loops': number, 'rounds': repeat}
+
+def run(ds, repeat, only=None):
+    results = {}
+    for name, make in CASES:
+        if only and not re.search(only, name):
+            continue
+        stats = measure(make(ds), repeat)
+        results[name] = stats
+        print(f"{name:<34} {stats['median'] * 1000:10.3f} ms  (min {stats['min'] * 1000:.3f}, {stats['loops']} loops)")
+    return results
+
+def compare(results, baseline, threshold):
+    """Print the change against a baseline; returns the names that got slower than allowed."""
+    regressions = []
+    print(f"\n{'case':<34} {'baseline':>10} {'now':>10} {'change':>8}")
+    for name, stats in results.items():
+        old = baseline['results'].get(name)
+        if old is None:
+            print(f"{name:<34} {'-':>10} {stats['median'] * 1000:9.3f}ms {'new':>8}")
+            continue
+        change = stats['median'] / old['median'] - 1
+        flag = ''
+        if change > threshold:
+            flag = '  ❌ regression'
+            regressions.append(name)
+        elif change < -threshold:
+            flag = '  ✅ faster'
+        print(f"{name:<34} {old['median'] * 1000:9.3f}ms {stats['median'] * 1000:9.3f}ms {change:+7.1%}{flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--years', type=int, default=20)
+    parser.add_argument('--schedules', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--only', help='regex on case names')
+    parser.add_argument('--save', metavar='FILE', help='write results as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare with a saved baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed slowdown before a case counts as a regression (default 0.15)')
+    args = parser.parse_args(argv)
+
+    ds = Dataset(args.years, args.schedules)
+    print(f"Dataset: {ds.describe()}  Python {platform.python_version()}\n")
+    results = run(ds, args.repeat, args.only)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'dataset':   ds.describe(),
+                'python':    platform.python_version(),
+                'machine':   platform.machine(),
+                'createdAt': datetime.now().isoformat(timespec='seconds'),
+                'results':   results,
+            }, f, indent=2, sort_keys=True)
+        print(f"\n✅ Baseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('dataset') != ds.describe():
+            print(f"\n⚠️ Baseline dataset {baseline.get('dataset')} differs from {ds.describe()}")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+        print(f"\n✅ No regressions over {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
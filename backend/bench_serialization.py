@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Serialization benchmark - per-row cost of encoding API lists.
+Compares the old path (RealDictCursor dict per row -> row_to_* dict ->
+jsonify-style json.dumps) with records.py (tuple rows -> compiled encoder
+-> records.dumps). No database needed; rows are synthesised.
+Run: python3 bench_serialization.py [rows]
+"""
+
+import sys
+import json
+import time
+from datetime import date, datetime, timedelta
+
+import records
+
+REPEATS = 5
+
+
+def old_row_to_table_row(row):
+    return {
+        'id':      row['id'],
+        'code':    row['code'],
+        'from':    records.date_str(row['from_date']),
+        'to':      records.date_str(row['to_date']),
+        'comment': row['comment'] or '',
+    }
+
+def old_row_to_audit(row):
+    return {
+        'id':          row['id'],
+        'userEmail':   row['user_email'],
+        'userName':    row['user_name'],
+        'action':      row['action'],
+        'entityType':  row['entity_type'],
+        'entityId':    row['entity_id'],
+        'details':     row['details'],
+        'createdAt':   row['created_at'].isoformat(),
+    }
+
+def old_dumps(obj):
+    # What Flask's jsonify() does outside debug mode
+    return (json.dumps(obj, sort_keys=True, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def table_rows(n):
+    columns = ('id', 'code', 'from_date', 'to_date', 'comment', 'span')
+    start = date(2019, 8, 1)
+    rows = [(f"01J{i:023d}", 'ABCDEFGH'[i % 8], start + timedelta(days=i // 3),
+             start + timedelta(days=i // 3 + 2) if i % 4 == 0 else None,
+             'Exam week' if i % 5 == 0 else '', None) for i in range(n)]
+    return columns, rows
+
+def audit_rows(n):
+    columns = ('id', 'user_email', 'user_name', 'action', 'entity_type', 'entity_id', 'details', 'created_at')
+    start = datetime(2025, 1, 1)
+    rows = [(f"log-01J{i:023d}", 'admin@example.org', 'Admin', 'update', 'table_row', str(i),
+             {'code': 'A', 'from': '2026-01-01'}, start + timedelta(seconds=i)) for i in range(n)]
+    return columns, rows
+
+
+def timed(fn):
+    best = float('inf')
+    for _ in range(REPEATS):
+        t = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t)
+    return best, out
+
+def compare(label, columns, rows, old_convert, record):
+    def old():
+        dict_rows = [dict(zip(columns, r)) for r in rows]     # what RealDictCursor builds
+        return old_dumps([old_convert(r) for r in dict_rows])
+
+    def new():
+        encode = record.encoder(columns)
+        return records.dumps([encode(r) for r in rows])
+
+    old_s, old_out = timed(old)
+    new_s, new_out = timed(new)
+    same = old_out == new_out
+    n = len(rows)
+    print(f"{label:<11} {n:>7} rows  old {old_s / n * 1e6:6.2f} µs/row  "
+          f"new {new_s / n * 1e6:6.2f} µs/row  x{old_s / new_s:4.1f}  "
+          f"{'identical' if same else 'OUTPUT DIFFERS'}")
+    return same
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"orjson: {'yes' if records.orjson else 'no (stdlib json fallback)'}")
+    ok = compare('table_rows', *table_rows(n), old_row_to_table_row, records.TABLE_ROW)
+    ok = compare('audit_log', *audit_rows(n), old_row_to_audit, records.AUDIT_ENTRY) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
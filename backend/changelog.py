@@ -0,0 +1,93 @@
+"""
+Versioned change log for table_rows and schedules.
+Row-level triggers append every insert/update/delete to change_log; the
+BIGSERIAL version is what devices pass back as ?since= on /public/ringdates.
+"""
+
+import os
+
+TRACKED_TABLES = ('table_rows', 'schedules')
+
+RETENTION_DAYS = int(os.environ.get('CHANGE_LOG_RETENTION_DAYS', 180))
+
+SCHEMA_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS change_log (
+        version BIGSERIAL PRIMARY KEY,
+        entity_type TEXT NOT NULL,
+        entity_id TEXT NOT NULL,
+        op TEXT NOT NULL,
+        new_row JSONB,
+        old_row JSONB,
+        changed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    )
+    """,
+    """
+    CREATE OR REPLACE FUNCTION record_change() RETURNS trigger AS $$
+    BEGIN
+        -- Serialize writers so version order matches commit order; a reader
+        -- that has seen version N can never later find an unseen N-1.
+        PERFORM pg_advisory_xact_lock(hashtext('change_log'));
+        IF TG_OP = 'DELETE' THEN
+            INSERT INTO change_log (entity_type, entity_id, op, new_row, old_row)
+            VALUES (TG_TABLE_NAME, OLD.id, 'delete', NULL, to_jsonb(OLD));
+        ELSIF TG_OP = 'UPDATE' THEN
+            INSERT INTO change_log (entity_type, entity_id, op, new_row, old_row)
+            VALUES (TG_TABLE_NAME, NEW.id, 'update', to_jsonb(NEW), to_jsonb(OLD));
+        ELSE
+            INSERT INTO change_log (entity_type, entity_id, op, new_row, old_row)
+            VALUES (TG_TABLE_NAME, NEW.id, 'insert', to_jsonb(NEW), NULL);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+]
+
+
+def install(cur):
+    for sql in SCHEMA_SQL:
+        cur.execute(sql)
+    for table in TRACKED_TABLES:
+        cur.execute(f"DROP TRIGGER IF EXISTS trg_{table}_change_log ON {table}")
+        cur.execute(f"""
+            CREATE TRIGGER trg_{table}_change_log
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE PROCEDURE record_change()
+        """)
+
+
+def prune(cur, days=RETENTION_DAYS):
+    """Drop entries older than ``days``, always keeping the newest one so the version survives."""
+    cur.execute("""
+        DELETE FROM change_log
+        WHERE changed_at < NOW() - make_interval(days => %s)
+          AND version < (SELECT MAX(version) FROM change_log)
+    """, (days,))
+    return cur.rowcount
+
+
+def version_bounds(cur):
+    """(oldest retained version, current version); (None, 0) when the log is empty."""
+    cur.execute("SELECT MIN(version) AS lo, MAX(version) AS hi FROM change_log")
+    row = cur.fetchone()
+    return row['lo'], row['hi'] or 0
+
+
+def fetch_changes(cur, since, upto):
+    cur.execute("""
+        SELECT version, entity_type, entity_id, op, new_row, old_row FROM change_log
+        WHERE version > %s AND version <= %s
+        ORDER BY version
+    """, (since, upto))
+    return cur.fetchall()
+
+
+def affected_codes(schedule_change):
+    """Schedule codes whose ringdates lines change because of this schedule change."""
+    new, old = schedule_change['new_row'], schedule_change['old_row']
+    if new is None or old is None:
+        return {(new or old)['code']}
+    if new['code'] != old['code'] or bool(new['is_addon']) != bool(old['is_addon']):
+        return {new['code'], old['code']}
+    return set()
@@ -0,0 +1,172 @@
+"""
+Bell conflict analysis.
+Every schedule is compiled into per-minute arrays over the day (defined,
+muted, slot). A day's codes are merged the way DayPlanner merges them
+(replacement or Normal as the base, add-ons on top in order), using array
+operations instead of per-bell dicts, and the result is checked for:
+
+  collision      two add-ons set the same minute with a different muted
+                 state or bell slot; the later one silently wins
+  replacements   more than one replacement schedule; only the first is used
+  nearDuplicate  two sounding bells less than ``near_minutes`` apart
+  orphanMute     an add-on mutes a minute where no bell would ring
+
+Each distinct code combination is analysed once per request. Needs numpy.
+"""
+
+import time
+from datetime import timedelta
+
+from day_plan import CompiledSchedule, codes_by_day
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MINUTES = 24 * 60
+DEFAULT_NEAR_MINUTES = 2
+ISSUE_ORDER = {'replacements': 0, 'collision': 1, 'orphanMute': 2, 'nearDuplicate': 3}
+
+
+def minute_of(hhmm):
+    return int(hhmm[:2]) * 60 + int(hhmm[3:5])
+
+def hhmm(minute):
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+class ConflictEngine:
+    def __init__(self, schedule_rows, near_minutes=DEFAULT_NEAR_MINUTES):
+        if np is None:
+            raise RuntimeError('conflict analysis needs numpy')
+        compiled = [CompiledSchedule(row) for row in schedule_rows]
+        n = len(compiled)
+        self.near_minutes = near_minutes
+        self.codes     = [sch.code for sch in compiled]
+        self.index     = {}
+        self.normal    = None
+        self.is_addon  = np.zeros(n, dtype=bool)
+        self.is_normal = np.zeros(n, dtype=bool)
+        self.slots     = np.zeros(n, dtype=np.int16)
+        self.defined   = np.zeros((n, MINUTES), dtype=bool)
+        self.muted     = np.zeros((n, MINUTES), dtype=bool)
+
+        for i, sch in enumerate(compiled):
+            self.index[sch.code] = i
+            if sch.is_normal and self.normal is None:
+                self.normal = i
+            self.is_addon[i] = sch.is_addon
+            self.is_normal[i] = sch.is_normal
+            self.slots[i] = sch.slot
+            if not sch.times:
+                continue
+            minutes = np.array([minute_of(t) for t, _, _ in sch.times])
+            muted = np.array([m for _, _, m in sch.times], dtype=bool)
+            if not sch.is_addon:
+                # A base keeps the first entry for a repeated time; an add-on's last entry wins
+                minutes, muted = minutes[::-1], muted[::-1]
+            self.defined[i, minutes] = True
+            self.muted[i, minutes] = muted
+        self._results = {}
+
+    def analyse(self, codes):
+        """Issues in the merged plan for one day's codes, ordered by time."""
+        key = tuple(codes)
+        issues = self._results.get(key)
+        if issues is None:
+            issues = self._results[key] = self._analyse(key)
+        return issues
+
+    def _analyse(self, codes):
+        known = [self.index[c] for c in codes if c in self.index]
+        addons = [i for i in known if self.is_addon[i]]
+        replacements = [i for i in known if not self.is_addon[i] and not self.is_normal[i]]
+        base = replacements[0] if replacements else self.normal
+
+        issues = []
+        if len(replacements) > 1:
+            issues.append({'type': 'replacements', 'time': None,
+                           'codes': [self.codes[i] for i in replacements],
+                           'detail': f"only {self.codes[base]} is played"})
+
+        if base is not None:
+            base_defined, base_muted = self.defined[base], self.muted[base]
+        else:
+            base_defined = base_muted = np.zeros(MINUTES, dtype=bool)
+        defined, muted = base_defined, base_muted
+        source = np.full(MINUTES, -1 if base is None else base)
+
+        if addons:
+            rows = np.array(addons)
+            D = self.defined[rows]
+            M = self.muted[rows]
+            any_defined = D.any(axis=0)
+            # Later add-ons override earlier ones: take the last row defining each minute
+            last = len(addons) - 1 - np.argmax(D[::-1], axis=0)
+            cols = np.arange(MINUTES)
+            defined = base_defined | any_defined
+            muted = np.where(any_defined, M[last, cols], base_muted)
+            source = np.where(any_defined, rows[last], source)
+
+            mutes, sounds = D & M, D & ~M
+            slots = np.where(D, self.slots[rows][:, None], -1)
+            slot_lo = np.where(D, slots, np.iinfo(np.int16).max).min(axis=0)
+            split = (mutes.any(axis=0) & sounds.any(axis=0)) | (any_defined & (slots.max(axis=0) != slot_lo))
+            for m in np.flatnonzero(split):
+                setters = [(self.codes[addons[r]], bool(M[r, m]), int(self.slots[addons[r]]))
+                           for r in np.flatnonzero(D[:, m])]
+                issues.append({'type': 'collision', 'time': hhmm(m), 'codes': [c for c, _, _ in setters],
+                               'detail': ', '.join(f"{c} {'mutes' if mu else 'rings'} slot {s}"
+                                                   for c, mu, s in setters)})
+
+            orphan = mutes.any(axis=0) & ~base_defined & ~sounds.any(axis=0)
+            for m in np.flatnonzero(orphan):
+                issues.append({'type': 'orphanMute', 'time': hhmm(m),
+                               'codes': [self.codes[addons[r]] for r in np.flatnonzero(mutes[:, m])],
+                               'detail': 'mutes a time with no bell'})
+
+        sounding = np.flatnonzero(defined & ~muted)
+        if len(sounding) > 1:
+            gaps = np.diff(sounding)
+            for j in np.flatnonzero(gaps < self.near_minutes):
+                a, b = sounding[j], sounding[j + 1]
+                issues.append({'type': 'nearDuplicate', 'time': hhmm(a),
+                               'codes': sorted({self.codes[source[a]], self.codes[source[b]]}),
+                               'detail': f"{hhmm(a)} and {hhmm(b)} are {int(gaps[j])} min apart"})
+
+        issues.sort(key=lambda i: (i['time'] or '', ISSUE_ORDER[i['type']]))
+        return issues
+
+    def analyse_range(self, table_rows, start, end):
+        """Every day in [start, end] whose codes give a plan with issues.
+
+        Days without table rows play Normal alone; its own issues are
+        reported once under ``normal`` rather than on each of those days.
+        """
+        started = time.perf_counter()
+        combos = {}
+        for i, codes in enumerate(codes_by_day(table_rows, start, end)):
+            if codes:
+                combos.setdefault(tuple(codes), []).append(start + timedelta(days=i))
+
+        days, counts = [], dict.fromkeys(ISSUE_ORDER, 0)
+        for codes, dates in combos.items():
+            issues = self.analyse(codes)
+            if not issues:
+                continue
+            for d in dates:
+                days.append({'date': d.isoformat(), 'codes': list(codes), 'issues': issues})
+                for issue in issues:
+                    counts[issue['type']] += 1
+        days.sort(key=lambda d: d['date'])
+
+        return {
+            'from':         start.isoformat(),
+            'to':           end.isoformat(),
+            'nearMinutes':  self.near_minutes,
+            'normal':       self.analyse(()),
+            'days':         days,
+            'summary':      dict(counts, days=len(days), combinations=len(combos)),
+            'timingMs':     round((time.perf_counter() - started) * 1000, 2),
+        }
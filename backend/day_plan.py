@@ -0,0 +1,145 @@
+"""
+Day-plan resolution engine.
+Server-side port of buildBellTimes() in frontend/src/utils/scheduleUtils.js:
+a replacement schedule (or Normal) gives the base bells, add-ons then mute
+or insert individual times on top.
+"""
+
+from datetime import date, timedelta
+
+MAX_RANGE_DAYS = 731
+
+
+def parse_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+def iter_days(start, end):
+    d = start
+    while d <= end:
+        yield d
+        d += timedelta(days=1)
+
+
+def iter_day_codes(table_rows, start, end):
+    """Yield (day, codes in effect) for each day of [start, end].
+
+    ``table_rows`` must be ordered by (from_date, code), as the API returns
+    them; that order decides which replacement wins. Rows whose code starts
+    with '#' are cancelled entries and are skipped, as in /public/ringdates.
+    Rows are consumed lazily and only those covering the current day are
+    held, so a server-side cursor can be passed in for long ranges.
+    """
+    rows = iter(table_rows)
+    row = next(rows, None)
+    active = []     # (code, last day) in row order
+    codes = []
+    for day in iter_days(start, end):
+        changed = False
+        while row is not None and parse_date(row['from_date']) <= day:
+            if not row['code'].startswith('#'):
+                last = parse_date(row['to_date'] or row['from_date'])
+                if last >= day:
+                    active.append((row['code'], last))
+                    changed = True
+            row = next(rows, None)
+        if active and min(a[1] for a in active) < day:
+            active = [a for a in active if a[1] >= day]
+            changed = True
+        if changed:
+            # Days with the same rows in effect share one list; callers must not mutate it
+            codes = []
+            for code, _ in active:
+                if code not in codes:
+                    codes.append(code)
+        yield day, codes
+
+
+def codes_by_day(table_rows, start, end):
+    """The codes in effect on each day of [start, end], one list per day; see iter_day_codes()."""
+    return [codes for _, codes in iter_day_codes(table_rows, start, end)]
+
+
+class CompiledSchedule:
+    __slots__ = ('code', 'is_addon', 'is_normal', 'slot', 'times')
+
+    def __init__(self, row):
+        self.code      = row['code']
+        self.is_addon  = bool(row['is_addon'])
+        self.is_normal = bool(row['is_normal'])
+        self.slot      = row['bell_slot'] if row['bell_slot'] is not None else 0
+        self.times     = tuple(
+            (t['time'], t.get('label', ''), bool(t.get('muted')))
+            for t in (row['times'] or [])
+        )
+
+
+class DayPlanner:
+    """Schedules compiled once, indexed by code, with merged plans memoized per code set."""
+
+    def __init__(self, schedule_rows):
+        self.by_code = {}
+        self.normal  = None
+        for row in schedule_rows:
+            sch = CompiledSchedule(row)
+            self.by_code[sch.code] = sch
+            if sch.is_normal and self.normal is None:
+                self.normal = sch
+        self._plans = {}
+
+    def bells_for_codes(self, codes):
+        key = tuple(codes)
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = self._plans[key] = self._merge(key)
+        return plan
+
+    def _merge(self, codes):
+        replacement = None
+        addons = []
+        for c in codes:
+            sch = self.by_code.get(c)
+            if sch is None:
+                continue
+            if sch.is_addon:
+                addons.append(sch)
+            elif not sch.is_normal and replacement is None:
+                replacement = sch
+
+        base = replacement or self.normal
+        mod  = replacement.code if replacement else None
+        bells = []
+        by_time = {}
+        if base is not None:
+            for time, label, muted in base.times:
+                bell = {'time': time, 'label': label, 'muted': muted, 'mod': mod, 'slot': base.slot}
+                bells.append(bell)
+                by_time.setdefault(time, bell)
+
+        for sch in addons:
+            for time, label, muted in sch.times:
+                existing = by_time.get(time)
+                if existing is not None:
+                    existing['muted'] = muted
+                    existing['mod']   = sch.code
+                    existing['slot']  = sch.slot
+                else:
+                    bell = {'time': time, 'label': label, 'muted': muted, 'mod': sch.code, 'slot': sch.slot}
+                    bells.append(bell)
+                    by_time[time] = bell
+
+        bells.sort(key=lambda b: b['time'])
+        return bells
+
+    def plan_range(self, table_rows, start, end):
+        """Resolve every day in [start, end]; see codes_by_day() for the row rules."""
+        day_codes = codes_by_day(table_rows, start, end)
+        days = []
+        for i, d in enumerate(iter_days(start, end)):
+            codes = day_codes[i]
+            days.append({
+                'date':  d.isoformat(),
+                'codes': codes,
+                'bells': self.bells_for_codes(codes),
+            })
+        return days
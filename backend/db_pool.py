@@ -0,0 +1,276 @@
+"""
+Bounded PostgreSQL connection pool.
+Connections are leased per request by app.get_db() and handed back at teardown.
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extras
+import psycopg2.extensions
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# ----------------------------------------------------------------------------
+# Query observers: called as fn(cursor, query, vars, seconds) after every
+# execute()/executemany() on a pooled connection, whatever cursor class the
+# caller asked for. For executemany() ``vars`` is the list of parameter sets.
+# ----------------------------------------------------------------------------
+
+_query_observers = []
+
+def add_query_observer(fn):
+    if fn not in _query_observers:
+        _query_observers.append(fn)
+
+def remove_query_observer(fn):
+    if fn in _query_observers:
+        _query_observers.remove(fn)
+
+
+class ObservedCursorMixin:
+    def execute(self, query, vars=None):
+        if not _query_observers:
+            return super().execute(query, vars)
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            elapsed = time.perf_counter() - start
+            for fn in _query_observers:
+                fn(self, query, vars, elapsed)
+
+    def executemany(self, query, vars_list):
+        if not _query_observers:
+            return super().executemany(query, vars_list)
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            elapsed = time.perf_counter() - start
+            for fn in _query_observers:
+                fn(self, query, vars_list, elapsed)
+
+
+_observed_classes = {}
+
+def observed_cursor_class(factory):
+    cls = _observed_classes.get(factory)
+    if cls is None:
+        if issubclass(factory, ObservedCursorMixin):
+            cls = factory
+        else:
+            cls = type(f"Observed{factory.__name__}", (ObservedCursorMixin, factory), {})
+        _observed_classes[factory] = cls
+    return cls
+
+
+class ObservedConnection(psycopg2.extensions.connection):
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = observed_cursor_class(factory)
+        return super().cursor(*args, **kwargs)
+
+
+class ConnectionPool:
+    def __init__(self, dsn, maxconn=10, timeout=10.0, check_after=30.0,
+                 cursor_factory=psycopg2.extras.RealDictCursor):
+        if maxconn < 1:
+            raise ValueError("maxconn must be at least 1")
+        self.dsn            = dsn
+        self.maxconn        = maxconn
+        self.timeout        = timeout
+        self.check_after    = check_after
+        self.cursor_factory = cursor_factory
+
+        self._cond    = threading.Condition()
+        self._idle    = deque()          # (conn, returned_at)
+        self._in_use  = set()
+        self._pid     = os.getpid()
+        self._waiting = 0
+        self._stats   = {
+            'checkouts':     0,
+            'connects':      0,
+            'reconnects':    0,
+            'discarded':     0,
+            'timeouts':      0,
+            'wait_time_ms':  0.0,
+            'max_wait_ms':   0.0,
+            'connect_ms':    0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # internals
+    # ------------------------------------------------------------------
+
+    def _reset_after_fork(self):
+        # Connections must never be shared across processes (gunicorn preload)
+        if os.getpid() != self._pid:
+            self._idle.clear()
+            self._in_use.clear()
+            self._waiting = 0
+            self._pid = os.getpid()
+
+    def _healthy(self, conn, returned_at):
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.check_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self._stats['discarded'] += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    # ------------------------------------------------------------------
+    # public API
+    # ------------------------------------------------------------------
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        conn = None
+        with self._cond:
+            self._reset_after_fork()
+            while True:
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    self._in_use.add(conn)
+                    break
+                if len(self._in_use) < self.maxconn:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(f"no database connection available after {self.timeout}s")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            # Reserve the slot so the connect/health check can run outside the lock
+            slot = conn if conn is not None else object()
+            self._in_use.add(slot)
+
+        try:
+            if conn is not None and self._healthy(conn, returned_at):
+                with self._cond:
+                    self._record_wait(start)
+                return conn
+            if conn is not None and not conn.closed:
+                try:
+                    conn.close()
+                except psycopg2.Error:
+                    pass
+            connect_start = time.perf_counter()
+            fresh = psycopg2.connect(self.dsn, connection_factory=ObservedConnection,
+                                     cursor_factory=self.cursor_factory)
+            connect_ms = (time.perf_counter() - connect_start) * 1000
+        except Exception:
+            with self._cond:
+                self._in_use.discard(slot)
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._in_use.discard(slot)
+            self._in_use.add(fresh)
+            self._stats['connects'] += 1
+            self._stats['connect_ms'] += connect_ms
+            if conn is not None:
+                self._stats['discarded'] += 1
+                self._stats['reconnects'] += 1
+            self._record_wait(start)
+        return fresh
+
+    def putconn(self, conn, close=False):
+        with self._cond:
+            if conn not in self._in_use:
+                return
+            self._in_use.discard(conn)
+            if not close and not conn.closed:
+                try:
+                    if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                except psycopg2.Error:
+                    close = True
+            if close or conn.closed or len(self._idle) >= self.maxconn:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def closeall(self):
+        with self._cond:
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+
+    def stats(self):
+        with self._cond:
+            checkouts = self._stats['checkouts']
+            return {
+                'size':        len(self._idle) + len(self._in_use),
+                'inUse':       len(self._in_use),
+                'idle':        len(self._idle),
+                'waiting':     self._waiting,
+                'max':         self.maxconn,
+                'checkouts':   checkouts,
+                'connects':    self._stats['connects'],
+                'connectMs':   round(self._stats['connect_ms'], 3),
+                'reconnects':  self._stats['reconnects'],
+                'discarded':   self._stats['discarded'],
+                'timeouts':    self._stats['timeouts'],
+                'avgWaitMs':   round(self._stats['wait_time_ms'] / checkouts, 3) if checkouts else 0.0,
+                'maxWaitMs':   round(self._stats['max_wait_ms'], 3),
+            }
+
+    def _record_wait(self, start):
+        waited = (time.monotonic() - start) * 1000
+        self._stats['checkouts'] += 1
+        self._stats['wait_time_ms'] += waited
+        if waited > self._stats['max_wait_ms']:
+            self._stats['max_wait_ms'] = waited
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                database_url = os.environ.get('DATABASE_URL')
+                if not database_url:
+                    raise Exception("DATABASE_URL environment variable not set")
+                _pool = ConnectionPool(
+                    database_url,
+                    maxconn=int(os.environ.get('DB_POOL_MAX', 10)),
+                    timeout=float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+                    check_after=float(os.environ.get('DB_POOL_CHECK_AFTER', 30)),
+                )
+    return _pool
@@ -0,0 +1,152 @@
+"""
+Device fleet registry.
+Each bell device (one per building) has a token for the public feeds, the
+schedule codes it plays and optional bell-slot overrides. Devices with the
+same codes and overrides share a profile, and per-device feeds are rendered
+and cached once per profile. Last-seen times are buffered in memory and
+written in batches, to a table without a feed trigger so polls never
+invalidate the feeds.
+"""
+
+import os
+import json
+import time
+import hashlib
+import secrets
+import threading
+
+import psycopg2.extras
+
+# Slot override applying to every schedule without its own entry
+ALL_CODES = '*'
+
+SCHEMA_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS devices (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        building TEXT NOT NULL DEFAULT '',
+        token_hash TEXT NOT NULL UNIQUE,
+        schedule_codes TEXT[],
+        slot_overrides JSONB NOT NULL DEFAULT '{}',
+        created_at TIMESTAMP DEFAULT NOW()
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS device_seen (
+        device_id TEXT PRIMARY KEY REFERENCES devices(id) ON DELETE CASCADE,
+        last_seen_at TIMESTAMPTZ NOT NULL,
+        last_ip TEXT,
+        last_feed TEXT
+    )
+    """,
+]
+
+
+def install(cur):
+    for sql in SCHEMA_SQL:
+        cur.execute(sql)
+
+
+def new_token():
+    return secrets.token_urlsafe(24)
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class Profile:
+    """What a device gets: which schedules (None = all) and which slot overrides."""
+    __slots__ = ('codes', 'slot_overrides', 'key')
+
+    def __init__(self, codes, slot_overrides):
+        self.codes = frozenset(codes) if codes is not None else None
+        self.slot_overrides = {k: int(v) for k, v in (slot_overrides or {}).items()}
+        canonical = json.dumps([sorted(self.codes) if self.codes is not None else None,
+                                sorted(self.slot_overrides.items())])
+        self.key = hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:12]
+
+    def keeps(self, sch):
+        """Normal and closure schedules (replacements without times, e.g. X and Z) are never filtered out."""
+        return (self.codes is None or sch['is_normal'] or sch['code'] in self.codes
+                or (not sch['is_addon'] and not sch['times']))
+
+    def schedules(self, schedules):
+        """The device's schedules with overrides applied."""
+        out = []
+        for sch in schedules:
+            if not self.keeps(sch):
+                continue
+            slot = self.slot_overrides.get(sch['code'], self.slot_overrides.get(ALL_CODES))
+            if slot is not None:
+                sch = dict(sch, bell_slot=slot)
+            out.append(sch)
+        return out
+
+    def table_rows(self, rows, schedules):
+        """Rows minus those pointing at an add-on or replacement the device doesn't play.
+
+        ``schedules`` needs code, is_addon, is_normal and times.
+        """
+        if self.codes is None:
+            return rows
+        excluded = {sch['code'] for sch in schedules if not self.keeps(sch)}
+        return (r for r in rows if r['code'] not in excluded)
+
+
+class DeviceRegistry:
+    def __init__(self, seen_flush_interval=60.0):
+        self.seen_flush_interval = seen_flush_interval
+        self._lock       = threading.Lock()
+        self._by_token   = {}       # token hash -> (device id, Profile)
+        self._version    = None
+        self._seen       = {}       # device id -> (seen_at, ip, feed)
+        self._flushed_at = time.monotonic()
+
+    def lookup(self, token, version, get_conn):
+        """(device id, Profile) for a token, or None; reloads when the devices table version moves."""
+        with self._lock:
+            current = self._version == version
+        if not current:
+            cur = get_conn().cursor()
+            cur.execute("SELECT id, token_hash, schedule_codes, slot_overrides FROM devices")
+            by_token = {r['token_hash']: (r['id'], Profile(r['schedule_codes'], r['slot_overrides']))
+                        for r in cur.fetchall()}
+            cur.close()
+            with self._lock:
+                self._by_token, self._version = by_token, version
+        with self._lock:
+            return self._by_token.get(hash_token(token))
+
+    def touch(self, device_id, ip, feed):
+        with self._lock:
+            self._seen[device_id] = (time.time(), ip, feed)
+
+    def flush_due(self):
+        with self._lock:
+            return bool(self._seen) and time.monotonic() - self._flushed_at >= self.seen_flush_interval
+
+    def flush_seen(self, cur):
+        """Write buffered last-seen times; returns how many devices were updated."""
+        with self._lock:
+            seen, self._seen = self._seen, {}
+            self._flushed_at = time.monotonic()
+        if not seen:
+            return 0
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO device_seen (device_id, last_seen_at, last_ip, last_feed)
+            SELECT v.device_id, v.last_seen_at, v.last_ip, v.last_feed
+            FROM (VALUES %s) AS v (device_id, last_seen_at, last_ip, last_feed)
+            JOIN devices d ON d.id = v.device_id
+            ON CONFLICT (device_id) DO UPDATE SET
+                last_seen_at = EXCLUDED.last_seen_at,
+                last_ip      = EXCLUDED.last_ip,
+                last_feed    = EXCLUDED.last_feed
+            WHERE device_seen.last_seen_at < EXCLUDED.last_seen_at
+        """, [(did, at, ip, feed) for did, (at, ip, feed) in seen.items()],
+            template="(%s, to_timestamp(%s), %s, %s)", page_size=1000)
+        return len(seen)
+
+
+registry = DeviceRegistry(seen_flush_interval=float(os.environ.get('DEVICE_SEEN_FLUSH', 60)))
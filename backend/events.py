@@ -0,0 +1,159 @@
+"""
+Server-Sent Events hub for live schedule and calendar changes.
+Changes come from change_log (see changelog.py); each worker reads new
+entries once when notify.py reports a commit and fans them out from an
+in-memory ring buffer to every open /api/events stream.
+
+Each open stream holds a Flask worker thread for up to max_age seconds,
+so a worker serves at most SSE_MAX_STREAMS of them and answers 503 with
+Retry-After beyond that. Give gunicorn more --threads than
+SSE_MAX_STREAMS (the default 4 leaves 4 of --threads 8 for feed polls
+and the API), and raise both together for more dashboards.
+"""
+
+import os
+import json
+import time
+import threading
+from collections import deque
+
+import changelog
+from db_pool import get_pool
+
+ENTITY_NAMES = {'table_rows': 'table_row', 'schedules': 'schedule'}
+
+# Filled in by app.py with records.TABLE_ROW.from_row / records.SCHEDULE.from_row so events
+# carry rows in the same shape as the REST API
+ROW_CONVERTERS = {}
+
+# Returned by events_after() when the client is too far behind to resume
+RESET = object()
+
+MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', 4))
+RETRY_AFTER = int(os.environ.get('SSE_RETRY_AFTER', 30))
+
+
+class StreamSlots:
+    """Open streams in this worker, counted against a cap."""
+
+    def __init__(self, limit):
+        self.limit    = limit
+        self.active   = 0
+        self.rejected = 0
+        self._lock    = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.active >= self.limit:
+                self.rejected += 1
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+
+class EventHub:
+    def __init__(self, buffer_size=2000, max_backfill=1000):
+        self.max_backfill = max_backfill
+        self._cond        = threading.Condition()
+        self._buffer      = deque(maxlen=buffer_size)   # (version, event dict)
+        self._version     = None
+        self._fetch_lock  = threading.Lock()
+
+    @property
+    def version(self):
+        if self._version is None:
+            self.refresh()
+        return self._version or 0
+
+    def refresh(self):
+        """Pull change_log entries newer than what we hold and wake waiting streams."""
+        with self._fetch_lock:
+            with get_pool().connection() as conn:
+                cur = conn.cursor()
+                _, current = changelog.version_bounds(cur)
+                changes = []
+                if self._version is not None:
+                    changes = changelog.fetch_changes(cur, self._version, current)
+                cur.close()
+            with self._cond:
+                for ch in changes:
+                    self._buffer.append((ch['version'], to_event(ch)))
+                self._version = current
+                self._cond.notify_all()
+
+    def events_after(self, version):
+        """Events with a version above ``version``, or RESET if they can't all be supplied."""
+        with self._cond:
+            current = self._version or 0
+            if version >= current:
+                return []
+            if self._buffer and self._buffer[0][0] <= version + 1:
+                return [ev for v, ev in self._buffer if v > version]
+        # Not in the buffer: backfill straight from the log
+        with get_pool().connection() as conn:
+            cur = conn.cursor()
+            lowest, _ = changelog.version_bounds(cur)
+            if lowest is None or version < lowest - 1:
+                cur.close()
+                return RESET
+            changes = changelog.fetch_changes(cur, version, current)
+            cur.close()
+        if len(changes) > self.max_backfill:
+            return RESET
+        return [to_event(ch) for ch in changes]
+
+    def wait(self, version, timeout):
+        """Block until something newer than ``version`` arrives or ``timeout`` passes."""
+        with self._cond:
+            return self._cond.wait_for(lambda: (self._version or 0) > version, timeout)
+
+
+def to_event(change):
+    entity = ENTITY_NAMES.get(change['entity_type'], change['entity_type'])
+    row = change['new_row']
+    convert = ROW_CONVERTERS.get(change['entity_type'])
+    return {
+        'version': change['version'],
+        'entity':  entity,
+        'id':      change['entity_id'],
+        'op':      change['op'],
+        'row':     convert(row) if (row is not None and convert) else row,
+    }
+
+
+def format_event(event):
+    return f"id: {event['version']}\nevent: change\ndata: {json.dumps(event)}\n\n"
+
+
+def stream(hub, last_id, heartbeat=15.0, max_age=300.0, poll=False):
+    """SSE frames for one client, from ``last_id`` (or now) until ``max_age`` seconds pass.
+
+    With ``poll`` set (no LISTEN connection) the hub is refreshed at each
+    heartbeat instead of waiting for a notification.
+    """
+    yield "retry: 3000\n\n"
+    current = hub.version
+    cursor = last_id if last_id is not None else current
+    deadline = time.monotonic() + max_age
+    while time.monotonic() < deadline:
+        # A cursor ahead of the log means the database was reset
+        events = RESET if cursor > hub.version else hub.events_after(cursor)
+        if events is RESET:
+            cursor = hub.version
+            yield f"id: {cursor}\nevent: reset\ndata: {json.dumps({'version': cursor})}\n\n"
+            continue
+        for event in events:
+            cursor = event['version']
+            yield format_event(event)
+        if not hub.wait(cursor, heartbeat):
+            if poll:
+                hub.refresh()
+            yield ": heartbeat\n\n"
+
+
+hub = EventHub()
+slots = StreamSlots(MAX_STREAMS)
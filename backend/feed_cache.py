@@ -0,0 +1,105 @@
+"""
+In-process cache for rendered feed text.
+Entries are keyed by feed and tagged with the feed version; concurrent misses
+for the same version share one rebuild (single-flight).
+"""
+
+import time
+import threading
+
+
+class _Call:
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class FeedCache:
+    def __init__(self):
+        self._lock       = threading.Lock()
+        self._entries    = {}     # key -> (version, value)
+        self._inflight   = {}     # (key, version) -> _Call
+        self._generation = 0
+        self._stats = {
+            'hits':          0,
+            'misses':        0,
+            'coalesced':     0,
+            'errors':        0,
+            'invalidations': 0,
+            'rebuild_ms':    0.0,
+            'max_rebuild_ms': 0.0,
+            'last_rebuild_ms': 0.0,
+        }
+
+    def get(self, key, version, build):
+        """Cached value for ``key`` at ``version``, calling ``build()`` at most once per miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._stats['hits'] += 1
+                return entry[1]
+            call = self._inflight.get((key, version))
+            leader = call is None
+            if leader:
+                call = self._inflight[(key, version)] = _Call()
+                generation = self._generation
+                self._stats['misses'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        start = time.perf_counter()
+        try:
+            call.value = build()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._inflight.pop((key, version), None)
+                if call.error is None:
+                    if generation == self._generation:
+                        self._entries[key] = (version, call.value)
+                    self._stats['rebuild_ms'] += elapsed
+                    self._stats['last_rebuild_ms'] = elapsed
+                    self._stats['max_rebuild_ms'] = max(self._stats['max_rebuild_ms'], elapsed)
+                else:
+                    self._stats['errors'] += 1
+            call.event.set()
+        return call.value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+            self._generation += 1
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            rebuilds = self._stats['misses'] - self._stats['errors']
+            return {
+                'entries':       len(self._entries),
+                'hits':          self._stats['hits'],
+                'misses':        self._stats['misses'],
+                'coalesced':     self._stats['coalesced'],
+                'errors':        self._stats['errors'],
+                'invalidations': self._stats['invalidations'],
+                'avgRebuildMs':  round(self._stats['rebuild_ms'] / rebuilds, 3) if rebuilds > 0 else 0.0,
+                'lastRebuildMs': round(self._stats['last_rebuild_ms'], 3),
+                'maxRebuildMs':  round(self._stats['max_rebuild_ms'], 3),
+            }
+
+
+cache = FeedCache()
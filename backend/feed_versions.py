@@ -0,0 +1,114 @@
+"""
+Content versions for the public feeds.
+Statement-level triggers bump a per-table counter in feed_versions; the
+public endpoints derive their ETag / Last-Modified from those counters and
+keep them in memory so idle polls never reach the database. The TTL is
+short unless this worker's LISTEN connection is up (see notify.py), in
+which case every change invalidates the cache and a long TTL is safe.
+"""
+
+import os
+import time
+import threading
+
+from notify import CHANNEL
+
+TRACKED_TABLES = ('schedules', 'table_rows', 'ringtone_mappings', 'devices', 'school_years')
+
+FEED_DEPENDENCIES = {
+    'ringtimes': ('schedules', 'ringtone_mappings'),
+    'ringdates': ('schedules', 'table_rows'),
+}
+
+SCHEMA_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS feed_versions (
+        name TEXT PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    )
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION bump_feed_version() RETURNS trigger AS $$
+    DECLARE
+        new_version BIGINT;
+    BEGIN
+        UPDATE feed_versions
+        SET version = version + 1, updated_at = clock_timestamp()
+        WHERE name = TG_TABLE_NAME
+        RETURNING version INTO new_version;
+        PERFORM pg_notify('{CHANNEL}', TG_TABLE_NAME || ':' || new_version);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+]
+
+
+def install(cur):
+    """Create the version table and attach the bump trigger to every tracked table."""
+    for sql in SCHEMA_SQL:
+        cur.execute(sql)
+    for table in TRACKED_TABLES:
+        cur.execute("INSERT INTO feed_versions (name) VALUES (%s) ON CONFLICT (name) DO NOTHING", (table,))
+        cur.execute(f"DROP TRIGGER IF EXISTS trg_{table}_feed_version ON {table}")
+        cur.execute(f"""
+            CREATE TRIGGER trg_{table}_feed_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE PROCEDURE bump_feed_version()
+        """)
+
+
+class FeedVersionCache:
+    def __init__(self, ttl=5.0, listen_ttl=300.0):
+        self.ttl = ttl
+        self.listen_ttl = listen_ttl
+        self.is_listening = lambda: False
+        self._lock = threading.Lock()
+        self._versions = None       # {table: (version, updated_at)}
+        self._loaded_at = 0.0
+        self._generation = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._versions = None
+            self._generation += 1
+
+    def snapshot(self, get_conn):
+        """Table versions, re-read from the database only when stale or invalidated."""
+        with self._lock:
+            ttl = self.listen_ttl if self.is_listening() else self.ttl
+            if self._versions is not None and time.monotonic() - self._loaded_at < ttl:
+                return self._versions
+            generation = self._generation
+        cur = get_conn().cursor()
+        cur.execute("SELECT name, version, updated_at FROM feed_versions")
+        versions = {r['name']: (r['version'], r['updated_at']) for r in cur.fetchall()}
+        cur.close()
+        with self._lock:
+            # Don't cache a read that raced with a local write
+            if generation == self._generation:
+                self._versions = versions
+                self._loaded_at = time.monotonic()
+        return versions
+
+    def feed_state(self, feed, get_conn):
+        """(etag, last_modified) for a public feed."""
+        return feed_state(feed, self.snapshot(get_conn))
+
+
+def feed_state(feed, versions):
+    """(etag, last_modified) for a public feed from {table: (version, updated_at)}."""
+    parts, last_modified = [], None
+    for table in FEED_DEPENDENCIES[feed]:
+        version, updated_at = versions.get(table, (0, None))
+        parts.append(str(version))
+        if updated_at is not None and (last_modified is None or updated_at > last_modified):
+            last_modified = updated_at
+    return f"{feed}-{'.'.join(parts)}", last_modified
+
+
+cache = FeedVersionCache(
+    ttl=float(os.environ.get('FEED_VERSION_TTL', 5)),
+    listen_ttl=float(os.environ.get('FEED_VERSION_LISTEN_TTL', 300)),
+)
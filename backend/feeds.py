@@ -0,0 +1,113 @@
+"""
+Text renderers for the public device feeds.
+Pure functions over already-fetched rows, shared by the Flask app and the
+async public service (public_async.py) so both emit byte-identical files.
+Rows may be psycopg2 dicts or asyncpg Records.
+"""
+
+from datetime import datetime
+
+import changelog
+
+DELTA_MAX_CHANGES = 1000
+
+
+def generated_stamp(last_modified):
+    # Stamp the data's modification time, not the wall clock, so identical data renders identically
+    stamp = last_modified.astimezone() if last_modified else datetime.now()
+    return stamp.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def ringtimes_text(schedules, last_modified):
+    """``schedules`` ordered by (is_normal DESC, code)."""
+    normal  = next((s for s in schedules if s['is_normal']), None)
+    special = [s for s in schedules if not s['is_normal']]
+
+    lines = [
+        "# Bell Schedule - ringtimes",
+        f"# Generated: {generated_stamp(last_modified)}",
+        "#",
+    ]
+
+    if normal and normal['times']:
+        slot = str(normal['bell_slot']) if normal['bell_slot'] is not None else '0'
+        lines.append(f"# Normal Schedule: {normal['name']}")
+        for t in normal['times']:
+            r = '-' if t.get('muted') else slot
+            lines.append(f"{t['time']} {r} {t['label']}")
+
+    for sch in special:
+        if not sch['times']: continue
+        if sch['code'].startswith('#'): continue
+        sch_char = sch['code'][0]
+        slot = str(sch['bell_slot']) if sch['bell_slot'] is not None else '0'
+        lines.append("")
+        lines.append(f"# {sch['name']} ({sch['code']})")
+        for t in sch['times']:
+            r = '-' if t.get('muted') else slot
+            lines.append(f"{t['time']}{sch_char}{r} {t['label']}")
+
+    return '\n'.join(lines)
+
+
+def ringdates_line(row, sch_map):
+    code     = row['code']
+    from_d   = row['from_date']
+    to_d     = row['to_date'] or ''
+    comment  = row['comment'] or ''
+    is_addon = sch_map.get(code, False)
+    sch_char = code[0]
+    suffix   = '+' if is_addon else ''
+
+    if to_d and to_d != from_d:
+        return f"{from_d}/{to_d}{sch_char}{suffix}  {comment}"
+    return f"{from_d}{sch_char}{suffix}  {comment}"
+
+
+def ringdates_text(rows, sch_map, last_modified):
+    """``rows`` ordered by (from_date, code); ``sch_map`` is {code: is_addon}."""
+    lines = [
+        "# Bell Schedule - ringdates",
+        f"# Generated: {generated_stamp(last_modified)}",
+        "#",
+    ]
+
+    for row in rows:
+        if row['code'].startswith('#'): continue
+        lines.append(ringdates_line(row, sch_map))
+
+    return '\n'.join(lines)
+
+
+def needs_full_delta(since, lowest, current):
+    """True when a delta from ``since`` can't be built from the retained change_log."""
+    return since <= 0 or since > current or (lowest is not None and since < lowest - 1)
+
+
+def delta_targets(changes):
+    """(table row ids, schedule codes) whose ringdates lines the changes touch."""
+    touched_ids, touched_codes = set(), set()
+    for ch in changes:
+        if ch['entity_type'] == 'table_rows':
+            touched_ids.add(ch['entity_id'])
+        else:
+            touched_codes |= changelog.affected_codes(ch)
+    return touched_ids, touched_codes
+
+
+def ringdates_delta_text(rows, sch_map, since, current, full, touched_ids):
+    """Lines are "U <id> <ringdates line>" (insert/update) and "D <id>"."""
+    lines = [
+        "# Bell Schedule - ringdates delta",
+        f"# Version: {current}",
+        f"# Since: {since}",
+        f"# Mode: {'full' if full else 'delta'}",
+    ]
+    present = set()
+    for row in rows:
+        if row['code'].startswith('#'): continue
+        present.add(row['id'])
+        lines.append(f"U {row['id']} {ringdates_line(row, sch_map)}")
+    for rid in sorted(touched_ids - present):
+        lines.append(f"D {rid}")
+    return '\n'.join(lines)
@@ -0,0 +1,96 @@
+"""
+iCalendar (RFC 5545) export of the resolved bell calendar.
+Days are resolved one at a time from a lazily read table_rows cursor and
+every ringing bell becomes a one-minute VEVENT in UTC; the text is yielded
+in chunks, so memory stays flat however long the range is.
+"""
+
+from datetime import datetime, time, timezone
+
+from day_plan import DayPlanner, iter_day_codes
+from timeline import SCHOOL_DAYS
+
+CHUNK_BYTES = 16384
+MAX_DAYS = 3660
+PRODID = '-//Bell Schedule//Bell Calendar//EN'
+
+
+def escape(text):
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+                .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+def fold(line):
+    """Split a content line into 75-octet pieces joined by CRLF + space, never inside a UTF-8 sequence."""
+    if len(line) <= 75 and line.isascii():
+        return line + '\r\n'
+    out, piece, size = [], [], 0
+    limit = 75
+    for ch in line:
+        n = len(ch.encode('utf-8'))
+        if size + n > limit:
+            out.append(''.join(piece))
+            piece, size, limit = [], 0, 74     # continuation lines start with a space
+        piece.append(ch)
+        size += n
+    out.append(''.join(piece))
+    return '\r\n '.join(out) + '\r\n'
+
+def utc_stamp(dt):
+    return dt.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def calendar_lines(schedule_rows, table_rows, start, end, tz, name, uid_suffix, stamp):
+    """Content lines of the VCALENDAR; ``table_rows`` may be any (from_date, code)-ordered iterable."""
+    yield 'BEGIN:VCALENDAR\r\n'
+    yield 'VERSION:2.0\r\n'
+    yield f'PRODID:{PRODID}\r\n'
+    yield 'CALSCALE:GREGORIAN\r\n'
+    yield 'METHOD:PUBLISH\r\n'
+    yield fold(f'X-WR-CALNAME:{escape(name)}')
+    tz_name = getattr(tz, 'key', None)
+    if tz_name:
+        yield f'X-WR-TIMEZONE:{tz_name}\r\n'
+
+    dtstamp = utc_stamp(stamp)
+    planner = DayPlanner(schedule_rows)
+    for day, codes in iter_day_codes(table_rows, start, end):
+        if day.weekday() not in SCHOOL_DAYS:
+            continue
+        ymd = day.strftime('%Y%m%d')
+        schedule = ', '.join(codes) or 'Normal'
+        seen = {}
+        for bell in planner.bells_for_codes(codes):
+            if bell['muted']:
+                continue
+            hh, mm = bell['time'].split(':')
+            at = datetime.combine(day, time(int(hh), int(mm)), tzinfo=tz)
+            description = f"Schedule: {schedule}, slot {bell['slot']}"
+            # Bells sharing a time get distinct UIDs: the slot, then a counter if even that repeats
+            key = (bell['time'], bell['slot'])
+            n = seen[key] = seen.get(key, -1) + 1
+            uid = f"{ymd}T{hh}{mm}S{bell['slot']}" + (f"-{n}" if n else '')
+            yield (
+                'BEGIN:VEVENT\r\n'
+                f'UID:{uid}-{uid_suffix}\r\n'
+                f'DTSTAMP:{dtstamp}\r\n'
+                f'DTSTART:{utc_stamp(at)}\r\n'
+                'DURATION:PT1M\r\n'
+                + fold(f"SUMMARY:{escape(bell['label'] or 'Bell')}")
+                + fold(f"DESCRIPTION:{escape(description)}")
+                + 'TRANSP:TRANSPARENT\r\n'
+                'END:VEVENT\r\n'
+            )
+    yield 'END:VCALENDAR\r\n'
+
+
+def chunks(lines, size=CHUNK_BYTES):
+    """Group text lines into UTF-8 chunks of about ``size`` bytes."""
+    buf, buffered = [], 0
+    for line in lines:
+        buf.append(line)
+        buffered += len(line)
+        if buffered >= size:
+            yield ''.join(buf).encode('utf-8')
+            buf, buffered = [], 0
+    if buf:
+        yield ''.join(buf).encode('utf-8')
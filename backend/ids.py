@@ -0,0 +1,58 @@
+"""
+Unique, time-sortable IDs (ULID layout).
+48-bit millisecond timestamp + 80 random bits, Crockford base32, 26 chars.
+Within one process IDs are strictly increasing even inside the same
+millisecond or if the clock steps back; across processes the random bits
+keep them apart.
+"""
+
+import os
+import time
+import threading
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+RANDOM_BITS = 80
+
+_lock = threading.Lock()
+_last_ms = 0
+_last_rand = 0
+
+
+def _reset_after_fork():
+    global _lock, _last_ms, _last_rand
+    _lock = threading.Lock()
+    _last_ms = 0
+    _last_rand = 0
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _encode(value, length):
+    chars = []
+    for _ in range(length):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return ''.join(reversed(chars))
+
+
+def ulid():
+    global _last_ms, _last_rand
+    with _lock:
+        now = int(time.time() * 1000)
+        if now > _last_ms:
+            _last_ms = now
+            _last_rand = int.from_bytes(os.urandom(10), 'big')
+        else:
+            # Same millisecond (or clock went backwards): keep ordering by counting up
+            _last_rand += 1
+            if _last_rand >> RANDOM_BITS:
+                _last_ms += 1
+                _last_rand = int.from_bytes(os.urandom(10), 'big')
+        value = (_last_ms << RANDOM_BITS) | _last_rand
+    return _encode(value, 26)
+
+
+def new_id(prefix=None):
+    """A fresh ID, optionally as '<prefix>-<ulid>' like the existing 'log-', 'snap-', 'user-' IDs."""
+    return f"{prefix}-{ulid()}" if prefix else ulid()
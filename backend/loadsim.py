@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+Load simulator - a fleet of bell devices plus a few admin editors.
+Devices poll /public/ringtimes and /public/ringdates (with If-None-Match,
+like curl -z on the Pis) every --interval seconds with jitter; admins log
+in and create, edit, list and delete table rows through the real API.
+Reports throughput, p50/p95/p99 latency, error rates and how late polls
+started against their schedule.
+
+    python3 loadsim.py --url http://127.0.0.1:5001 --devices 500 --admins 3 --duration 120 --save run.json
+    python3 loadsim.py --spawn --devices 2000 --burst --save burst.json   # throwaway Postgres + gunicorn
+    python3 loadsim.py --compare run.json burst.json
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import heapq
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+import http.cookiejar
+import urllib.request
+from urllib.parse import urlsplit
+from urllib.error import HTTPError, URLError
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+FEEDS = ('ringtimes', 'ringdates')
+
+
+# ============================================================================
+# RESULTS
+# ============================================================================
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}     # kind -> [(latency ms, status or None, error or None)]
+        self.lag_ms = []      # how late device polls started vs. their schedule
+
+    def record(self, kind, latency_ms, status=None, error=None):
+        with self._lock:
+            self.samples.setdefault(kind, []).append((latency_ms, status, error))
+
+    def record_lag(self, lag_ms):
+        with self._lock:
+            self.lag_ms.append(lag_ms)
+
+    def summary(self, elapsed):
+        with self._lock:
+            samples = {k: list(v) for k, v in self.samples.items()}
+            lag = sorted(self.lag_ms)
+        kinds = {}
+        for kind, rows in sorted(samples.items()):
+            latencies = sorted(r[0] for r in rows)
+            errors = sum(1 for _, status, err in rows if err is not None or (status or 0) >= 500)
+            statuses = {}
+            for _, status, err in rows:
+                key = str(status) if status is not None else 'error'
+                statuses[key] = statuses.get(key, 0) + 1
+            kinds[kind] = {
+                'count':     len(rows),
+                'rps':       round(len(rows) / elapsed, 2),
+                'p50':       round(percentile(latencies, 50), 2),
+                'p95':       round(percentile(latencies, 95), 2),
+                'p99':       round(percentile(latencies, 99), 2),
+                'max':       round(latencies[-1], 2),
+                'errors':    errors,
+                'errorRate': round(errors / len(rows), 4),
+                'statuses':  statuses,
+            }
+        return {
+            'elapsedS': round(elapsed, 1),
+            'kinds':    kinds,
+            'pollLagMs': {
+                'p50': round(percentile(lag, 50), 2) if lag else None,
+                'p95': round(percentile(lag, 95), 2) if lag else None,
+                'p99': round(percentile(lag, 99), 2) if lag else None,
+                'max': round(lag[-1], 2) if lag else None,
+            },
+        }
+
+
+# ============================================================================
+# DEVICES
+# ============================================================================
+
+class DeviceFleet:
+    """N devices on one scheduler thread; polls run on a bounded worker pool like real sockets would."""
+
+    def __init__(self, base_url, recorder, devices, interval, jitter, burst, burst_spread, concurrency, timeout):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.recorder = recorder
+        self.devices = devices
+        self.interval = interval
+        self.jitter = jitter
+        self.burst = burst
+        self.burst_spread = burst_spread
+        self.timeout = timeout
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='device')
+        self.etags = {}           # (device, feed) -> ETag
+        self.rng = random.Random(7)
+
+    def next_due(self, now):
+        if self.burst:
+            # Cron-style: everyone wakes on the same boundary, spread over a few seconds
+            boundary = (now // self.interval + 1) * self.interval
+            return boundary + self.rng.uniform(0, self.burst_spread)
+        return now + self.interval * (1 + self.rng.uniform(-self.jitter, self.jitter))
+
+    def poll(self, device, due):
+        self.recorder.record_lag(max(0.0, (time.time() - due) * 1000))
+        for feed in FEEDS:
+            headers = {'User-Agent': f'loadsim-device/{device}'}
+            etag = self.etags.get((device, feed))
+            if etag:
+                headers['If-None-Match'] = etag
+            started = time.perf_counter()
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                conn.request('GET', f'{self.prefix}/public/{feed}', headers=headers)
+                resp = conn.getresponse()
+                resp.read()
+                if resp.getheader('ETag'):
+                    self.etags[(device, feed)] = resp.getheader('ETag')
+                self.recorder.record(f'device.{feed}', (time.perf_counter() - started) * 1000, resp.status)
+            except (OSError, http.client.HTTPException) as e:
+                self.recorder.record(f'device.{feed}', (time.perf_counter() - started) * 1000, error=type(e).__name__)
+            finally:
+                conn.close()
+
+    def run(self, stop_at):
+        now = time.time()
+        if self.burst:
+            queue = [(self.next_due(now), d) for d in range(self.devices)]
+        else:
+            # Devices booted at random moments: spread first polls over one interval
+            queue = [(now + self.rng.uniform(0, self.interval), d) for d in range(self.devices)]
+        heapq.heapify(queue)
+        while queue:
+            due, device = queue[0]
+            if due >= stop_at:
+                break
+            wait = due - time.time()
+            if wait > 0:
+                time.sleep(min(wait, 0.5))
+                continue
+            heapq.heappop(queue)
+            self.pool.submit(self.poll, device, due)
+            heapq.heappush(queue, (self.next_due(max(due, time.time())), device))
+        self.pool.shutdown(wait=True)
+
+
+# ============================================================================
+# ADMIN SESSIONS
+# ============================================================================
+
+class AdminSession:
+    def __init__(self, base_url, recorder, email, password, think, timeout, seed):
+        self.api = base_url.rstrip('/') + '/api'
+        self.recorder = recorder
+        self.email = email
+        self.password = password
+        self.think = think
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def call(self, kind, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.api + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'})
+        started = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.timeout) as resp:
+                payload = resp.read()
+                self.recorder.record(kind, (time.perf_counter() - started) * 1000, resp.status)
+                return json.loads(payload) if payload else None
+        except HTTPError as e:
+            e.read()
+            self.recorder.record(kind, (time.perf_counter() - started) * 1000, e.code)
+        except (URLError, OSError) as e:
+            self.recorder.record(kind, (time.perf_counter() - started) * 1000, error=type(e).__name__)
+        return None
+
+    def pause(self):
+        time.sleep(self.think * self.rng.uniform(0.5, 1.5))
+
+    def run(self, stop_at):
+        if self.call('admin.login', 'POST', '/login', {'email': self.email, 'password': self.password}) is None:
+            return
+        schedules = self.call('admin.schedules', 'GET', '/schedules') or []
+        codes = [s['code'] for s in schedules if not s.get('isNormal')] or ['X']
+        while time.time() < stop_at:
+            day = date(2099, 1, 1) + timedelta(days=self.rng.randint(0, 3000))
+            row = self.call('admin.create_row', 'POST', '/table-rows', {
+                'code': self.rng.choice(codes), 'from': day.isoformat(), 'comment': 'loadsim'})
+            self.pause()
+            self.call('admin.list_rows', 'GET', f'/table-rows?from={date.today().isoformat()}&limit=500')
+            self.pause()
+            if row:
+                self.call('admin.update_row', 'PUT', f"/table-rows/{row['id']}", dict(
+                    code=row['code'], to=(day + timedelta(days=1)).isoformat(), comment='loadsim edited', **{'from': row['from']}))
+                self.pause()
+                self.call('admin.delete_row', 'DELETE', f"/table-rows/{row['id']}")
+                self.pause()
+
+
+# ============================================================================
+# THROWAWAY STACK
+# ============================================================================
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def find_pg_binary(name):
+    """Path of a PostgreSQL tool on PATH or in the usual install locations, else None."""
+    found = shutil.which(name)
+    if found:
+        return found
+    candidates = sorted(glob.glob(f'/usr/lib/postgresql/*/bin/{name}') + glob.glob(f'/usr/local/opt/postgresql*/bin/{name}'))
+    return candidates[-1] if candidates else None
+
+def pg_binary(name):
+    found = find_pg_binary(name)
+    if found is None:
+        sys.exit(f"❌ {name} not found; install PostgreSQL or point --url at a running instance")
+    return found
+
+def wait_for(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=2):
+                return
+        except (URLError, OSError):
+            time.sleep(0.3)
+    sys.exit(f"❌ {url} did not come up within {timeout}s")
+
+@contextmanager
+def throwaway_postgres():
+    """DATABASE_URL of an empty, temporary Postgres cluster; removed on exit."""
+    tmp = tempfile.mkdtemp(prefix='bell-pg-')
+    data_dir, pg_port = os.path.join(tmp, 'pg'), free_port()
+    try:
+        subprocess.run([pg_binary('initdb'), '-D', data_dir, '-U', 'bell', '-A', 'trust', '--no-sync'],
+                       check=True, stdout=subprocess.DEVNULL)
+        subprocess.run([pg_binary('pg_ctl'), '-D', data_dir, '-l', os.path.join(tmp, 'pg.log'), '-w',
+                        '-o', f"-F -p {pg_port} -k {tmp} -c listen_addresses=''", 'start'],
+                       check=True, stdout=subprocess.DEVNULL)
+        subprocess.run([pg_binary('createdb'), '-h', tmp, '-p', str(pg_port), '-U', 'bell', 'belldb'], check=True)
+        yield f'postgresql://bell@/belldb?host={tmp}&port={pg_port}'
+    finally:
+        if os.path.exists(data_dir):
+            subprocess.run([pg_binary('pg_ctl'), '-D', data_dir, '-m', 'fast', 'stop'],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+@contextmanager
+def throwaway_stack(server_cmd):
+    """A temporary Postgres cluster, initialised and seeded, with the app served on a free port."""
+    with throwaway_postgres() as database_url:
+        app_port = free_port()
+        env = dict(os.environ, DATABASE_URL=database_url, PORT=str(app_port))
+        server = None
+        try:
+            subprocess.run([sys.executable, '-c', 'import app; app.init_db()'], cwd=BACKEND_DIR, env=env, check=True)
+            subprocess.run([sys.executable, 'seed_data.py'], cwd=BACKEND_DIR, env=env, check=True,
+                           stdout=subprocess.DEVNULL)
+
+            cmd = server_cmd.format(port=app_port, python=sys.executable)
+            print(f"🚀 {cmd}")
+            server = subprocess.Popen(cmd, shell=True, cwd=BACKEND_DIR, env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            base_url = f'http://127.0.0.1:{app_port}'
+            wait_for(base_url + '/api/bell')
+            yield base_url
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+
+
+# ============================================================================
+# REPORTS
+# ============================================================================
+
+def print_report(report):
+    print(f"\n{'kind':<20} {'count':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'err%':>6}")
+    for kind, k in report['kinds'].items():
+        print(f"{kind:<20} {k['count']:>7} {k['rps']:>8.1f} {k['p50']:>8.1f} {k['p95']:>8.1f} "
+              f"{k['p99']:>8.1f} {k['max']:>8.1f} {k['errorRate'] * 100:>5.1f}%")
+    lag = report['pollLagMs']
+    if lag['p50'] is not None:
+        print(f"\nDevice poll start lag (ms): p50 {lag['p50']}  p95 {lag['p95']}  p99 {lag['p99']}  max {lag['max']}")
+
+def compare_reports(paths):
+    reports = []
+    for path in paths:
+        with open(path) as f:
+            reports.append(json.load(f))
+    names = [os.path.splitext(os.path.basename(p))[0][:14] for p in paths]
+    print("runs: " + "  ".join(f"{n} ({r['config']['devices']} devices, {r['config']['admins']} admins)"
+                               for n, r in zip(names, reports)))
+    kinds = sorted({k for r in reports for k in r['kinds']})
+    for metric in ('rps', 'p50', 'p95', 'p99', 'errorRate'):
+        print(f"\n{metric:<20} " + " ".join(f"{n:>14}" for n in names))
+        for kind in kinds:
+            cells = []
+            for r in reports:
+                k = r['kinds'].get(kind)
+                cells.append(f"{k[metric]:>14}" if k else f"{'-':>14}")
+            print(f"{kind:<20} " + " ".join(cells))
+    print(f"\n{'poll lag p95':<20} " + " ".join(f"{str(r['pollLagMs']['p95']):>14}" for r in reports))
+
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def simulate(args, base_url, feed_url):
+    recorder = Recorder()
+    started = time.time()
+    stop_at = started + args.duration
+    threads = []
+
+    if args.devices:
+        fleet = DeviceFleet(feed_url, recorder, args.devices, args.interval, args.jitter,
+                            args.burst, args.burst_spread, args.concurrency, args.timeout)
+        threads.append(threading.Thread(target=fleet.run, args=(stop_at,), name='fleet'))
+    for i in range(args.admins):
+        admin = AdminSession(base_url, recorder, args.admin_email, args.admin_password,
+                             args.admin_think, args.timeout, seed=i)
+        threads.append(threading.Thread(target=admin.run, args=(stop_at,), name=f'admin-{i}'))
+
+    print(f"⏱  {args.devices} devices every {args.interval}s{' (burst)' if args.burst else ''}, "
+          f"{args.admins} admins, {args.duration}s")
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    report = recorder.summary(time.time() - started)
+    report['config'] = {k: v for k, v in vars(args).items() if k not in ('compare', 'admin_password')}
+    report['config'].update(url=base_url, feedUrl=feed_url)
+    report['createdAt'] = datetime.now().isoformat(timespec='seconds')
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--url', default='http://127.0.0.1:5001', help='Flask app base URL')
+    parser.add_argument('--feed-url', help='base URL for device polls (e.g. the async public service)')
+    parser.add_argument('--spawn', action='store_true', help='run against a throwaway Postgres + app')
+    parser.add_argument('--server-cmd', default='{python} -m gunicorn -w 2 --threads 8 -b 127.0.0.1:{port} app:app',
+                        help='app command for --spawn; {port} and {python} are filled in')
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--interval', type=float, default=30.0, help='seconds between polls per device')
+    parser.add_argument('--jitter', type=float, default=0.2, help='+/- fraction of interval')
+    parser.add_argument('--burst', action='store_true', help='all devices poll on the same interval boundary')
+    parser.add_argument('--burst-spread', type=float, default=2.0, help='seconds the burst is spread over')
+    parser.add_argument('--concurrency', type=int, default=200, help='max simultaneous device requests')
+    parser.add_argument('--admins', type=int, default=2)
+    parser.add_argument('--admin-email', default='boo@crics.asia')
+    parser.add_argument('--admin-password', default='boo123')
+    parser.add_argument('--admin-think', type=float, default=1.0, help='seconds between admin actions')
+    parser.add_argument('--duration', type=float, default=60.0)
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--save', metavar='FILE', help='write the report as JSON')
+    parser.add_argument('--compare', nargs='+', metavar='FILE', help='print saved reports side by side')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare_reports(args.compare)
+        return 0
+
+    if args.spawn:
+        with throwaway_stack(args.server_cmd) as base_url:
+            report = simulate(args, base_url, base_url)
+    else:
+        report = simulate(args, args.url, args.feed_url or args.url)
+
+    print_report(report)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"\n✅ Report written to {args.save}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
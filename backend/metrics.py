@@ -0,0 +1,253 @@
+"""
+Prometheus metrics for the Flask app.
+Switched on with METRICS=1. A request timer records per-route latency,
+status codes and response sizes; database leases and queries are timed
+through db_pool; pool, feed cache and listener stats are read at scrape
+time. Everything is served in the Prometheus text format at /metrics,
+behind a bearer token when METRICS_TOKEN is set. Values are per process:
+under gunicorn each worker keeps and serves its own.
+"""
+
+import os
+import time
+import hmac
+import threading
+from bisect import bisect_left
+
+from flask import Response, g, request
+
+import db_pool
+import feed_cache
+import notify
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS   = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+SIZE_BUCKETS    = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+active = False
+
+
+def enabled():
+    return os.environ.get('METRICS', '').lower() in ('1', 'true', 'yes', 'on')
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=''):
+    pairs = [f'{n}="{_label_value(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _num(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ============================================================================
+# METRIC TYPES
+# ============================================================================
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values = {}       # label values tuple -> count
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_num(value)}"
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}       # label values tuple -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, labels=()):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = 'le="%s"' % _num(bound)
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(series[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Gauge:
+    """Read when scraped: ``read()`` returns the value, or {label values: value}."""
+    kind = 'gauge'
+
+    def __init__(self, name, help, read, labelnames=(), kind='gauge'):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.labelnames = labelnames
+        self.kind = kind
+
+    def samples(self):
+        value = self.read()
+        if not isinstance(value, dict):
+            value = {(): value}
+        for labels, v in sorted(value.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_num(v)}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for m in self.metrics:
+            try:
+                samples = list(m.samples())
+            except Exception:
+                # A stats source that is down (e.g. no DATABASE_URL) must not break the scrape
+                continue
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    'bell_http_requests_total', 'HTTP requests by route, method and status.', ('route', 'method', 'status')))
+LATENCY = registry.register(Histogram(
+    'bell_http_request_duration_seconds', 'Time from request start to response headers.', ('route', 'method')))
+RESPONSE_SIZE = registry.register(Histogram(
+    'bell_http_response_size_bytes', 'Response body size (non-streamed responses).', ('route',), SIZE_BUCKETS))
+FEED_ERRORS = registry.register(Counter(
+    'bell_feed_errors_total', 'Public feed requests answered with the "# Error:" fallback.', ('route', 'exception')))
+DB_CHECKOUT = registry.register(Histogram(
+    'bell_db_checkout_seconds', 'get_db() lease time, including pool waits and new connections.'))
+DB_QUERY = registry.register(Histogram(
+    'bell_db_query_seconds', 'Time per execute() on a pooled connection.', ('route',), QUERY_BUCKETS))
+
+
+def _stats_gauges(prefix, source, fields):
+    for key, (suffix, kind, help) in fields.items():
+        registry.register(Gauge(f"{prefix}_{suffix}", help, lambda key=key: source()[key], kind=kind))
+
+def _pool_stats():
+    stats = db_pool.get_pool().stats()
+    stats['connectSeconds'] = stats['connectMs'] / 1000
+    return stats
+
+_stats_gauges('bell_db_pool', _pool_stats, {
+    'inUse':     ('connections_in_use', 'gauge', 'Leased pool connections.'),
+    'idle':      ('connections_idle', 'gauge', 'Idle pool connections.'),
+    'waiting':   ('waiting', 'gauge', 'Requests waiting for a connection.'),
+    'connects':  ('connects_total', 'counter', 'New database connections opened.'),
+    'connectSeconds': ('connect_seconds_total', 'counter', 'Time spent opening database connections.'),
+    'timeouts':  ('timeouts_total', 'counter', 'Pool checkouts that timed out.'),
+})
+
+_stats_gauges('bell_feed_cache', lambda: feed_cache.cache.stats(), {
+    'hits':      ('hits_total', 'counter', 'Feed cache hits.'),
+    'misses':    ('misses_total', 'counter', 'Feed cache rebuilds.'),
+    'coalesced': ('coalesced_total', 'counter', 'Requests that waited on another request\'s rebuild.'),
+    'errors':    ('errors_total', 'counter', 'Feed rebuilds that raised.'),
+})
+
+_stats_gauges('bell_db_listener', lambda: dict(notify.listener.stats, connected=int(notify.listener.is_connected())), {
+    'connected':     ('connected', 'gauge', '1 while the LISTEN connection is up.'),
+    'notifications': ('notifications_total', 'counter', 'Change notifications received.'),
+    'reconnects':    ('reconnects_total', 'counter', 'LISTEN reconnects.'),
+})
+
+
+# ============================================================================
+# FLASK HOOKS
+# ============================================================================
+
+def route_label():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+def _start_timer():
+    g.metrics_start = time.perf_counter()
+
+def _record_request(response):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return response
+    route = route_label()
+    LATENCY.observe(time.perf_counter() - start, (route, request.method))
+    REQUESTS.inc((route, request.method, str(response.status_code)))
+    if not response.is_streamed:
+        size = response.content_length
+        if size is not None:
+            RESPONSE_SIZE.observe(size, (route,))
+    return response
+
+def _observe_query(cursor, query, vars, seconds):
+    try:
+        route = route_label()
+    except RuntimeError:
+        route = 'background'        # audit writer, event stream backfill, init_db
+    DB_QUERY.observe(seconds, (route,))
+
+def observe_checkout(seconds):
+    if active:
+        DB_CHECKOUT.observe(seconds)
+
+def feed_error(exc):
+    if active:
+        FEED_ERRORS.inc((route_label(), type(exc).__name__))
+
+def _serve_metrics():
+    token = os.environ.get('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response('unauthorized\n', status=401, mimetype='text/plain')
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+def install(app):
+    """Register the hooks and /metrics; a no-op unless METRICS is set."""
+    global active
+    if not enabled():
+        return False
+    active = True
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.add_url_rule('/metrics', 'metrics', _serve_metrics, methods=['GET'])
+    db_pool.add_query_observer(_observe_query)
+    print("📈 Metrics enabled at /metrics")
+    return True
@@ -0,0 +1,125 @@
+"""
+Cross-process cache invalidation over PostgreSQL LISTEN/NOTIFY.
+The feed_versions trigger sends "<table>:<version>" on CHANNEL when a
+statement commits; every worker runs one listener thread that fans these
+out to local subscribers.
+"""
+
+import os
+import select
+import threading
+
+import psycopg2
+import psycopg2.extensions
+
+CHANNEL = 'bell_changes'
+
+# Subscribers receive (table, version); table is None when changes may have
+# been missed (first connect, reconnect, version gap) and everything must refresh.
+ALL = None
+
+
+class ChangeListener:
+    def __init__(self, poll_interval=5.0, max_backoff=30.0):
+        self.poll_interval = poll_interval
+        self.max_backoff   = max_backoff
+        self._subscribers  = []
+        self._lock         = threading.Lock()
+        self._thread       = None
+        self._pid          = None
+        self._stop         = threading.Event()
+        self._connected    = False
+        self._last_seen    = {}
+        self.stats = {'notifications': 0, 'gaps': 0, 'reconnects': 0, 'errors': 0}
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def is_connected(self):
+        return self._connected and self._pid == os.getpid()
+
+    def start(self, dsn):
+        """Start the listener for this process (no-op if already running here)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._connected = False
+            self._last_seen = {}
+            self._thread = threading.Thread(target=self._run, args=(dsn,), name='db-listener', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _dispatch(self, table, version):
+        for callback in self._subscribers:
+            try:
+                callback(table, version)
+            except Exception as e:
+                print(f"⚠️ Change subscriber error: {e}")
+
+    def _handle(self, payload):
+        table, _, version = payload.partition(':')
+        try:
+            version = int(version)
+        except ValueError:
+            self._dispatch(ALL, None)
+            return
+        self.stats['notifications'] += 1
+        last = self._last_seen.get(table)
+        self._last_seen[table] = version
+        if last is not None and version > last + 1:
+            self.stats['gaps'] += 1
+            self._dispatch(ALL, None)
+        else:
+            self._dispatch(table, version)
+
+    def _run(self, dsn):
+        backoff = 1.0
+        first = True
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {CHANNEL}")
+                cur.execute("SELECT name, version FROM feed_versions")
+                self._last_seen = {name: version for name, version in cur.fetchall()}
+                cur.close()
+                self._connected = True
+                backoff = 1.0
+                if not first:
+                    self.stats['reconnects'] += 1
+                # Anything may have changed while we were not listening
+                self._dispatch(ALL, None)
+                first = False
+
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                        # Idle: a cheap round trip detects a dead socket
+                        conn.cursor().execute("SELECT 1")
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._handle(conn.notifies.pop(0).payload)
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"⚠️ Change listener error: {e}")
+            finally:
+                self._connected = False
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except psycopg2.Error:
+                        pass
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+
+listener = ChangeListener(poll_interval=float(os.environ.get('DB_LISTEN_POLL', 5)))
+
+def enabled():
+    return os.environ.get('DB_LISTEN', '1') not in ('0', 'false', 'no')
@@ -0,0 +1,149 @@
+"""
+SQL profiler for development and staging.
+Switched on with SQL_PROFILE=1. Every statement a request runs on a pooled
+connection is recorded with its parameter shape (types only, never values),
+duration, row count and the line of our code that issued it. When the
+request finishes the profile is summarised in an X-SQL-Profile header and
+printed as one JSON log line, listing statements repeated SQL_REPEAT_MIN
+or more times (N+1 patterns) and statements slower than SQL_SLOW_MS.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+
+from flask import g, request, has_request_context
+
+import db_pool
+
+SLOW_MS    = float(os.environ.get('SQL_SLOW_MS', 100))
+REPEAT_MIN = int(os.environ.get('SQL_REPEAT_MIN', 5))
+# 'all' logs every request, 'flagged' only those with repeated or slow statements
+LOG_MODE   = os.environ.get('SQL_PROFILE_LOG', 'all')
+MAX_GROUPS = 50
+SQL_CHARS  = 300
+
+WHITESPACE = re.compile(r'\s+')
+SKIP_FILES = (__file__, db_pool.__file__, os.sep + 'psycopg2' + os.sep)
+
+
+def enabled():
+    return os.environ.get('SQL_PROFILE', '').lower() in ('1', 'true', 'yes', 'on')
+
+
+def statement_text(query):
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    elif not isinstance(query, str):
+        query = str(query)          # psycopg2.sql.Composed
+    return WHITESPACE.sub(' ', query).strip()
+
+def param_shape(vars):
+    """'(str, int, list[3])', '{code: str}' or '[40 x (str, date)]' - types only."""
+    if vars is None:
+        return ''
+    if isinstance(vars, dict):
+        return '{' + ', '.join(f"{k}: {type(v).__name__}" for k, v in vars.items()) + '}'
+    if isinstance(vars, list) and vars and isinstance(vars[0], (tuple, list, dict)):
+        return f"[{len(vars)} x {param_shape(vars[0])}]"
+    if isinstance(vars, (tuple, list)):
+        return '(' + ', '.join(f"{type(v).__name__}[{len(v)}]" if isinstance(v, (list, tuple)) else type(v).__name__
+                               for v in vars) + ')'
+    return type(vars).__name__
+
+def origin():
+    """file:line of the first frame outside the profiler, the pool and psycopg2."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not any(skip in filename for skip in SKIP_FILES):
+            return f"{os.path.basename(filename)}:{frame.f_lineno}"
+        frame = frame.f_back
+    return ''
+
+
+# ============================================================================
+# REPORT
+# ============================================================================
+
+def summarise(entries):
+    """Group recorded statements by SQL text and pick out repeated and slow ones."""
+    groups = {}
+    for sql, shape, ms, rows, where in entries:
+        grp = groups.get(sql)
+        if grp is None:
+            grp = groups[sql] = {'sql': sql[:SQL_CHARS], 'count': 0, 'totalMs': 0.0, 'rows': 0,
+                                 'shapes': [], 'origins': []}
+        grp['count'] += 1
+        grp['totalMs'] += ms
+        grp['rows'] += max(rows, 0)
+        if shape not in grp['shapes']:
+            grp['shapes'].append(shape)
+        if where not in grp['origins']:
+            grp['origins'].append(where)
+    for grp in groups.values():
+        grp['totalMs'] = round(grp['totalMs'], 3)
+
+    by_time = sorted(groups.values(), key=lambda grp: grp['totalMs'], reverse=True)
+    return {
+        'queries':    len(entries),
+        'distinct':   len(groups),
+        'dbMs':       round(sum(e[2] for e in entries), 3),
+        'repeated':   sorted((grp for grp in groups.values() if grp['count'] >= REPEAT_MIN),
+                             key=lambda grp: grp['count'], reverse=True),
+        'slow':       [{'sql': sql[:SQL_CHARS], 'params': shape, 'ms': round(ms, 3), 'rows': rows, 'origin': where}
+                       for sql, shape, ms, rows, where in entries if ms >= SLOW_MS],
+        'statements': by_time[:MAX_GROUPS],
+    }
+
+def header_value(report, request_ms):
+    return (f"queries={report['queries']}; distinct={report['distinct']}; db={report['dbMs']:.1f}ms; "
+            f"request={request_ms:.1f}ms; repeated={len(report['repeated'])}; slow={len(report['slow'])}")
+
+
+# ============================================================================
+# FLASK HOOKS
+# ============================================================================
+
+def _record(cursor, query, vars, seconds):
+    if not has_request_context():
+        return
+    entries = g.get('sql_profile')
+    if entries is not None:
+        entries.append((statement_text(query), param_shape(vars), seconds * 1000, cursor.rowcount, origin()))
+
+def _start():
+    g.sql_profile = []
+    g.sql_profile_start = time.perf_counter()
+
+def _finish(response):
+    entries = g.pop('sql_profile', None)
+    if entries is None:
+        return response
+    request_ms = (time.perf_counter() - g.pop('sql_profile_start')) * 1000
+    report = summarise(entries)
+    response.headers['X-SQL-Profile'] = header_value(report, request_ms)
+    if LOG_MODE == 'all' or report['repeated'] or report['slow']:
+        rule = request.url_rule
+        print(json.dumps({'sqlProfile': dict(
+            report,
+            method=request.method,
+            path=request.path,
+            route=rule.rule if rule is not None else None,
+            status=response.status_code,
+            requestMs=round(request_ms, 3),
+        )}, default=str), flush=True)
+    return response
+
+
+def install(app):
+    """Register the profiler hooks; a no-op unless SQL_PROFILE is set."""
+    if not enabled():
+        return False
+    app.before_request(_start)
+    app.after_request(_finish)
+    db_pool.add_query_observer(_record)
+    print(f"🔍 SQL profiler enabled (slow >= {SLOW_MS:g}ms, repeated >= {REPEAT_MIN}x)")
+    return True
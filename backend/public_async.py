@@ -0,0 +1,319 @@
+"""
+Async service for the unauthenticated device endpoints.
+Serves /public/ringtimes, /public/ringdates and /api/bell from one event
+loop over an asyncpg pool, so polling devices never hold a Flask worker
+thread. Text comes from the same renderers (feeds.py) and ETags from the
+same version counters (feed_versions.py) as the Flask routes, so both
+answer byte for byte the same. Run it next to the Flask app and route
+those paths to it:
+
+    uvicorn public_async:app --host 0.0.0.0 --port 5002
+
+`python public_async.py compare <flask-url> <async-url>` diffs the two.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+from urllib.parse import parse_qs
+
+import asyncpg
+from werkzeug.http import is_resource_modified, http_date, quote_etag
+
+import feeds
+import feed_versions
+import notify
+
+JSON_TYPES = ('json', 'jsonb')
+
+
+class PublicFeeds:
+    def __init__(self, dsn, min_size=1, max_size=10, ttl=5.0, listen_ttl=300.0, listen_poll=5.0, max_backoff=30.0):
+        self.dsn         = dsn
+        self.min_size    = min_size
+        self.max_size    = max_size
+        self.ttl         = ttl
+        self.listen_ttl  = listen_ttl
+        self.listen_poll = listen_poll
+        self.max_backoff = max_backoff
+        self.pool        = None
+        self.listening   = False
+        self._versions   = None      # {table: (version, updated_at)}
+        self._loaded_at  = 0.0
+        self._generation = 0
+        self._entries    = {}        # feed -> (etag, text)
+        self._inflight   = {}        # key -> Task shared by concurrent misses
+        self._listener   = None
+        self.stats = {'hits': 0, 'renders': 0, 'version_reads': 0, 'not_modified': 0, 'notifications': 0}
+
+    async def start(self):
+        self.pool = await asyncpg.create_pool(
+            self.dsn, min_size=self.min_size, max_size=self.max_size, init=_init_connection)
+        if notify.enabled():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        if self.pool is not None:
+            await self.pool.close()
+
+    def invalidate(self):
+        self._versions = None
+        self._generation += 1
+
+    async def _single_flight(self, key, build):
+        """Run ``build()`` once for all concurrent callers asking for ``key``.
+
+        It runs as its own task, so a client hanging up doesn't cancel the
+        work the other waiters share.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(build())
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def versions(self):
+        ttl = self.listen_ttl if self.listening else self.ttl
+        if self._versions is not None and time.monotonic() - self._loaded_at < ttl:
+            return self._versions
+        return await self._single_flight('versions', self._read_versions)
+
+    async def _read_versions(self):
+        generation = self._generation
+        rows = await self.pool.fetch("SELECT name, version, updated_at FROM feed_versions")
+        versions = {r['name']: (r['version'], r['updated_at']) for r in rows}
+        self.stats['version_reads'] += 1
+        # Don't cache a read that raced with a notification
+        if generation == self._generation:
+            self._versions = versions
+            self._loaded_at = time.monotonic()
+        return versions
+
+    async def feed(self, name):
+        """(text, etag, last_modified) for 'ringtimes' or 'ringdates'."""
+        etag, last_modified = feed_versions.feed_state(name, await self.versions())
+        entry = self._entries.get(name)
+        if entry is not None and entry[0] == etag:
+            self.stats['hits'] += 1
+            return entry[1], etag, last_modified
+
+        async def build():
+            render = self._render_ringtimes if name == 'ringtimes' else self._render_ringdates
+            text = await render(last_modified)
+            self._entries[name] = (etag, text)
+            self.stats['renders'] += 1
+            return text
+
+        return await self._single_flight((name, etag), build), etag, last_modified
+
+    async def _render_ringtimes(self, last_modified):
+        schedules = await self.pool.fetch("SELECT * FROM schedules ORDER BY is_normal DESC, code")
+        return feeds.ringtimes_text(schedules, last_modified)
+
+    async def _render_ringdates(self, last_modified):
+        async with self.pool.acquire() as conn:
+            sch_map = {r['code']: r['is_addon'] for r in await conn.fetch("SELECT code, is_addon FROM schedules")}
+            rows = await conn.fetch("SELECT * FROM table_rows ORDER BY from_date, code")
+        return feeds.ringdates_text(rows, sch_map, last_modified)
+
+    async def ringdates_delta(self, since):
+        """(text, version); see render_ringdates_delta() in app.py."""
+        async with self.pool.acquire() as conn:
+            bounds = await conn.fetchrow("SELECT MIN(version) AS lo, MAX(version) AS hi FROM change_log")
+            lowest, current = bounds['lo'], bounds['hi'] or 0
+            full = feeds.needs_full_delta(since, lowest, current)
+
+            touched_ids, touched_codes = set(), set()
+            if not full:
+                changes = await conn.fetch("""
+                    SELECT version, entity_type, entity_id, op, new_row, old_row FROM change_log
+                    WHERE version > $1 AND version <= $2
+                    ORDER BY version
+                """, since, current)
+                if len(changes) > feeds.DELTA_MAX_CHANGES:
+                    full = True
+                touched_ids, touched_codes = feeds.delta_targets(changes)
+
+            sch_map = {r['code']: r['is_addon'] for r in await conn.fetch("SELECT code, is_addon FROM schedules")}
+            if full:
+                rows = await conn.fetch("SELECT * FROM table_rows ORDER BY from_date, code")
+            else:
+                rows = await conn.fetch("""
+                    SELECT * FROM table_rows WHERE id = ANY($1::text[]) OR code = ANY($2::text[])
+                    ORDER BY from_date, code
+                """, list(touched_ids), list(touched_codes))
+        return feeds.ringdates_delta_text(rows, sch_map, since, current, full, touched_ids), current
+
+    async def _listen(self):
+        """Drop cached versions on every feed_versions notification, as notify.py does for Flask."""
+        backoff = 1.0
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(self.dsn)
+                await conn.add_listener(notify.CHANNEL, self._on_notify)
+                self.listening = True
+                backoff = 1.0
+                # Anything may have changed while we were not listening
+                self.invalidate()
+                while True:
+                    await asyncio.sleep(self.listen_poll)
+                    await conn.fetchval("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Async change listener error: {e}")
+            finally:
+                self.listening = False
+                if conn is not None:
+                    conn.terminate()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _on_notify(self, conn, pid, channel, payload):
+        self.stats['notifications'] += 1
+        self.invalidate()
+
+
+async def _init_connection(conn):
+    # psycopg2 decodes json/jsonb itself; asyncpg hands back strings unless told otherwise
+    for typename in JSON_TYPES:
+        await conn.set_type_codec(typename, encoder=json.dumps, decoder=json.loads, schema='pg_catalog')
+
+
+service = PublicFeeds(
+    os.environ.get('DATABASE_URL'),
+    min_size=int(os.environ.get('ASYNC_DB_POOL_MIN', 1)),
+    max_size=int(os.environ.get('ASYNC_DB_POOL_MAX', 10)),
+    ttl=feed_versions.cache.ttl,
+    listen_ttl=feed_versions.cache.listen_ttl,
+    listen_poll=float(os.environ.get('DB_LISTEN_POLL', 5)),
+)
+
+# ============================================================================
+# ASGI
+# ============================================================================
+
+async def send_response(send, status, body=b'', headers=(), head=False):
+    raw = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+    if status != 304:
+        raw.append((b'content-length', str(len(body)).encode('latin-1')))
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw})
+    await send({'type': 'http.response.body', 'body': b'' if head or status == 304 else body})
+
+def text_response(text, status=200, headers=()):
+    return status, text.encode('utf-8'), [('Content-Type', 'text/plain; charset=utf-8'), *headers]
+
+def feed_headers(etag, last_modified):
+    headers = [('ETag', quote_etag(etag))]
+    if last_modified is not None:
+        headers.append(('Last-Modified', http_date(last_modified)))
+    headers.append(('Cache-Control', 'no-cache'))
+    return headers
+
+def not_modified(scope, etag, last_modified):
+    environ = {'REQUEST_METHOD': scope['method']}
+    for name, value in scope['headers']:
+        if name in (b'if-none-match', b'if-modified-since'):
+            environ['HTTP_' + name.decode('latin-1').upper().replace('-', '_')] = value.decode('latin-1')
+    return not is_resource_modified(environ, etag=etag, last_modified=last_modified)
+
+async def serve_feed(scope, name):
+    try:
+        text, etag, last_modified = await service.feed(name)
+        if not_modified(scope, etag, last_modified):
+            service.stats['not_modified'] += 1
+            return 304, b'', feed_headers(etag, last_modified)
+        return text_response(text, headers=feed_headers(etag, last_modified))
+    except Exception as e:
+        return text_response(f"# Error: {str(e)}", status=500)
+
+async def public_ringdates(scope):
+    args = parse_qs(scope['query_string'].decode('latin-1'), keep_blank_values=True)
+    if 'since' not in args:
+        return await serve_feed(scope, 'ringdates')
+    try:
+        since = int(args['since'][0])
+    except ValueError:
+        return text_response("# Error: since must be an integer", status=400)
+    try:
+        text, version = await service.ringdates_delta(since)
+        return text_response(text, headers=[('X-Ringdates-Version', str(version)), ('Cache-Control', 'no-cache')])
+    except Exception as e:
+        return text_response(f"# Error: {str(e)}", status=500)
+
+async def bell(scope):
+    # Same bytes as Flask's jsonify()
+    return 200, b'{"status":"ok"}\n', [('Content-Type', 'application/json')]
+
+ROUTES = {
+    '/public/ringtimes': lambda scope: serve_feed(scope, 'ringtimes'),
+    '/public/ringdates': public_ringdates,
+    '/api/bell':         bell,
+}
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await service.start()
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            print(f"✅ Async public feeds ready (pool {service.min_size}-{service.max_size})")
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await service.stop()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+    handler = ROUTES.get(scope['path'])
+    if handler is None:
+        status, body, headers = text_response("# Error: not found", status=404)
+    elif scope['method'] not in ('GET', 'HEAD'):
+        status, body, headers = text_response("# Error: method not allowed", status=405)
+        headers.append(('Allow', 'GET, HEAD'))
+    else:
+        status, body, headers = await handler(scope)
+    await send_response(send, status, body, headers, head=scope['method'] == 'HEAD')
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def compare(flask_base, async_base):
+    """Fetch every feed from both services and report any byte difference."""
+    from urllib.request import urlopen
+    from urllib.error import HTTPError
+
+    def fetch(url):
+        try:
+            with urlopen(url) as resp:
+                return resp.status, resp.read()
+        except HTTPError as e:
+            return e.code, e.read()
+
+    ok = True
+    for path in ('/public/ringtimes', '/public/ringdates', '/public/ringdates?since=0', '/api/bell'):
+        a = fetch(flask_base.rstrip('/') + path)
+        b = fetch(async_base.rstrip('/') + path)
+        same = a == b
+        ok = ok and same
+        print(f"{'✅' if same else '❌'} {path}  flask={a[0]}/{len(a[1])}B  async={b[0]}/{len(b[1])}B")
+    return ok
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == 'compare':
+        sys.exit(0 if compare(sys.argv[2], sys.argv[3]) else 1)
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get('PUBLIC_PORT', 5002)))
@@ -0,0 +1,323 @@
+"""
+Typed record models for the API entities.
+Each Record lists its fields once: the API name, the column(s) it comes
+from, how the value is encoded for responses and how a request value is
+validated. Responses encode straight from tuple cursor rows to JSON bytes
+(orjson when installed), with the same keys and key order as jsonify().
+"""
+
+import re
+import json
+from datetime import date
+
+import psycopg2.extensions
+
+import devices
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+MISSING = object()
+
+
+class ValidationError(ValueError):
+    """A request body that doesn't match its Record; the message is sent back as the 400 error."""
+
+
+# ----------------------------------------------------------------------------
+# Response encoders
+# ----------------------------------------------------------------------------
+
+def or_zero(value):
+    return value if value is not None else 0
+
+def or_blank(value):
+    return value or ''
+
+def or_list(value):
+    return value if value else []
+
+def or_dict(value):
+    return value or {}
+
+def iso(value):
+    return value.isoformat() if value else None
+
+def date_str(value):
+    # DATE columns arrive as datetime.date, change_log JSON as strings
+    if not value:
+        return ''
+    return value if isinstance(value, str) else value.isoformat()
+
+
+# ----------------------------------------------------------------------------
+# Request validators: take the incoming value, return the cleaned one or raise
+# ----------------------------------------------------------------------------
+
+def text(value):
+    if not isinstance(value, str):
+        raise ValueError('must be a string')
+    return value
+
+def nonblank(value):
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError('must be a non-empty string')
+    return value
+
+def boolean(value):
+    if not isinstance(value, bool):
+        raise ValueError('must be true or false')
+    return value
+
+def integer(value):
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError('must be an integer')
+    return value
+
+def iso_date(value):
+    if not isinstance(value, str):
+        raise ValueError('must be a YYYY-MM-DD date')
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        raise ValueError('must be a YYYY-MM-DD date')
+    return value
+
+def optional_date(value):
+    # '' and null both mean "no end date"
+    return iso_date(value) if value else None
+
+def code_list(value):
+    if value is None:
+        return None
+    if not isinstance(value, list) or not all(isinstance(c, str) for c in value):
+        raise ValueError('must be a list of codes or null')
+    return value
+
+def slot_map(value):
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise ValueError('must be an object of code -> slot')
+    try:
+        return {str(k): integer(v) for k, v in value.items()}
+    except ValueError:
+        raise ValueError('values must be integers')
+
+def bell_times(value):
+    if not isinstance(value, list):
+        raise ValueError('must be a list')
+    out = []
+    for t in value:
+        if not isinstance(t, dict) or not isinstance(t.get('time'), str):
+            raise ValueError('each entry needs a "time" string')
+        hh, _, mm = t['time'].partition(':')
+        if not (len(hh) == 2 and len(mm) == 2 and hh.isdigit() and mm.isdigit()
+                and int(hh) < 24 and int(mm) < 60):
+            raise ValueError(f"entry '{t['time']}' must be HH:MM")
+        if not isinstance(t.get('label', ''), str) or not isinstance(t.get('muted', False), bool):
+            raise ValueError('label must be a string and muted true or false')
+        out.append(t)
+    return out
+
+
+# ----------------------------------------------------------------------------
+# Records
+# ----------------------------------------------------------------------------
+
+class Field:
+    __slots__ = ('name', 'columns', 'encode', 'validate', 'required', 'default', 'output')
+
+    def __init__(self, name, columns=(), encode=None, validate=None, required=False,
+                 default=MISSING, output=True):
+        self.name     = name
+        self.columns  = columns if isinstance(columns, tuple) else (columns,)
+        self.encode   = encode
+        self.validate = validate      # None: response-only field
+        self.required = required
+        self.default  = default
+        self.output   = output        # False: request-only field
+
+
+class Record:
+    def __init__(self, name, fields):
+        self.name     = name
+        self.fields   = fields
+        self.outputs  = [f for f in fields if f.output]
+        self._plans   = {}      # column names -> compiled row function
+
+    def from_row(self, row):
+        """API dict for a mapping row (RealDictCursor, RETURNING *, change_log JSON)."""
+        out = {}
+        for f in self.outputs:
+            values = [row.get(c) for c in f.columns]
+            out[f.name] = f.encode(*values) if f.encode else values[0]
+        return out
+
+    def encoder(self, columns):
+        """Function turning a tuple row with these columns into the API dict.
+
+        Compiled once per column list: plain fields are copied by index and
+        only fields with an encoder call it. Columns missing from the query
+        encode as None.
+        """
+        plan = self._plans.get(columns)
+        if plan is not None:
+            return plan
+        index = {c: i for i, c in enumerate(columns)}
+        plain, single, multi = [], [], []
+        for f in self.outputs:
+            positions = tuple(index.get(c) for c in f.columns)
+            if len(positions) == 1 and positions[0] is not None:
+                if f.encode is None:
+                    plain.append((f.name, positions[0]))
+                else:
+                    single.append((f.name, positions[0], f.encode))
+            else:
+                multi.append((f.name, positions, f.encode or (lambda v=None: v)))
+
+        def encode(row):
+            out = {name: row[i] for name, i in plain}
+            for name, i, fn in single:
+                out[name] = fn(row[i])
+            for name, positions, fn in multi:
+                out[name] = fn(*[row[i] if i is not None else None for i in positions])
+            return out
+
+        self._plans[columns] = encode
+        return encode
+
+    def encode_rows(self, cur):
+        """API dicts for every remaining row of an executed tuple cursor."""
+        encode = self.encoder(tuple(d[0] for d in cur.description))
+        return [encode(row) for row in cur.fetchall()]
+
+    def decode(self, data, partial=False):
+        """Validated {api name: value} from a request body.
+
+        Unknown keys are ignored. Missing optional fields take their
+        default; with ``partial`` they are left out instead.
+        """
+        if not isinstance(data, dict):
+            raise ValidationError(f'{self.name} must be a JSON object')
+        out, missing = {}, []
+        for f in self.fields:
+            if f.validate is None:
+                continue
+            value = data.get(f.name, MISSING)
+            if value is None and not f.required and f.default is not MISSING:
+                value = MISSING
+            if value is MISSING or (f.required and value in (None, '')):
+                if f.required and not partial:
+                    missing.append(f.name)
+                elif f.default is not MISSING and not partial:
+                    out[f.name] = f.default() if callable(f.default) else f.default
+                continue
+            try:
+                out[f.name] = f.validate(value)
+            except ValueError as e:
+                raise ValidationError(f'{f.name} {e}')
+        if missing:
+            raise ValidationError(f"{', '.join(missing)} {'is' if len(missing) == 1 else 'are'} required")
+        return out
+
+
+SCHEDULE = Record('schedule', [
+    Field('id',       'id'),
+    Field('code',     'code',      validate=nonblank, required=True),
+    Field('name',     'name',      validate=nonblank, required=True),
+    Field('color',    'color',     validate=text, default='#2a5298'),
+    Field('isAddon',  'is_addon',  validate=boolean, default=False),
+    Field('isNormal', 'is_normal'),
+    Field('bellSlot', 'bell_slot', encode=or_zero, validate=integer, default=0),
+    Field('times',    'times',     encode=or_list, validate=bell_times, default=list),
+])
+
+TABLE_ROW = Record('table row', [
+    Field('id',      'id'),
+    Field('code',    'code',      validate=nonblank, required=True),
+    Field('from',    'from_date', encode=date_str, validate=iso_date, required=True),
+    Field('to',      'to_date',   encode=date_str, validate=optional_date, default=None),
+    Field('comment', 'comment',   encode=or_blank, validate=text, default=''),
+])
+
+SCHOOL_YEAR = Record('school year', [
+    Field('id',    'id'),
+    Field('label', 'label',     validate=nonblank, required=True),
+    Field('from',  'from_date', validate=iso_date, required=True),
+    Field('to',    'to_date',   validate=iso_date, required=True),
+])
+
+USER = Record('user', [
+    Field('id',        'id'),
+    Field('email',     'email',      validate=nonblank, required=True),
+    Field('name',      'name',       validate=nonblank, required=True),
+    Field('role',      'role',       validate=text, default='user'),
+    Field('createdAt', 'created_at', encode=iso),
+    Field('password',  validate=nonblank, required=True, output=False),
+])
+
+AUDIT_ENTRY = Record('audit entry', [
+    Field('id',         'id'),
+    Field('userEmail',  'user_email'),
+    Field('userName',   'user_name'),
+    Field('action',     'action'),
+    Field('entityType', 'entity_type'),
+    Field('entityId',   'entity_id'),
+    Field('details',    'details'),
+    Field('createdAt',  'created_at', encode=iso),
+])
+
+SNAPSHOT = Record('snapshot', [
+    Field('id',             'id'),
+    Field('label',          'label', validate=nonblank, required=True),
+    Field('createdByEmail', 'created_by_email'),
+    Field('createdByName',  'created_by_name'),
+    Field('createdAt',      'created_at', encode=iso),
+])
+
+DEVICE = Record('device', [
+    Field('id',            'id'),
+    Field('name',          'name',           validate=nonblank, required=True),
+    Field('building',      'building',       validate=text, default=''),
+    Field('scheduleCodes', 'schedule_codes', validate=code_list, default=None),
+    Field('slotOverrides', 'slot_overrides', encode=or_dict, validate=slot_map, default=dict),
+    Field('profile',       ('schedule_codes', 'slot_overrides'),
+          encode=lambda codes, overrides: devices.Profile(codes, overrides).key),
+    Field('createdAt',     'created_at',     encode=iso),
+    Field('lastSeenAt',    'last_seen_at',   encode=iso),
+    Field('lastIp',        'last_ip'),
+    Field('lastFeed',      'last_feed'),
+])
+
+
+# ----------------------------------------------------------------------------
+# JSON bytes
+# ----------------------------------------------------------------------------
+
+NON_ASCII = re.compile(r'[^\x00-\x7f]')
+
+def _escape(match):
+    c = ord(match.group())
+    if c < 0x10000:
+        return f'\\u{c:04x}'
+    c -= 0x10000
+    return f'\\u{0xd800 | (c >> 10):04x}\\u{0xdc00 | (c & 0x3ff):04x}'
+
+if orjson is not None:
+    def dumps(obj):
+        # Same bytes as Flask's jsonify(): sorted keys, compact, ASCII-only, trailing newline
+        out = orjson.dumps(obj, option=orjson.OPT_SORT_KEYS | orjson.OPT_APPEND_NEWLINE)
+        if out.isascii():
+            return out
+        return NON_ASCII.sub(_escape, out.decode('utf-8')).encode('ascii')
+else:
+    def dumps(obj):
+        return (json.dumps(obj, sort_keys=True, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def tuple_cursor(conn):
+    """A plain tuple cursor, for encode_rows(), on a pooled (RealDictCursor) connection."""
+    return conn.cursor(cursor_factory=psycopg2.extensions.cursor)
@@ -0,0 +1,135 @@
+"""
+Set-based snapshot restore.
+The snapshot is diffed against live data by id and only the differences
+are written, each category with one multi-row statement.
+"""
+
+import json
+import time
+
+import psycopg2.extras
+
+SCHEDULE_FIELDS = ('code', 'name', 'color', 'isAddon', 'bellSlot', 'times')
+ROW_FIELDS      = ('code', 'from', 'to', 'comment')
+
+
+def _norm_row(row):
+    return {
+        'id':      row['id'],
+        'code':    row['code'],
+        'from':    row['from'],
+        'to':      row.get('to') or '',
+        'comment': row.get('comment') or '',
+    }
+
+
+def plan_restore(live_schedules, live_rows, snap_schedules, snap_rows):
+    """Diff a snapshot (API-shaped dicts) against live data.
+
+    Schedules are only inserted or updated, never deleted, and the Normal
+    schedule is left alone, as before. Table rows are made identical to
+    the snapshot.
+    """
+    live_sch = {s['id']: s for s in live_schedules}
+    sch_insert, sch_update, sch_same = [], [], 0
+    for sch in snap_schedules:
+        if sch.get('isNormal'):
+            continue
+        existing = live_sch.get(sch['id'])
+        if existing is None:
+            sch_insert.append(sch)
+        elif any(existing.get(f) != sch.get(f) for f in SCHEDULE_FIELDS):
+            sch_update.append(sch)
+        else:
+            sch_same += 1
+
+    live = {r['id']: _norm_row(r) for r in live_rows}
+    snap = {r['id']: _norm_row(r) for r in snap_rows}
+    row_insert = [r for rid, r in snap.items() if rid not in live]
+    row_update = [r for rid, r in snap.items()
+                  if rid in live and any(live[rid][f] != r[f] for f in ROW_FIELDS)]
+    row_delete = [rid for rid in live if rid not in snap]
+
+    return {
+        'schedule_insert': sch_insert,
+        'schedule_update': sch_update,
+        'schedule_same':   sch_same,
+        'row_insert':      row_insert,
+        'row_update':      row_update,
+        'row_delete':      row_delete,
+        'row_same':        len(snap) - len(row_insert) - len(row_update),
+    }
+
+
+def _sch_values(sch):
+    return (sch['id'], sch['code'], sch['name'], sch['color'], bool(sch['isAddon']),
+            sch.get('bellSlot') or 0, json.dumps(sch.get('times') or []))
+
+
+def _row_values(row):
+    return (row['id'], row['code'], row['from'], row['to'] or None, row['comment'])
+
+
+def apply_restore(cur, plan):
+    """Write a plan from plan_restore(); returns per-category timings in ms."""
+    timings = {}
+
+    t = time.perf_counter()
+    if plan['schedule_insert']:
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO schedules (id, code, name, color, is_addon, is_normal, bell_slot, times)
+            VALUES %s
+        """, [_sch_values(s) for s in plan['schedule_insert']],
+            template="(%s, %s, %s, %s, %s, FALSE, %s, %s::jsonb)", page_size=1000)
+    if plan['schedule_update']:
+        psycopg2.extras.execute_values(cur, """
+            UPDATE schedules AS s
+            SET code = v.code, name = v.name, color = v.color,
+                is_addon = v.is_addon, bell_slot = v.bell_slot, times = v.times
+            FROM (VALUES %s) AS v (id, code, name, color, is_addon, bell_slot, times)
+            WHERE s.id = v.id
+        """, [_sch_values(s) for s in plan['schedule_update']],
+            template="(%s, %s, %s, %s, %s::boolean, %s::integer, %s::jsonb)", page_size=1000)
+    timings['schedules'] = (time.perf_counter() - t) * 1000
+
+    t = time.perf_counter()
+    if plan['row_delete']:
+        cur.execute("DELETE FROM table_rows WHERE id = ANY(%s)", (plan['row_delete'],))
+    timings['deletes'] = (time.perf_counter() - t) * 1000
+
+    t = time.perf_counter()
+    if plan['row_update']:
+        psycopg2.extras.execute_values(cur, """
+            UPDATE table_rows AS t
+            SET code = v.code, from_date = v.from_date, to_date = v.to_date, comment = v.comment
+            FROM (VALUES %s) AS v (id, code, from_date, to_date, comment)
+            WHERE t.id = v.id
+        """, [_row_values(r) for r in plan['row_update']],
+            template="(%s, %s, %s::date, %s::date, %s)", page_size=1000)
+    timings['updates'] = (time.perf_counter() - t) * 1000
+
+    t = time.perf_counter()
+    if plan['row_insert']:
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO table_rows (id, code, from_date, to_date, comment) VALUES %s
+        """, [_row_values(r) for r in plan['row_insert']], page_size=1000)
+    timings['inserts'] = (time.perf_counter() - t) * 1000
+
+    return timings
+
+
+def summary(plan, timings):
+    return {
+        'schedules': {
+            'inserted':  len(plan['schedule_insert']),
+            'updated':   len(plan['schedule_update']),
+            'unchanged': plan['schedule_same'],
+        },
+        'tableRows': {
+            'inserted':  len(plan['row_insert']),
+            'updated':   len(plan['row_update']),
+            'deleted':   len(plan['row_delete']),
+            'unchanged': plan['row_same'],
+        },
+        'timingMs': {k: round(v, 2) for k, v in timings.items()},
+    }
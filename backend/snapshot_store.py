@@ -0,0 +1,100 @@
+"""
+Content-addressed snapshot storage.
+Each schedule and table row is stored once in snapshot_blobs under the
+SHA-256 of its canonical JSON; a snapshot keeps only an ordered manifest
+of hashes. Blobs no snapshot references any more are collected on delete.
+"""
+
+import json
+import hashlib
+
+import psycopg2.extras
+
+SCHEMA_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS snapshot_blobs (
+        hash TEXT PRIMARY KEY,
+        body JSONB NOT NULL,
+        created_at TIMESTAMP DEFAULT NOW()
+    )
+    """,
+    "ALTER TABLE schedule_snapshots ADD COLUMN IF NOT EXISTS manifest JSONB",
+    "ALTER TABLE schedule_snapshots ADD COLUMN IF NOT EXISTS blob_hashes TEXT[]",
+    "ALTER TABLE schedule_snapshots ALTER COLUMN schedules DROP NOT NULL",
+    "ALTER TABLE schedule_snapshots ALTER COLUMN table_rows DROP NOT NULL",
+    "CREATE INDEX IF NOT EXISTS idx_snapshots_blob_hashes ON schedule_snapshots USING GIN (blob_hashes)",
+]
+
+
+def install(cur):
+    for sql in SCHEMA_SQL:
+        cur.execute(sql)
+
+
+def _lock(cur):
+    # Creating and collecting must not interleave, or a blob could be
+    # collected just before a new snapshot commits a reference to it
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext('snapshot_blobs'))")
+
+
+def blob_hash(obj):
+    canonical = json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def store(cur, schedules, table_rows):
+    """Write any new blobs and return (manifest, hashes) for a snapshot row."""
+    _lock(cur)
+    blobs = {}
+    manifest = {'schedules': [], 'tableRows': []}
+    for key, items in (('schedules', schedules), ('tableRows', table_rows)):
+        for obj in items:
+            h = blob_hash(obj)
+            blobs[h] = obj
+            manifest[key].append(h)
+    if blobs:
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO snapshot_blobs (hash, body) VALUES %s ON CONFLICT (hash) DO NOTHING
+        """, [(h, json.dumps(obj)) for h, obj in blobs.items()],
+            template="(%s, %s::jsonb)", page_size=1000)
+    return manifest, list(blobs)
+
+
+def materialise(cur, snap):
+    """(schedules, table_rows) of a snapshot row, from its manifest or legacy inline columns."""
+    manifest = snap['manifest']
+    if manifest is None:
+        return snap['schedules'], snap['table_rows']
+    cur.execute("SELECT hash, body FROM snapshot_blobs WHERE hash = ANY(%s)", (snap['blob_hashes'],))
+    bodies = {r['hash']: r['body'] for r in cur.fetchall()}
+    return ([bodies[h] for h in manifest['schedules']],
+            [bodies[h] for h in manifest['tableRows']])
+
+
+def collect_garbage(cur, hashes):
+    """Delete the given blobs unless another snapshot still references them."""
+    if not hashes:
+        return 0
+    _lock(cur)
+    cur.execute("""
+        DELETE FROM snapshot_blobs b
+        WHERE b.hash = ANY(%s)
+          AND NOT EXISTS (
+              SELECT 1 FROM schedule_snapshots s WHERE s.blob_hashes @> ARRAY[b.hash]
+          )
+    """, (list(hashes),))
+    return cur.rowcount
+
+
+def migrate_legacy(cur):
+    """Move snapshots that still hold inline copies onto manifests."""
+    cur.execute("SELECT id, schedules, table_rows FROM schedule_snapshots WHERE manifest IS NULL")
+    legacy = cur.fetchall()
+    for snap in legacy:
+        manifest, hashes = store(cur, snap['schedules'] or [], snap['table_rows'] or [])
+        cur.execute("""
+            UPDATE schedule_snapshots
+            SET manifest = %s, blob_hashes = %s, schedules = NULL, table_rows = NULL
+            WHERE id = %s
+        """, (json.dumps(manifest), hashes, snap['id']))
+    return len(legacy)
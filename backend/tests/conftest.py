@@ -0,0 +1,258 @@
+"""
+Test fixtures.
+``db``/``client``/``admin``: the Flask app over FakeDB, an in-memory stand-in
+that answers the statements the routes issue with rows in the shapes
+psycopg2 returns for the real schema - table_rows dates as datetime.date,
+school_years dates as TEXT unless the query casts them with ::date.
+
+``pg``/``pg_client``/``pg_admin``: the app on a real PostgreSQL, for range,
+trigger and partition behaviour - TEST_DATABASE_URL if set, else a
+throwaway cluster (loadsim.throwaway_postgres); skipped when neither exists.
+"""
+
+import os
+import re
+import sys
+from datetime import date, datetime, timezone
+
+import psycopg2.errors
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BELL_TZ', 'Asia/Bangkok')
+os.environ.setdefault('DB_LISTEN', '0')
+
+import app as bell_app
+import audit
+import db_pool
+import devices
+import feed_cache
+import feed_versions
+import loadsim
+
+DEVICE_TOKEN = 'device-token'
+
+SCHEDULES = [
+    {'id': 'schedule-N', 'code': 'N', 'name': 'Normal', 'is_addon': False, 'is_normal': True, 'bell_slot': 1,
+     'times': [{'time': '08:00', 'label': 'Period 1', 'muted': False},
+               {'time': '09:00', 'label': 'Period 2', 'muted': False},
+               {'time': '15:00', 'label': 'Home', 'muted': False}]},
+    {'id': 'schedule-E', 'code': 'E+', 'name': 'Exam bells', 'is_addon': True, 'is_normal': False, 'bell_slot': 2,
+     'times': [{'time': '10:30', 'label': 'Exam end', 'muted': False},
+               {'time': '09:00', 'label': '', 'muted': True}]},
+    {'id': 'schedule-H', 'code': 'H', 'name': 'Half day', 'is_addon': False, 'is_normal': False, 'bell_slot': 1,
+     'times': [{'time': '08:00', 'label': 'Period 1', 'muted': False},
+               {'time': '12:00', 'label': 'Home', 'muted': False}]},
+    {'id': 'schedule-X', 'code': 'X', 'name': 'Closed / In-Service', 'is_addon': False, 'is_normal': False,
+     'bell_slot': 0, 'times': []},
+    {'id': 'schedule-Z', 'code': 'Z', 'name': 'School Closed', 'is_addon': False, 'is_normal': False,
+     'bell_slot': 0, 'times': []},
+]
+
+TABLE_ROWS = [
+    {'id': 'row-1', 'code': 'E+', 'from_date': date(2025, 10, 6), 'to_date': date(2025, 10, 8), 'comment': 'Exams'},
+    {'id': 'row-2', 'code': 'X', 'from_date': date(2025, 10, 10), 'to_date': None, 'comment': 'In-service'},
+    {'id': 'row-3', 'code': 'Z', 'from_date': date(2025, 10, 13), 'to_date': None, 'comment': 'Closed'},
+    {'id': 'row-4', 'code': 'H', 'from_date': date(2025, 10, 15), 'to_date': None, 'comment': 'Half day'},
+]
+
+SCHOOL_YEARS = [
+    {'id': 'year-2024', 'label': '2024-2025', 'from_date': '2024-08-05', 'to_date': '2025-06-13'},
+    {'id': 'year-2025', 'label': '2025-2026', 'from_date': '2025-08-04', 'to_date': '2026-06-12'},
+]
+
+DEVICES = [
+    {'id': 'device-1', 'name': 'Gym', 'token_hash': devices.hash_token(DEVICE_TOKEN), 'schedule_codes': ['E+'],
+     'slot_overrides': {}},
+]
+
+UPDATED_AT = datetime(2025, 9, 1, tzinfo=timezone.utc)
+
+CAST = re.compile(r'\b(from_date|to_date)::date\b')
+
+
+class FakeDB:
+    def __init__(self):
+        self.schedules    = [dict(s) for s in SCHEDULES]
+        self.table_rows   = [dict(r) for r in TABLE_ROWS]
+        self.school_years = [dict(y) for y in SCHOOL_YEARS]
+        self.devices      = [dict(d) for d in DEVICES]
+        self.statements   = []
+
+    def school_year_rows(self, sql, params):
+        cast = set(CAST.findall(sql))
+        if re.search(r'\bto_date\s*>=', sql):
+            # Postgres: operator does not exist: text >= date
+            raise psycopg2.errors.UndefinedFunction('operator does not exist: text >= date')
+        years = self.school_years
+        if 'id=%s' in sql.replace(' ', ''):
+            years = [y for y in years if y['id'] == params[0]]
+        elif 'to_date::date >=' in sql:
+            years = sorted((y for y in years if date.fromisoformat(y['to_date']) >= params[0]),
+                           key=lambda y: y['from_date'])[:1]
+        return [{k: date.fromisoformat(v) if k in cast else v for k, v in y.items()} for y in years]
+
+    def respond(self, sql, params):
+        self.statements.append((' '.join(sql.split()), params))
+        if 'FROM feed_versions' in sql:
+            return [{'name': t, 'version': 1, 'updated_at': UPDATED_AT} for t in feed_versions.TRACKED_TABLES]
+        if 'FROM school_years' in sql:
+            return self.school_year_rows(sql, params)
+        if 'FROM schedules' in sql:
+            return self.schedules
+        if 'FROM devices' in sql:
+            return self.devices
+        if 'FROM table_rows' in sql:
+            rows = sorted(self.table_rows, key=lambda r: (r['from_date'], r['code']))
+            if 'daterange' in sql:
+                start, end = params[0], params[1]
+                rows = [r for r in rows if r['from_date'] <= end and (r['to_date'] or r['from_date']) >= start]
+            return rows
+        return []
+
+
+class FakeCursor:
+    """RealDictCursor-like by default; plain tuples for records.tuple_cursor()."""
+
+    def __init__(self, db, tuples=False):
+        self.db = db
+        self.tuples = tuples
+        self.rows = []
+        self.rowcount = -1
+        self.description = None
+        self.itersize = 2000
+
+    def execute(self, sql, params=None):
+        rows = self.db.respond(sql, params)
+        columns = list(rows[0]) if rows else []
+        self.description = [(c,) for c in columns]
+        self.rows = [tuple(r[c] for c in columns) if self.tuples else dict(r) for r in rows]
+        self.rowcount = len(self.rows)
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def __iter__(self):
+        while self.rows:
+            yield self.rows.pop(0)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, name=None, cursor_factory=None):
+        return FakeCursor(self.db, tuples=cursor_factory is not None)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, db):
+        self.conn = FakeConnection(db)
+
+    def getconn(self):
+        return self.conn
+
+    def putconn(self, conn, close=False):
+        pass
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeDB()
+    monkeypatch.setattr(bell_app, 'get_pool', lambda: FakePool(fake))
+    feed_versions.cache.invalidate()
+    feed_cache.cache.invalidate()
+    devices.registry._version = None
+    yield fake
+    feed_versions.cache.invalidate()
+    feed_cache.cache.invalidate()
+
+
+@pytest.fixture
+def client(db):
+    return bell_app.app.test_client()
+
+
+@pytest.fixture
+def admin(client):
+    with client.session_transaction() as session:
+        session['logged_in'] = True
+    return client
+
+
+# ============================================================================
+# REAL POSTGRESQL
+# ============================================================================
+
+# Emptied before every pg test; school_years keeps the years init_db() seeds
+PG_TABLES = ('table_rows', 'schedules', 'devices', 'device_seen', 'audit_log')
+
+
+@pytest.fixture(scope='session')
+def pg_url():
+    url = os.environ.get('TEST_DATABASE_URL')
+    if url:
+        yield url
+        return
+    if loadsim.find_pg_binary('initdb') is None:
+        pytest.skip('PostgreSQL not found; set TEST_DATABASE_URL or put initdb on PATH')
+    with loadsim.throwaway_postgres() as url:
+        yield url
+
+
+@pytest.fixture(scope='session')
+def pg_pool(pg_url):
+    previous = db_pool._pool
+    db_pool._pool = db_pool.ConnectionPool(pg_url, maxconn=5)
+    bell_app.init_db()
+    yield db_pool._pool
+    audit.writer.shutdown()
+    db_pool._pool.closeall()
+    db_pool._pool = previous
+
+
+@pytest.fixture
+def pg(pg_pool):
+    """A cursor on the real database (autocommit), emptied of test data."""
+    conn = pg_pool.getconn()
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(f"TRUNCATE {', '.join(PG_TABLES)}")
+    feed_versions.cache.invalidate()
+    feed_cache.cache.invalidate()
+    devices.registry._version = None
+    yield cur
+    cur.close()
+    conn.autocommit = False
+    pg_pool.putconn(conn)
+    feed_versions.cache.invalidate()
+    feed_cache.cache.invalidate()
+
+
+@pytest.fixture
+def pg_client(pg):
+    return bell_app.app.test_client()
+
+
+@pytest.fixture
+def pg_admin(pg_client):
+    with pg_client.session_transaction() as session:
+        session['logged_in'] = True
+        session['user']      = 'admin@example.com'
+        session['name']      = 'Admin'
+        session['role']      = 'admin'
+        session['user_id']   = 'user-test'
+    return pg_client
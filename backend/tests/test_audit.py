@@ -0,0 +1,81 @@
+from datetime import date, datetime
+
+import pytest
+
+import app as bell_app
+import audit
+
+LEGACY_SQL = """
+    CREATE TABLE audit_log (
+        id TEXT PRIMARY KEY,
+        user_email TEXT NOT NULL,
+        user_name TEXT NOT NULL,
+        action TEXT NOT NULL,
+        entity_type TEXT NOT NULL,
+        entity_id TEXT,
+        details JSONB,
+        created_at TIMESTAMP DEFAULT NOW()
+    )
+"""
+
+
+@pytest.fixture
+def legacy_schema(pg):
+    """A scratch schema first on the search_path, holding a pre-partitioning audit_log."""
+    pg.execute("DROP SCHEMA IF EXISTS audit_legacy CASCADE")
+    pg.execute("CREATE SCHEMA audit_legacy")
+    pg.execute("SET search_path TO audit_legacy, public")
+    pg.execute(LEGACY_SQL)
+    yield pg
+    pg.execute("SET search_path TO public")
+    pg.execute("DROP SCHEMA audit_legacy CASCADE")
+
+
+def partitions(cur):
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'audit_log'::regclass ORDER BY c.relname
+    """)
+    return [r['relname'] for r in cur.fetchall()]
+
+
+def test_legacy_conversion_keeps_all_history(legacy_schema, monkeypatch, capsys):
+    cur = legacy_schema
+    monkeypatch.setattr(audit, 'RETENTION_MONTHS', 12)
+    old, recent = datetime(2019, 3, 4, 10, 0), datetime.now()
+    for i, at in enumerate((old, old, recent)):
+        cur.execute("INSERT INTO audit_log VALUES (%s, 'a@b', 'A', 'create', 'table_row', NULL, NULL, %s)",
+                    (f'log-{i}', at))
+
+    assert audit.install(cur) == []
+    assert '3 rows kept' in capsys.readouterr().out
+    cur.execute("SELECT COUNT(*) AS n FROM audit_log")
+    assert cur.fetchone()['n'] == 3
+    assert 'audit_log_y2019m03' in partitions(cur)
+
+    # Retention applies from the next run on, once the operator has opted in
+    cutoff = audit.partition_name(audit.add_months(audit.month_start(date.today()), -12))
+    dropped = audit.install(cur)
+    assert 'audit_log_y2019m03' in dropped
+    assert all(name < cutoff for name in dropped)
+    assert min(p for p in partitions(cur) if p != 'audit_log_default') == cutoff
+    cur.execute("SELECT id FROM audit_log")
+    assert [r['id'] for r in cur.fetchall()] == ['log-2']
+
+
+def test_retention_is_off_by_default(pg):
+    audit.ensure_partition(pg, date(2019, 3, 1))
+    pg.execute("INSERT INTO audit_log VALUES ('log-old', 'a@b', 'A', 'create', 'table_row', NULL, NULL, '2019-03-04')")
+    assert audit.maintain(pg) == []
+    pg.execute("SELECT COUNT(*) AS n FROM audit_log")
+    assert pg.fetchone()['n'] == 1
+
+
+def test_init_db_reports_dropped_partitions(pg, monkeypatch, capsys):
+    monkeypatch.setattr(audit, 'RETENTION_MONTHS', 24)
+    audit.ensure_partition(pg, date(2019, 3, 1))
+    pg.execute("INSERT INTO audit_log VALUES ('log-old', 'a@b', 'A', 'create', 'table_row', NULL, NULL, '2019-03-04')")
+    pg.execute("INSERT INTO audit_log VALUES ('log-stray', 'a@b', 'A', 'create', 'table_row', NULL, NULL, '2010-01-01')")
+    bell_app.init_db()
+    out = capsys.readouterr().out
+    assert '🧹 Audit partitions dropped: audit_log_y2019m03, 1 rows from audit_log_default' in out
@@ -0,0 +1,59 @@
+import pytest
+
+import db_pool
+
+
+@pytest.fixture
+def statements():
+    seen = []
+    observer = lambda cursor, query, vars, seconds: seen.append(' '.join(str(query).split()))
+    db_pool.add_query_observer(observer)
+    yield seen
+    db_pool.remove_query_observer(observer)
+
+
+def test_batch_results_carry_index_and_id(pg, pg_admin):
+    pg.execute("INSERT INTO table_rows (id, code, from_date) VALUES ('row-a', 'X', '2025-10-10'), "
+               "('row-b', 'Z', '2025-10-13')")
+    ops = [
+        {'op': 'create', 'code': 'E', 'from': '2025-10-20'},
+        {'op': 'create', 'code': 'E', 'from': 'not-a-date'},
+        {'op': 'update', 'id': 'row-a', 'code': 'X', 'from': '2025-10-11'},
+        {'op': 'update', 'id': 'missing', 'code': 'X', 'from': '2025-10-11'},
+        {'op': 'delete', 'id': 'row-b'},
+        {'op': 'delete'},
+        {'op': 'rename', 'id': 'row-a'},
+    ]
+    resp = pg_admin.post('/api/table-rows/batch', json={'operations': ops, 'atomic': False})
+    assert resp.status_code == 200
+    results = resp.get_json()['results']
+    assert [r['index'] for r in results] == list(range(len(ops)))
+    assert [r['status'] for r in results] == ['ok', 'error', 'ok', 'error', 'ok', 'error', 'error']
+    assert results[0]['id'] == results[0]['row']['id']
+    assert [r.get('id') for r in results[2:]] == ['row-a', 'missing', 'row-b', None, 'row-a']
+
+    pg.execute("SELECT id, from_date::text AS d FROM table_rows ORDER BY from_date")
+    assert [(r['id'], r['d']) for r in pg.fetchall()] == [('row-a', '2025-10-11'), (results[0]['id'], '2025-10-20')]
+
+
+def test_atomic_batch_rolls_back(pg, pg_admin):
+    ops = [{'op': 'create', 'code': 'E', 'from': '2025-10-20'}, {'op': 'delete', 'id': 'missing'}]
+    resp = pg_admin.post('/api/table-rows/batch', json={'operations': ops})
+    assert resp.status_code == 409
+    assert [(r['index'], r['status']) for r in resp.get_json()['results']] == [(0, 'rolled_back'), (1, 'error')]
+    pg.execute("SELECT COUNT(*) AS n FROM table_rows")
+    assert pg.fetchone()['n'] == 0
+
+
+def test_replace_date_rows_inserts_in_one_statement(pg, pg_admin, statements):
+    pg.execute("INSERT INTO table_rows (id, code, from_date) VALUES ('old', 'X', '2025-10-10')")
+    items = [{'code': code, 'comment': f'{code} day'} for code in ('E', 'H', 'Z')]
+    resp = pg_admin.put('/api/table-rows/date/2025-10-10', json=items)
+    assert resp.status_code == 200
+    assert [(r['code'], r['from'], r['comment']) for r in resp.get_json()] == \
+        [('E', '2025-10-10', 'E day'), ('H', '2025-10-10', 'H day'), ('Z', '2025-10-10', 'Z day')]
+    assert sum(1 for q in statements if q.startswith('INSERT INTO table_rows')) == 1
+
+    pg.execute("SELECT code FROM table_rows ORDER BY code")
+    assert [r['code'] for r in pg.fetchall()] == ['E', 'H', 'Z']
+    assert pg_admin.put('/api/table-rows/date/2025-10-10', json=[]).get_json() == []
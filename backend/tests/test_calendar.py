@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+import timeline
+from conftest import DEVICE_TOKEN
+
+
+def bell_times(body, day):
+    """Local HHMM of each event on a YYYYMMDD day, from the event UIDs."""
+    return [line[13:17] for line in body.splitlines() if line.startswith(f'UID:{day}T')]
+
+
+def test_calendar_default_range_is_current_school_year(admin, db):
+    today = datetime.now(timeline.school_tz()).date()
+    db.school_years.append({'id': 'year-now', 'label': 'Current', 'from_date': (today - timedelta(days=30)).isoformat(),
+                            'to_date': (today + timedelta(days=300)).isoformat()})
+    resp = admin.get('/api/calendar.ics')
+    assert resp.status_code == 200
+    body = resp.get_data(as_text=True)
+    days = sorted({line[4:12] for line in body.splitlines() if line.startswith('UID:')})
+    assert days[0] >= (today - timedelta(days=30)).strftime('%Y%m%d')
+    assert days[-1] <= (today + timedelta(days=300)).strftime('%Y%m%d')
+
+
+def test_calendar_end_defaults_to_school_year_end(admin):
+    resp = admin.get('/api/calendar.ics?from=2025-10-06')
+    assert resp.status_code == 200
+    body = resp.get_data(as_text=True)
+    assert bell_times(body, '20251010') == []
+    assert bell_times(body, '20251015') == ['0800', '1200']
+    assert bell_times(body, '20260612') == ['0800', '0900', '1500']
+    assert bell_times(body, '20260615') == []
+
+
+def test_device_calendar_default_range(client):
+    resp = client.get(f'/public/devices/{DEVICE_TOKEN}/calendar.ics?from=2025-10-06')
+    assert resp.status_code == 200
+    body = resp.get_data(as_text=True)
+    assert 'X-WR-CALNAME:Bells - Gym' in body
+    assert bell_times(body, '20251006') == ['0800', '1030', '1500']
+    # Closed days stay silent; the half day it doesn't play falls back to Normal
+    assert bell_times(body, '20251010') == []
+    assert bell_times(body, '20251013') == []
+    assert bell_times(body, '20251015') == ['0800', '0900', '1500']
+    assert bell_times(body, '20260612') == ['0800', '0900', '1500']
+
+
+def test_device_calendar_unknown_token(client):
+    assert client.get('/public/devices/nope/calendar.ics').status_code == 404
+
+
+def test_calendar_uids_are_unique_for_bells_at_the_same_time(admin, db):
+    # Normal now lists 08:00 twice in the same slot; exam days also mute 09:00 and add 10:30
+    normal = db.schedules[0]
+    normal['times'] = normal['times'] + [{'time': '08:00', 'label': 'Assembly', 'muted': False}]
+    resp = admin.get('/api/calendar.ics?from=2025-10-06&to=2025-10-09')
+    assert resp.status_code == 200
+    uids = [line for line in resp.get_data(as_text=True).splitlines() if line.startswith('UID:')]
+    assert len(uids) == len(set(uids)) == 4 * 4
+    assert bell_times(resp.get_data(as_text=True), '20251009') == ['0800', '0800', '0900', '1500']
@@ -0,0 +1,61 @@
+import changelog
+
+
+def current_version(pg):
+    return changelog.version_bounds(pg)[1]
+
+
+def delta(client, since):
+    resp = client.get(f'/public/ringdates?since={since}')
+    assert resp.status_code == 200
+    lines = resp.get_data(as_text=True).splitlines()
+    mode = next(line.split(': ')[1] for line in lines if line.startswith('# Mode:'))
+    return int(resp.headers['X-Ringdates-Version']), mode, [line for line in lines if not line.startswith('#')]
+
+
+def test_triggers_log_every_write(pg):
+    start = current_version(pg)
+    pg.execute("INSERT INTO schedules (id, code, name) VALUES ('schedule-E', 'E', 'Exam')")
+    pg.execute("INSERT INTO table_rows (id, code, from_date) VALUES ('row-1', 'E', '2025-10-06')")
+    pg.execute("UPDATE table_rows SET comment = 'Exams' WHERE id = 'row-1'")
+    pg.execute("DELETE FROM table_rows WHERE id = 'row-1'")
+
+    changes = changelog.fetch_changes(pg, start, current_version(pg))
+    assert [(c['entity_type'], c['entity_id'], c['op']) for c in changes] == [
+        ('schedules', 'schedule-E', 'insert'), ('table_rows', 'row-1', 'insert'),
+        ('table_rows', 'row-1', 'update'), ('table_rows', 'row-1', 'delete'),
+    ]
+    assert [c['version'] for c in changes] == list(range(start + 1, start + 5))
+    assert changes[2]['old_row']['comment'] == '' and changes[2]['new_row']['comment'] == 'Exams'
+    assert changes[3]['new_row'] is None and changes[3]['old_row']['code'] == 'E'
+
+
+def test_ringdates_delta_since_version(pg, pg_client):
+    pg.execute("INSERT INTO schedules (id, code, name, is_addon) VALUES ('schedule-E', 'E', 'Exam', TRUE), "
+               "('schedule-X', 'X', 'Closed', FALSE)")
+    pg.execute("INSERT INTO table_rows (id, code, from_date, to_date, comment) VALUES "
+               "('row-1', 'E', '2025-10-06', '2025-10-08', 'Exams'), ('row-2', 'X', '2025-10-10', NULL, 'In-service'), "
+               "('row-3', 'X', '2025-10-13', NULL, 'Closed')")
+    since = current_version(pg)
+    pg.execute("UPDATE table_rows SET comment = 'PD day' WHERE id = 'row-2'")
+    pg.execute("DELETE FROM table_rows WHERE id = 'row-3'")
+
+    version, mode, lines = delta(pg_client, since)
+    assert (version, mode) == (since + 2, 'delta')
+    assert lines == ['U row-2 2025-10-10X  PD day', 'D row-3']
+    assert delta(pg_client, version) == (version, 'delta', [])
+
+    # Flipping a code's add-on flag rewrites every row that uses it
+    pg.execute("UPDATE schedules SET is_addon = FALSE WHERE code = 'E'")
+    assert delta(pg_client, version)[2] == ['U row-1 2025-10-06/2025-10-08E  Exams']
+    # A rename that keeps the flag changes no ringdates line
+    pg.execute("UPDATE schedules SET name = 'Exams' WHERE code = 'E'")
+    assert delta(pg_client, version + 1)[2] == []
+
+
+def test_ringdates_delta_falls_back_to_full(pg, pg_client):
+    pg.execute("INSERT INTO table_rows (id, code, from_date) VALUES ('row-1', 'X', '2025-10-10')")
+    version = current_version(pg)
+    for since in (0, version + 5):
+        assert delta(pg_client, since) == (version, 'full', ['U row-1 2025-10-10X  '])
+    assert pg_client.get('/public/ringdates?since=abc').status_code == 400
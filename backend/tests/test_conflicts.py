@@ -0,0 +1,29 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+
+def test_conflicts_for_school_year(admin, db):
+    db.schedules[1]['times'].append({'time': '08:01', 'label': 'Warning', 'muted': False})
+    resp = admin.get('/api/schedules/conflicts?schoolYear=year-2025')
+    assert resp.status_code == 200
+    report = resp.get_json()
+    assert (report['from'], report['to']) == ('2025-08-04', '2026-06-12')
+    assert [d['date'] for d in report['days']] == ['2025-10-06', '2025-10-07', '2025-10-08']
+    assert {i['type'] for d in report['days'] for i in d['issues']} == {'nearDuplicate'}
+
+
+def test_conflicts_for_unknown_school_year(admin):
+    assert admin.get('/api/schedules/conflicts?schoolYear=nope').status_code == 404
+
+
+def test_conflicts_for_date_range(admin):
+    resp = admin.get('/api/schedules/conflicts?from=2025-10-01&to=2025-10-31&nearMinutes=90')
+    assert resp.status_code == 200
+    assert resp.get_json()['summary']['nearDuplicate'] > 0
+
+
+@pytest.mark.parametrize('query', ['', 'from=2025-10-01', 'from=2025-10-31&to=2025-10-01',
+                                   'from=2025-13-01&to=2025-10-31', 'schoolYear=year-2025&nearMinutes=x'])
+def test_conflicts_rejects_bad_arguments(admin, query):
+    assert admin.get(f'/api/schedules/conflicts?{query}').status_code == 400
@@ -0,0 +1,51 @@
+from datetime import date
+
+import app as bell_app
+
+LEGACY_SQL = """
+    CREATE TABLE table_rows (
+        id TEXT PRIMARY KEY,
+        code TEXT NOT NULL,
+        from_date TEXT NOT NULL,
+        to_date TEXT,
+        comment TEXT DEFAULT ''
+    )
+"""
+
+
+def test_init_db_migrates_text_dates(pg, capsys):
+    pg.execute("DROP TABLE table_rows CASCADE")
+    pg.execute(LEGACY_SQL)
+    pg.execute("INSERT INTO table_rows VALUES ('row-1', 'E+', '2025-10-06', '2025-10-08', 'Exams'), "
+               "('row-2', 'X', '2025-10-10', '', 'In-service'), ('row-3', 'Z', '2025-10-13', NULL, '')")
+    bell_app.init_db()
+    assert '✅ table_rows dates migrated to DATE' in capsys.readouterr().out
+
+    pg.execute("SELECT id, from_date, to_date, span::text AS span FROM table_rows ORDER BY id")
+    assert [tuple(r.values()) for r in pg.fetchall()] == [
+        ('row-1', date(2025, 10, 6), date(2025, 10, 8), '[2025-10-06,2025-10-09)'),
+        ('row-2', date(2025, 10, 10), None, '[2025-10-10,2025-10-11)'),
+        ('row-3', date(2025, 10, 13), None, '[2025-10-13,2025-10-14)'),
+    ]
+    pg.execute("SELECT indexdef FROM pg_indexes WHERE indexname = 'idx_table_rows_span'")
+    assert 'USING gist (span)' in pg.fetchone()['indexdef']
+
+    # A second startup finds DATE columns and leaves them alone
+    bell_app.init_db()
+    assert 'migrated to DATE' not in capsys.readouterr().out
+
+
+def test_day_plan_matches_rows_by_span(pg, pg_admin):
+    pg.execute("INSERT INTO schedules (id, code, name, is_normal, bell_slot, times) VALUES "
+               "('schedule-N', 'N', 'Normal', TRUE, 1, '[{\"time\": \"08:00\", \"label\": \"P1\"}]')")
+    # row-b ends before it starts: its span is clamped to a valid range, and the planner gives it no days
+    pg.execute("INSERT INTO table_rows (id, code, from_date, to_date) VALUES "
+               "('row-a', 'X', '2025-10-06', '2025-10-07'), ('row-b', 'Z', '2025-10-09', '2025-10-01'), "
+               "('row-c', 'H', '2025-10-10', NULL)")
+    resp = pg_admin.get('/api/day-plan?from=2025-10-05&to=2025-10-11')
+    assert resp.status_code == 200
+    assert [(d['date'], d['codes']) for d in resp.get_json()] == [
+        ('2025-10-05', []), ('2025-10-06', ['X']), ('2025-10-07', ['X']), ('2025-10-08', []),
+        ('2025-10-09', []), ('2025-10-10', ['H']), ('2025-10-11', []),
+    ]
+    assert [d['codes'] for d in pg_admin.get('/api/day-plan?from=2025-10-08&to=2025-10-08').get_json()] == [[]]
@@ -0,0 +1,38 @@
+from datetime import date
+
+from conftest import DEVICE_TOKEN, SCHEDULES, TABLE_ROWS
+from day_plan import DayPlanner
+from devices import Profile
+
+
+def device_plan(profile, day):
+    planner = DayPlanner(profile.schedules(SCHEDULES))
+    return planner.plan_range(list(profile.table_rows(TABLE_ROWS, SCHEDULES)), day, day)[0]
+
+
+def test_filtered_profile_keeps_closures():
+    profile = Profile(['E+'], None)
+    assert [s['code'] for s in profile.schedules(SCHEDULES)] == ['N', 'E+', 'X', 'Z']
+    assert [r['code'] for r in profile.table_rows(TABLE_ROWS, SCHEDULES)] == ['E+', 'X', 'Z']
+
+
+def test_filtered_profile_suppresses_bells_on_closed_day():
+    profile = Profile(['E+'], None)
+    assert device_plan(profile, date(2025, 10, 10))['bells'] == []
+    assert device_plan(profile, date(2025, 10, 13))['bells'] == []
+    # The excluded half-day replacement falls back to Normal
+    assert [b['time'] for b in device_plan(profile, date(2025, 10, 15))['bells']] == ['08:00', '09:00', '15:00']
+
+
+def test_unfiltered_profile_passes_rows_through():
+    profile = Profile(None, None)
+    assert profile.table_rows(TABLE_ROWS, SCHEDULES) is TABLE_ROWS
+
+
+def test_device_ringdates_feed_keeps_closure_lines(client):
+    resp = client.get(f'/public/devices/{DEVICE_TOKEN}/ringdates')
+    assert resp.status_code == 200
+    lines = resp.get_data(as_text=True).splitlines()
+    assert '2025-10-10X  In-service' in lines
+    assert '2025-10-13Z  Closed' in lines
+    assert not any(line.startswith('2025-10-15H') for line in lines)
@@ -0,0 +1,35 @@
+import pytest
+
+import events
+
+
+@pytest.fixture
+def one_slot(monkeypatch):
+    slots = events.StreamSlots(1)
+    monkeypatch.setattr(events, 'slots', slots)
+    return slots
+
+
+def test_stream_cap_returns_503_with_retry_after(pg_admin, one_slot):
+    first = pg_admin.get('/api/events')
+    assert first.status_code == 200
+    assert next(first.response) == b'retry: 3000\n\n'
+    assert one_slot.active == 1
+
+    second = pg_admin.get('/api/events')
+    assert second.status_code == 503
+    assert second.headers['Retry-After'] == str(events.RETRY_AFTER)
+    assert 'error' in second.get_json()
+
+    # Closing the first stream frees its slot
+    first.close()
+    assert one_slot.active == 0
+    third = pg_admin.get('/api/events')
+    assert third.status_code == 200
+    third.close()
+    assert one_slot.active == 0 and one_slot.rejected == 1
+
+
+def test_bad_last_event_id_takes_no_slot(pg_admin, one_slot):
+    assert pg_admin.get('/api/events', headers={'Last-Event-ID': 'x'}).status_code == 400
+    assert one_slot.active == 0
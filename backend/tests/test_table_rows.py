@@ -0,0 +1,59 @@
+import pytest
+
+import app as bell_app
+
+
+@pytest.mark.parametrize('query', ['from=2025-13-01', 'to=soon', 'from=2025-10-01&to=10/31/2025',
+                                   'cursor=' + bell_app.encode_cursor(['not-a-date', 'X', 'row-2'])])
+def test_table_rows_rejects_malformed_dates(admin, query):
+    resp = admin.get(f'/api/table-rows?{query}')
+    assert resp.status_code == 400
+    assert 'error' in resp.get_json()
+
+
+def test_table_rows_window_within_school_year(admin, db):
+    resp = admin.get('/api/table-rows?schoolYear=year-2025&from=2025-01-01&limit=2')
+    assert resp.status_code == 200
+    assert [r['code'] for r in resp.get_json()] == ['E+', 'X']
+    sql, params = db.statements[-1]
+    assert params[:2] == [bell_app.parse_date('2025-08-04'), bell_app.parse_date('2026-06-12')]
+
+
+def add_rows(pg, rows):
+    for i, (code, from_date, to_date) in enumerate(rows):
+        pg.execute("INSERT INTO table_rows (id, code, from_date, to_date) VALUES (%s, %s, %s, %s)",
+                   (f'row-{i:03d}', code, from_date, to_date))
+
+
+def test_table_rows_rejects_reversed_window(pg_admin):
+    resp = pg_admin.get('/api/table-rows?from=2026-05-01&to=2026-01-01')
+    assert resp.status_code == 400
+    assert resp.get_json() == {'error': 'to must not be before from'}
+
+
+def test_table_rows_window_outside_school_year_is_empty(pg, pg_admin):
+    add_rows(pg, [('X', '2025-10-10', None), ('E', '2024-10-01', '2024-10-03')])
+    for query in ('from=2025-09-01', 'to=2024-01-01', 'from=2026-01-01&to=2026-02-01'):
+        resp = pg_admin.get(f'/api/table-rows?schoolYear=sy-2024-2025&{query}&limit=10')
+        assert resp.status_code == 200
+        assert resp.get_json() == []
+        assert 'X-Next-Cursor' not in resp.headers
+
+
+def test_table_rows_keyset_pages_cover_the_window(pg, pg_admin):
+    # Rows overlapping 2025-09-01..2025-09-30, including one that started in August
+    add_rows(pg, [('A', '2025-08-25', '2025-09-02'), ('B', '2025-08-20', '2025-08-22')] +
+                 [(code, f'2025-09-{d:02d}', None) for d in range(1, 31, 3) for code in ('X', 'E')] +
+                 [('Z', '2025-10-01', None)])
+    seen, cursor = [], None
+    while True:
+        query = 'from=2025-09-01&to=2025-09-30&limit=4' + (f'&cursor={cursor}' if cursor else '')
+        resp = pg_admin.get(f'/api/table-rows?{query}')
+        assert resp.status_code == 200
+        seen += [(r['code'], r['from']) for r in resp.get_json()]
+        cursor = resp.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+    assert seen[0] == ('A', '2025-08-25')
+    assert len(seen) == 21 and len(set(seen)) == 21
+    assert seen == sorted(seen, key=lambda r: (r[1], r[0]))
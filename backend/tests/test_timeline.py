@@ -0,0 +1,35 @@
+from datetime import date, datetime, timedelta
+
+import timeline
+from conftest import SCHEDULES, SCHOOL_YEARS, TABLE_ROWS
+
+
+def test_current_window_reads_text_dates():
+    assert timeline.current_window(SCHOOL_YEARS, date(2025, 10, 9)) == (date(2025, 10, 9), date(2026, 6, 12), '2025-2026')
+    assert timeline.current_window(SCHOOL_YEARS, date(2025, 7, 1)) == (date(2025, 8, 4), date(2026, 6, 12), '2025-2026')
+    assert timeline.current_window(SCHOOL_YEARS, date(2026, 7, 1)) == (date(2026, 7, 1), date(2027, 7, 1), None)
+
+
+def test_lookup_over_text_school_years():
+    tz = timeline.school_tz()
+    tl = timeline.Timeline.build(SCHEDULES, TABLE_ROWS, SCHOOL_YEARS, date(2025, 10, 9), tz)
+    result = tl.lookup(datetime(2025, 10, 9, 8, 30, tzinfo=tz), count=2)
+    assert result['schoolYear'] == '2025-2026'
+    assert result['currentPeriod']['label'] == 'Period 1'
+    assert [b['time'] for b in result['next']] == ['09:00', '15:00']
+    # Friday is X and Monday is Z, so after Thursday's last bell the next is on Tuesday
+    result = tl.lookup(datetime(2025, 10, 9, 16, 0, tzinfo=tz), count=1)
+    assert result['next'][0]['date'] == '2025-10-14'
+    assert tl.day_info(date(2025, 10, 10))['status'] == 'closed'
+
+
+def test_next_bell_routes(client, admin, db):
+    today = datetime.now(timeline.school_tz()).date()
+    db.school_years.append({'id': 'year-now', 'label': 'Current', 'from_date': (today - timedelta(days=30)).isoformat(),
+                            'to_date': (today + timedelta(days=300)).isoformat()})
+    resp = client.get('/public/next-bell')
+    assert resp.status_code == 200
+    assert resp.get_json()['schoolYear'] == 'Current'
+    resp = admin.get('/api/next-bell?count=5')
+    assert resp.status_code == 200
+    assert len(resp.get_json()['next']) == 5
@@ -0,0 +1,133 @@
+"""
+Next-bell timeline.
+Every bell that actually rings (not muted, school days only) in the current
+school year is resolved with DayPlanner and stored as a sorted list of epoch
+seconds, so "what rings next" is one bisect. The timeline is rebuilt when
+schedules, table_rows or school_years change, and once a day so the window
+follows the calendar. Bells are local school time (BELL_TZ, e.g.
+Asia/Bangkok; the server's zone when unset).
+"""
+
+import os
+from bisect import bisect_right
+from datetime import datetime, time, timedelta
+
+from zoneinfo import ZoneInfo
+
+from day_plan import DayPlanner, codes_by_day, iter_days, parse_date
+
+# Monday..Friday; weekends can't be edited in the calendar and never ring
+SCHOOL_DAYS = frozenset(range(5))
+# Window used when no school year covers today or a later date
+FALLBACK_DAYS = 366
+MAX_COUNT = 50
+
+
+def school_tz():
+    name = os.environ.get('BELL_TZ')
+    if name:
+        return ZoneInfo(name)
+    return datetime.now().astimezone().tzinfo
+
+
+def current_window(school_years, today):
+    """(start, end, label) of the school year containing today, else the next one,
+    else FALLBACK_DAYS from today. The window never starts before today.
+    Year dates may be dates or ISO strings (the columns are TEXT)."""
+    years = sorted(((parse_date(y['from_date']), parse_date(y['to_date']), y['label']) for y in school_years),
+                   key=lambda y: y[:2])
+    for start, end, label in years:
+        if start <= today <= end:
+            return today, end, label
+        if start > today:
+            return start, end, label
+    return today, today + timedelta(days=FALLBACK_DAYS - 1), None
+
+
+class Timeline:
+    def __init__(self, tz, start, end, label):
+        self.tz       = tz
+        self.start    = start
+        self.end      = end
+        self.label    = label
+        self.instants = []      # epoch seconds, ascending
+        self.bells    = []      # API dict per instant
+        self.days     = {}      # date -> codes in effect
+
+    @classmethod
+    def build(cls, schedule_rows, table_rows, school_years, today, tz):
+        """``table_rows`` ordered by (from_date, code), as for DayPlanner.plan_range()."""
+        start, end, label = current_window(school_years, today)
+        tl = cls(tz, start, end, label)
+        if end < start:
+            return tl
+        planner = DayPlanner(schedule_rows)
+        for day, codes in zip(iter_days(start, end), codes_by_day(table_rows, start, end)):
+            tl.days[day] = codes
+            if day.weekday() not in SCHOOL_DAYS:
+                continue
+            for bell in planner.bells_for_codes(codes):
+                if bell['muted']:
+                    continue
+                hh, mm = bell['time'].split(':')
+                at = datetime.combine(day, time(int(hh), int(mm)), tzinfo=tz)
+                tl.instants.append(int(at.timestamp()))
+                tl.bells.append({
+                    'at':    at.isoformat(),
+                    'date':  day.isoformat(),
+                    'time':  bell['time'],
+                    'label': bell['label'],
+                    'slot':  bell['slot'],
+                    'mod':   bell['mod'],
+                })
+        return tl
+
+    def __len__(self):
+        return len(self.instants)
+
+    def day_info(self, day):
+        codes = self.days.get(day)
+        if day.weekday() not in SCHOOL_DAYS:
+            status = 'weekend'
+        elif codes is None:
+            status = 'outsideYear'
+        else:
+            status = 'closed'
+        lo = bisect_right(self.instants, int(datetime.combine(day, time.min, tzinfo=self.tz).timestamp()) - 1)
+        hi = bisect_right(self.instants, int(datetime.combine(day + timedelta(days=1), time.min, tzinfo=self.tz).timestamp()) - 1)
+        if hi > lo:
+            status = 'school'
+        return {'date': day.isoformat(), 'codes': codes or [], 'status': status, 'bells': hi - lo}
+
+    def lookup(self, now, count=3):
+        """The next ``count`` bells after ``now`` (aware datetime), today's period and the countdown.
+
+        The current period is the label of the last bell that rang today,
+        until the next bell today; before the first and after the last bell
+        of a day there is none. The countdown runs across midnight, weekends
+        and closed days to the next bell that rings.
+        """
+        now = now.astimezone(self.tz)
+        ts = now.timestamp()
+        i = bisect_right(self.instants, ts)
+        upcoming = self.bells[i:i + count]
+        today = now.date()
+        today_iso = today.isoformat()
+
+        period = None
+        if 0 < i < len(self.bells) and self.bells[i - 1]['date'] == today_iso == self.bells[i]['date']:
+            period = {
+                'label':            self.bells[i - 1]['label'],
+                'startedAt':        self.bells[i - 1]['time'],
+                'endsAt':           self.bells[i]['time'],
+                'secondsRemaining': int(self.instants[i] - ts),
+            }
+
+        return {
+            'now':              now.isoformat(timespec='seconds'),
+            'schoolYear':       self.label,
+            'today':            self.day_info(today),
+            'currentPeriod':    period,
+            'secondsToNext':    int(self.instants[i] - ts) if i < len(self.instants) else None,
+            'next':             upcoming,
+        }
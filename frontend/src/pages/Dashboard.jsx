@@ -26,9 +26,9 @@ export default function Dashboard({ user, onLogout }) {
 
   const loadData = async () => {
     try {
-      const [s, r] = await Promise.all([getSchedules(), getTableRows()]);
+      const [s, { rows }] = await Promise.all([getSchedules(), getTableRows()]);
       setSchedules(s);
-      setTableRows(r);
+      setTableRows(rows);
     } catch (e) {
       console.error("Failed to load data:", e);
     } finally {
@@ -2,7 +2,8 @@ export const API_BASE_URL = import.meta.env.VITE_API_URL
   ? `${import.meta.env.VITE_API_URL}/api`
   : 'http://192.168.5.25:5001/api';
 
-const apiCall = async (endpoint, options = {}) => {
+// Like apiCall, but resolves to { data, headers } for endpoints that answer in headers too
+const apiCallWithHeaders = async (endpoint, options = {}) => {
   const response = await fetch(`${API_BASE_URL}${endpoint}`, {
     ...options,
     credentials: 'include',
@@ -12,9 +13,11 @@ const apiCall = async (endpoint, options = {}) => {
     const error = await response.json().catch(() => ({ error: 'Request failed' }));
     throw new Error(error.error || 'Request failed');
   }
-  return response.json();
+  return { data: await response.json(), headers: response.headers };
 };
 
+const apiCall = async (endpoint, options = {}) => (await apiCallWithHeaders(endpoint, options)).data;
+
 // Auth
 export const login     = (email, password) => apiCall('/login',      { method: 'POST', body: JSON.stringify({ email, password }) });
 export const logout    = ()                 => apiCall('/logout',     { method: 'POST' });
@@ -27,7 +30,7 @@ export const updateUser  = (id, data)  => apiCall(`/users/${id}`, { method: 'PUT
 export const deleteUser  = (id)        => apiCall(`/users/${id}`, { method: 'DELETE' });
 
 // Audit log (admin only)
-export const getAuditLog = (limit = 100) => apiCall(`/audit-log?limit=${limit}`, { method: 'GET' });
+export const getAuditLog = (limit = 100, filters = {}) => apiCall(`/audit-log?${new URLSearchParams({ limit, ...filters })}`, { method: 'GET' });
 
 // Snapshots
 export const getSnapshots      = ()      => apiCall('/snapshots',              { method: 'GET'    });
@@ -41,13 +44,25 @@ export const getSchedules    = ()          => apiCall('/schedules',        { met
 export const createSchedule  = (data)      => apiCall('/schedules',        { method: 'POST',   body: JSON.stringify(data) });
 export const updateSchedule  = (id, data)  => apiCall(`/schedules/${id}`,  { method: 'PUT',    body: JSON.stringify(data) });
 export const deleteSchedule  = (id)        => apiCall(`/schedules/${id}`,  { method: 'DELETE' });
+export const getScheduleConflicts = (params) => apiCall(`/schedules/conflicts?${new URLSearchParams(params)}`, { method: 'GET' });
+export const getNextBell = (count = 3) => apiCall(`/next-bell?count=${count}`, { method: 'GET' });
+export const calendarIcsUrl = (params = {}) => `${API_BASE_URL}/calendar.ics?${new URLSearchParams(params)}`;
 
 // Table rows
-export const getTableRows    = ()              => apiCall('/table-rows',              { method: 'GET'    });
+// Resolves to { rows, nextCursor }; pass nextCursor back as params.cursor for the next page (null on the last)
+export const getTableRows    = async (params)  => {
+  const { data, headers } = await apiCallWithHeaders(params ? `/table-rows?${new URLSearchParams(params)}` : '/table-rows', { method: 'GET' });
+  return { rows: data, nextCursor: headers.get('X-Next-Cursor') };
+};
 export const createTableRow  = (data)          => apiCall('/table-rows',              { method: 'POST',   body: JSON.stringify(data) });
 export const updateTableRow  = (id, data)      => apiCall(`/table-rows/${id}`,        { method: 'PUT',    body: JSON.stringify(data) });
 export const deleteTableRow  = (id)            => apiCall(`/table-rows/${id}`,        { method: 'DELETE' });
 export const replaceDateRows = (dateStr, rows) => apiCall(`/table-rows/date/${dateStr}`, { method: 'PUT', body: JSON.stringify(rows) });
+export const batchTableRows  = (operations, atomic = true) => apiCall('/table-rows/batch', { method: 'POST', body: JSON.stringify({ operations, atomic }) });
+
+// Day plans (server-resolved bells)
+export const getDayPlan      = (dateStr)   => apiCall(`/day-plan/${dateStr}`,              { method: 'GET' });
+export const getDayPlanRange = (from, to)  => apiCall(`/day-plan?from=${from}&to=${to}`,   { method: 'GET' });
 
 // Ringtone mappings
 export const getRingtoneMappings  = ()     => apiCall('/ringtone-mappings', { method: 'GET' });
@@ -59,6 +74,17 @@ export const createSchoolYear  = (data)      => apiCall('/school-years',       {
 export const updateSchoolYear  = (id, data)  => apiCall(`/school-years/${id}`, { method: 'PUT',    body: JSON.stringify(data) });
 export const deleteSchoolYear  = (id)        => apiCall(`/school-years/${id}`, { method: 'DELETE' });
 
+// Devices (admin only). The token is returned on create and rotate only.
+export const getDevices        = ()          => apiCall('/devices',              { method: 'GET'    });
+export const createDevice      = (data)      => apiCall('/devices',              { method: 'POST',   body: JSON.stringify(data) });
+export const updateDevice      = (id, data)  => apiCall(`/devices/${id}`,        { method: 'PUT',    body: JSON.stringify(data) });
+export const rotateDeviceToken = (id)        => apiCall(`/devices/${id}/token`,  { method: 'POST'   });
+export const deleteDevice      = (id)        => apiCall(`/devices/${id}`,        { method: 'DELETE' });
+
+// Live change events (SSE). EventSource resumes with Last-Event-ID on reconnect.
+// A 503 (the server's stream cap is reached) closes it for good: reopen after a while.
+export const openEventStream = () => new EventSource(`${API_BASE_URL}/events`, { withCredentials: true });
+
 // Default export for AuthContext compatibility
 export default {
   get:  (endpoint)       => apiCall(endpoint, { method: 'GET' }),